@@ -1,3 +1,6 @@
+import time
+_script_start = time.perf_counter()
+
 import streamlit as st
 import os
 from dotenv import load_dotenv
@@ -13,9 +16,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-from database import HistoryDB
-from embeddings import SemanticSearch
-from llm_handler import LLMHandler
+from lazy_imports import timed
+
+with timed("registry"):
+    import registry
 
 # Load custom CSS
 def load_css():
@@ -34,25 +38,12 @@ if 'gemini_api_key' not in st.session_state:
     # Load from environment variable
     st.session_state.gemini_api_key = os.getenv('GEMINI_API_KEY', '')
 
-# Initialize components
-@st.cache_resource
-def init_components(use_gemini=False, api_key=None):
-    db = HistoryDB()
-    search = SemanticSearch()
-    llm = LLMHandler(model="llama3.1:latest", use_gemini=use_gemini, api_key=api_key)
-    return db, search, llm
-
-# Clear cache on first load
-if 'initialized' not in st.session_state:
-    st.cache_resource.clear()
-    st.session_state.initialized = True
+# Shared components (one instance per process, reused across reruns and sessions)
+db = registry.get_db()
 
-db, search, llm = init_components(st.session_state.use_gemini, st.session_state.gemini_api_key)
-
-# Store in session state for access across pages
-st.session_state.db = db
-st.session_state.search = search
-st.session_state.llm = llm
+# Load langchain and the embedding model in the background so neither first paint nor the first request waits
+registry.warm_up(st.session_state.use_gemini, st.session_state.gemini_api_key, background=True,
+                 cloud_fallback=st.session_state.get('cloud_fallback', False))
 
 # Hero section
 st.title("💻 AI Coding Assistant")
@@ -61,15 +52,17 @@ st.markdown("### Your Intelligent Coding Companion")
 st.markdown("")
 
 # Stats dashboard
-conversations = db.get_all_conversations()
 col1, col2, col3, col4 = st.columns(4)
 with col1:
-    st.metric("💬 Conversations", len(conversations))
+    st.metric("💬 Conversations", db.count())
 with col2:
     model_name = "Gemini 2.0" if st.session_state.use_gemini else "Llama 3.1"
     st.metric("🤖 Active Model", model_name)
 with col3:
-    privacy = "Cloud" if st.session_state.use_gemini else "100% Local"
+    if st.session_state.use_gemini:
+        privacy = "Cloud"
+    else:
+        privacy = "Local + Cloud Fallback" if st.session_state.get('cloud_fallback', False) else "100% Local"
     st.metric("🔒 Privacy", privacy)
 with col4:
     st.metric("📡 Status", "🟢 Online")
@@ -139,3 +132,31 @@ with col3:
     st.markdown("- Java, C++, Go, Rust")
     st.markdown("- C#, PHP, Ruby, Swift")
     st.markdown("- SQL, Kotlin, and more")
+
+# Shared component footprint
+with st.expander("🧠 Memory Report"):
+    report = registry.memory_report()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        rss = report["process_rss_bytes"]
+        st.metric("Process Memory", f"{rss / 1024 ** 2:.0f} MB" if rss else "N/A")
+    with col2:
+        st.metric("Embedding Model", f"{report['embedding_model_bytes'] / 1024 ** 2:.0f} MB"
+                  if report["embedding_model_loaded"] else "Not loaded")
+    with col3:
+        st.metric("Index Vectors", report["index_vectors"],
+                  f"{report['index_bytes'] / 1024 ** 2:.1f} MB ({report.get('index_quantization') or 'none'})",
+                  delta_color="off")
+    if report.get("index_footprints"):
+        st.table([{"Storage": q, "Index size (MB)": f"{size / 1024 ** 2:.1f}"}
+                  for q, size in report["index_footprints"].items()])
+    st.json(report)
+
+# Import cost of the heavy libraries, which are only loaded when first used
+with st.expander("⏱️ Startup Report"):
+    st.caption(f"This page rendered in {time.perf_counter() - _script_start:.2f}s")
+    imports = registry.startup_report()
+    if imports:
+        st.table([{"Module": name, "Import time (s)": f"{seconds:.2f}"} for name, seconds in imports])
+    st.caption("Embedding model: " + ("loaded" if registry.memory_report()["embedding_model_loaded"]
+                                      else "not loaded yet (loads on first semantic search or during warm-up)"))
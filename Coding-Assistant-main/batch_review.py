@@ -0,0 +1,163 @@
+"""Run Code Quality, Documentation or Test generation over many source files.
+
+Usage:
+    python batch_review.py quality src/ --out reports/
+    python batch_review.py tests app.py utils.py --concurrency 8 --gemini
+"""
+import argparse
+import os
+import sys
+from typing import List
+
+LANGUAGE_BY_EXTENSION = {
+    ".py": "Python",
+    ".js": "JavaScript",
+    ".jsx": "JavaScript",
+    ".ts": "TypeScript",
+    ".tsx": "TypeScript",
+    ".java": "Java",
+    ".cpp": "C++",
+    ".cc": "C++",
+    ".hpp": "C++",
+    ".h": "C++",
+    ".go": "Go",
+    ".rs": "Rust",
+    ".cs": "C#",
+    ".php": "PHP",
+    ".rb": "Ruby",
+}
+
+DEFAULT_TEST_FRAMEWORK = {
+    "Python": "pytest",
+    "JavaScript": "Jest",
+    "TypeScript": "Jest",
+    "Java": "JUnit",
+    "Go": "Go testing",
+    "C#": "NUnit",
+    "Ruby": "RSpec",
+}
+
+DEFAULT_CHECKS = ["performance and efficiency", "security vulnerabilities", "style and best practices"]
+
+# CLI tool name -> (LLMHandler method, report suffix)
+TOOLS = {
+    "quality": ("analyze_quality", "quality.md"),
+    "docs": ("generate_docs", "docs.md"),
+    "tests": ("generate_tests", "tests.md"),
+}
+
+
+def detect_language(filename: str, default: str = None) -> str:
+    """Guess the language of a source file from its extension"""
+    return LANGUAGE_BY_EXTENSION.get(os.path.splitext(filename)[1].lower(), default)
+
+
+def quality_prompt(code: str, language: str, checks: List[str] = None) -> str:
+    """Build the Code Quality prompt"""
+    prompt = f"Analyze this {language} code for {', '.join(checks or DEFAULT_CHECKS)}:\n\n{code}"
+    prompt += "\n\nProvide a detailed analysis with severity levels (Critical/High/Medium/Low) and specific recommendations."
+    return prompt
+
+
+def docs_prompt(code: str, language: str, doc_style: str = "Docstrings/JSDoc", include_examples: bool = True) -> str:
+    """Build the Documentation prompt"""
+    prompt = f"Generate {doc_style} for this {language} code:\n\n{code}"
+    if include_examples:
+        prompt += "\n\nInclude practical usage examples."
+    return prompt
+
+
+def tests_prompt(code: str, language: str, framework: str = None, coverage: int = 80,
+                 include_edge_cases: bool = True, include_mocks: bool = False) -> str:
+    """Build the Test Generator prompt"""
+    framework = framework or DEFAULT_TEST_FRAMEWORK.get(language, "unit testing")
+    prompt = f"Generate {framework} unit tests for this {language} code with {coverage}% coverage:\n\n{code}"
+    if include_edge_cases:
+        prompt += "\n\nInclude tests for edge cases and error conditions."
+    if include_mocks:
+        prompt += "\n\nInclude mocks and stubs for external dependencies."
+    return prompt
+
+
+def collect_files(paths: List[str]) -> List[str]:
+    """Expand files and directories into the list of source files to process"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d not in ("venv", "node_modules", "__pycache__"))
+                files.extend(os.path.join(root, name) for name in sorted(names) if detect_language(name))
+        elif os.path.isfile(path):
+            files.append(path)
+    return files
+
+
+def build_args(tool: str, code: str, language: str) -> tuple:
+    """Positional arguments for the tool's LLMHandler method"""
+    if tool == "quality":
+        return (quality_prompt(code, language),)
+    if tool == "docs":
+        return (docs_prompt(code, language), language)
+    return (tests_prompt(code, language), language)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Batch code review with the AI Coding Assistant")
+    parser.add_argument("tool", choices=sorted(TOOLS))
+    parser.add_argument("paths", nargs="+", help="Source files or directories")
+    parser.add_argument("--out", default="batch_reports", help="Directory for the generated reports")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--gemini", action="store_true", help="Use Gemini (needs GEMINI_API_KEY)")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the model")
+    parser.add_argument("--save-history", action="store_true", help="Also store results in history.db")
+    args = parser.parse_args(argv)
+    
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    
+    import registry
+    
+    files = collect_files(args.paths)
+    if not files:
+        print("No source files found")
+        return 1
+    
+    llm = registry.get_llm(use_gemini=args.gemini, api_key=os.getenv("GEMINI_API_KEY", ""))
+    db = registry.get_db() if args.save_history else None
+    method, suffix = TOOLS[args.tool]
+    
+    jobs = []
+    for path in files:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            code = f.read()
+        language = detect_language(path, "Python")
+        jobs.append((path, language, build_args(args.tool, code, language)))
+    
+    os.makedirs(args.out, exist_ok=True)
+    failures = 0
+    results = llm.batch(method, [job[2] for job in jobs], max_concurrency=args.concurrency,
+                        retries=args.retries, use_cache=not args.no_cache)
+    for done, result in enumerate(results, 1):
+        path, language, _ = jobs[result.index]
+        if result.error:
+            failures += 1
+            print(f"[{done}/{len(jobs)}] FAILED {path}: {result.error}")
+            continue
+        
+        report_path = os.path.join(args.out, os.path.relpath(path).replace(os.sep, "__") + "." + suffix)
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(result.output)
+        if db:
+            db.add_conversation(f"Batch {args.tool}: {path}", result.output, language=language, tool=args.tool)
+        print(f"[{done}/{len(jobs)}] {path} -> {report_path}")
+    
+    print(f"Done: {len(jobs) - failures} succeeded, {failures} failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
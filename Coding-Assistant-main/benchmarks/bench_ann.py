@@ -0,0 +1,111 @@
+"""Build time, query latency and recall@k of the SemanticSearch index kinds on synthetic embeddings.
+
+Vectors are clustered like sentence embeddings (384-dim, unit length); recall is measured against the
+exact flat index:
+
+    python benchmarks/bench_ann.py                       # 10k and 100k vectors
+    python benchmarks/bench_ann.py --sizes 1000000 --queries 200 --kinds hnsw ivf
+    python benchmarks/bench_ann.py --sizes 100000 --quantizations none sq8 pq   # memory vs recall
+"""
+import argparse
+import sys
+import time
+from typing import List
+
+import faiss
+import numpy as np
+
+from common import percentile, print_table, write_json
+
+from embeddings import QUANTIZATIONS, SemanticSearch, choose_index_kind, make_index, normalize
+
+
+def synthetic_embeddings(count: int, dimension: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors scattered around random topic centres"""
+    centres = rng.standard_normal((clusters, dimension)).astype("float32")
+    vectors = centres[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, dimension)).astype("float32")
+    return normalize(vectors)
+
+
+def bench_kind(kind: str, data: np.ndarray, queries: np.ndarray, k: int, truth: np.ndarray = None,
+               quantization: str = "none") -> dict:
+    start = time.perf_counter()
+    index = make_index(kind, data.shape[1], data, quantization)
+    index.add_with_ids(data, np.arange(len(data), dtype="int64"))
+    build = time.perf_counter() - start
+
+    latencies = []
+    found = []
+    reranked = []
+    # SemanticSearch re-ranks PQ candidates with the exact vectors kept in the SQLite embedding cache
+    fetch = k * SemanticSearch.RERANK_FACTOR if quantization == "pq" else k
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), fetch)
+        latencies.append(time.perf_counter() - start)
+        found.append(ids[0][:k])
+        candidates = ids[0][ids[0] >= 0]
+        reranked.append(candidates[np.argsort(-(data[candidates] @ query))][:k])
+    found = np.array(found)
+
+    recall = reranked_recall = 1.0
+    if truth is not None:
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        reranked_recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(reranked, truth)])
+    return {
+        "kind": kind,
+        "quantization": quantization,
+        # Serialized size, which includes codebooks and graph links
+        "bytes_per_vector": faiss.serialize_index(index).nbytes / len(data),
+        "build_s": build,
+        "query_p50_ms": percentile(latencies, 0.5) * 1000,
+        "query_p95_ms": percentile(latencies, 0.95) * 1000,
+        f"recall@{k}": float(recall),
+        "reranked": float(reranked_recall),
+    }, found
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare flat, HNSW and IVF indexes for semantic search")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000])
+    parser.add_argument("--kinds", nargs="+", choices=["flat", "hnsw", "ivf"], default=["flat", "hnsw", "ivf"])
+    parser.add_argument("--quantizations", nargs="+", choices=QUANTIZATIONS, default=["none"])
+    parser.add_argument("--dimension", type=int, default=384, help="all-MiniLM-L6-v2 embeddings are 384-dim")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the result rows to this file")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    rows = []
+    for size in args.sizes:
+        clusters = max(10, size // 200)
+        data = synthetic_embeddings(size, args.dimension, clusters, rng)
+        # Queries near stored vectors, like a question close to an earlier conversation
+        picks = data[rng.integers(0, size, args.queries)]
+        queries = normalize(picks + 0.3 * rng.standard_normal(picks.shape).astype("float32"))
+
+        # Exact neighbours from the flat index are the recall baseline
+        baseline, truth = bench_kind("flat", data, queries, args.k)
+        print(f"{size:,} vectors (auto picks {choose_index_kind(size)})")
+        for kind in args.kinds:
+            for quantization in args.quantizations:
+                if kind == "flat" and quantization == "pq":
+                    continue  # not built by SemanticSearch: a flat PQ index can't filter its searches
+                if kind == "flat" and quantization == "none":
+                    result = baseline
+                else:
+                    result = bench_kind(kind, data, queries, args.k, truth, quantization)[0]
+                rows.append({"size": size, **result})
+
+    print()
+    print_table(rows, ["size", "kind", "quantization", "bytes_per_vector", "build_s", "query_p50_ms", "query_p95_ms", f"recall@{args.k}",
+                       "reranked"])
+    if args.json:
+        write_json(args.json, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
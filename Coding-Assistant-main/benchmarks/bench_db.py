@@ -0,0 +1,141 @@
+"""Throughput and latency of HistoryDB under concurrent writers and readers.
+
+Runs N threads saving conversations and M threads searching and reading them, as concurrent sessions do:
+
+    python benchmarks/bench_db.py                               # 4 writers, 8 readers, 10 seconds
+    python benchmarks/bench_db.py --writers 8 --readers 16 --seconds 30 --json run.json
+    python benchmarks/bench_db.py --legacy                      # connection per call, rollback journal
+    python benchmarks/bench_db.py --write-behind                # queued saves written in batches
+
+--legacy reproduces the previous behaviour (a fresh connection per call and the default rollback journal)
+for a before/after comparison on the same machine.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import List
+
+from common import percentile, print_table, write_json
+
+from database import HistoryDB
+
+WORDS = ["sort", "csv", "async", "http", "sql", "join", "pytest", "regex", "cache", "json", "thread", "lock",
+         "socket", "pandas", "decorator", "generator", "dataclass", "logging", "docker", "flask"]
+
+
+class LegacyHistoryDB(HistoryDB):
+    """HistoryDB opening a default connection per call, on a rollback-journal database"""
+
+    def _init_db(self):
+        super()._init_db()
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def random_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="HistoryDB under concurrent writers and readers")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--seed-rows", type=int, default=2000, help="Conversations saved before the run")
+    parser.add_argument("--legacy", action="store_true", help="Connection per call and rollback journal")
+    parser.add_argument("--write-behind", action="store_true", help="Queue saves and write them in batches")
+    parser.add_argument("--json", help="Write the result rows to this file")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bench_db_")
+    db = (LegacyHistoryDB if args.legacy else HistoryDB)(os.path.join(workdir, "history.db"),
+                                                          write_behind=args.write_behind)
+    rng = random.Random(0)
+    for _ in range(args.seed_rows):
+        db.add_conversation(f"How do I {random_text(rng, 6)}?", random_text(rng, 60), language="Python")
+    db.flush()
+
+    samples = {}  # operation -> latencies in seconds
+    errors = {}  # operation -> failed calls (mostly "database is locked")
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def run(operations, seed: int):
+        rng = random.Random(seed)
+        local = {name: [] for name, _ in operations}
+        failed = {name: 0 for name, _ in operations}
+        while time.perf_counter() < deadline:
+            name, operation = rng.choice(operations)
+            start = time.perf_counter()
+            try:
+                operation(rng)
+                local[name].append(time.perf_counter() - start)
+            except sqlite3.OperationalError:
+                failed[name] += 1
+        with lock:
+            for name in local:
+                samples.setdefault(name, []).extend(local[name])
+                errors[name] = errors.get(name, 0) + failed[name]
+
+    writer_ops = [
+        ("add_conversation", lambda rng: db.add_conversation(f"How do I {random_text(rng, 6)}?",
+                                                             random_text(rng, 60), language="Python")),
+    ]
+    reader_ops = [
+        ("search_lexical", lambda rng: db.search_lexical(random_text(rng, 3), 20)),
+        ("get_conversations", lambda rng: db.get_conversations([rng.randint(1, args.seed_rows) for _ in range(5)])),
+        ("filter_ids", lambda rng: db.filter_ids(language="Python", since="2000-01-01")),
+        ("get_stats", lambda rng: db.get_stats()),
+    ]
+    threads = [threading.Thread(target=run, args=(writer_ops, i)) for i in range(args.writers)]
+    threads += [threading.Thread(target=run, args=(reader_ops, 1000 + i)) for i in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    start = time.perf_counter()
+    db.flush()
+    flush_ms = (time.perf_counter() - start) * 1000
+
+    rows = []
+    for name, values in samples.items():
+        rows.append({
+            "operation": name,
+            "n": len(values),
+            "ops_per_s": len(values) / args.seconds,
+            "p50_ms": percentile(values, 0.5) * 1000 if values else 0.0,
+            "p95_ms": percentile(values, 0.95) * 1000 if values else 0.0,
+            "errors": errors[name],
+        })
+    mode = "legacy: connection per call, rollback journal" if args.legacy else "pooled connections, WAL"
+    if args.write_behind:
+        stats = db.write_stats()
+        mode += f", write-behind ({stats['batches']} batches, avg {stats['avg_batch_size']:.0f} rows)"
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds:g}s, {mode}\n")
+    print_table(rows, ["operation", "n", "ops_per_s", "p50_ms", "p95_ms", "errors"])
+    # Saves per second that reached the database, counting the final flush of a write-behind queue
+    stored = db.count() - args.seed_rows
+    print(f"\nFinal flush: {flush_ms:.1f} ms; {stored / (args.seconds + flush_ms / 1000):.0f} conversations/s stored")
+    if args.json:
+        write_json(args.json, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
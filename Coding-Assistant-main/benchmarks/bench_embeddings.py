@@ -0,0 +1,117 @@
+"""Embedding throughput and query latency of each CPU inference backend of SemanticSearch.
+
+Encodes the passages of synthetic conversations (what a reindex embeds) and single short queries (what a
+search embeds), and checks each backend's vectors against the full-precision PyTorch baseline:
+
+    python benchmarks/bench_embeddings.py
+    python benchmarks/bench_embeddings.py --backends torch onnx-int8 --batch-sizes 32 64 128 --threads 4
+    python benchmarks/bench_embeddings.py --passages 5000 --json run.json
+
+ONNX backends need sentence-transformers>=3.2 and `pip install "sentence-transformers[onnx]"`.
+"""
+import argparse
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+from common import percentile, print_table, write_json
+
+from chunking import conversation_passages
+from embeddings import EMBEDDING_BACKENDS, SemanticSearch, normalize
+
+TOPICS = ["sorting a list", "reading a CSV file", "async HTTP requests", "SQL joins", "unit testing",
+          "regular expressions", "binary search", "caching results", "parsing JSON", "recursion"]
+
+SAMPLE_CODE = '''def load_users(path):
+    users = []
+    for line in open(path):
+        name, age = line.split(",")
+        users.append({"name": name, "age": int(age)})
+    return users
+'''
+
+
+def sample_passages(count: int) -> List[str]:
+    """Passages of realistic length, as chunked for the index"""
+    passages = []
+    i = 0
+    while len(passages) < count:
+        topic = TOPICS[i % len(TOPICS)]
+        response = (f"Here's how to approach {topic} (#{i}): start with the simplest version that works. "
+                    f"Then cover the edge cases and measure before optimizing.\n\n") * 6
+        conv = (i, "", f"How do I handle {topic} in Python?", response, SAMPLE_CODE if i % 3 == 0 else None, None)
+        passages.extend(conversation_passages(conv))
+        i += 1
+    return passages[:count]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare CPU inference backends for the embedding model")
+    parser.add_argument("--backends", nargs="+", choices=EMBEDDING_BACKENDS, default=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[32, 64, 128])
+    parser.add_argument("--threads", type=int, default=0, help="Inference threads, 0 for the runtime default")
+    parser.add_argument("--passages", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", help="Write the result rows to this file")
+    args = parser.parse_args(argv)
+
+    passages = sample_passages(args.passages)
+    queries = [f"how do I speed up {TOPICS[i % len(TOPICS)]} number {i}" for i in range(args.queries)]
+    baseline = None  # torch vectors, which the other backends are compared against
+    rows = []
+
+    for backend in args.backends:
+        search = SemanticSearch(backend=backend, threads=args.threads or None)
+        start = time.perf_counter()
+        search.encode(["warm up"])
+        load_s = time.perf_counter() - start
+
+        vectors = None
+        for batch_size in args.batch_sizes:
+            search.batch_size = batch_size
+            start = time.perf_counter()
+            vectors = normalize(search.encode(passages))
+            elapsed = time.perf_counter() - start
+
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                search.encode([query])
+                latencies.append(time.perf_counter() - start)
+
+            rows.append({
+                "backend": backend,
+                "batch_size": batch_size,
+                "load_s": load_s,
+                "sentences_per_s": len(passages) / elapsed,
+                "query_p50_ms": percentile(latencies, 0.5) * 1000,
+                "query_p95_ms": percentile(latencies, 0.95) * 1000,
+            })
+
+        # A repeated query is answered from the LRU cache instead of the model
+        search.encode_queries(queries)
+        start = time.perf_counter()
+        search.encode_queries(queries)
+        cached_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        if backend == "torch":
+            baseline = vectors
+        # Mean cosine similarity to the float32 PyTorch vectors: how much accuracy the speed-up costs
+        agreement = float(np.mean(np.sum(vectors * baseline, axis=1))) if baseline is not None else None
+        for row in rows:
+            if row["backend"] == backend:
+                row["cached_query_ms"] = cached_ms
+                row["cosine_vs_torch"] = agreement if agreement is not None else "n/a"
+
+    print(f"{len(passages)} passages, {len(queries)} queries, threads={args.threads or 'default'}\n")
+    print_table(rows, ["backend", "batch_size", "load_s", "sentences_per_s", "query_p50_ms", "query_p95_ms",
+                       "cached_query_ms", "cosine_vs_torch"])
+    if args.json:
+        write_json(args.json, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Latency of hybrid keyword + vector retrieval on a large synthetic history.
+
+Seeds a temporary history DB, builds the search index, then times each leg of HybridRetriever and the
+History page's keyword search (two words of each query, all required, BM25-ranked with snippets):
+
+    python benchmarks/bench_retrieval.py                      # 100k conversations, all-MiniLM-L6-v2
+    python benchmarks/bench_retrieval.py --synthetic          # hashed bag-of-words vectors, no model download
+    python benchmarks/bench_retrieval.py --rows 20000 --queries 500 --json run.json
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import zlib
+from typing import List
+
+import numpy as np
+
+from common import StageTimer, print_table, write_json
+
+from database import HistoryDB
+from embeddings import SemanticSearch
+from retrieval import HybridRetriever
+
+TOPICS = ["sort", "csv", "async", "http", "sql", "join", "pytest", "regex", "binary", "search", "cache", "json",
+          "recursion", "thread", "lock", "socket", "pandas", "numpy", "decorator", "generator", "closure",
+          "dataclass", "typing", "logging", "docker", "flask", "django", "react", "rust", "golang"]
+
+
+def synthetic_rows(count: int, rng: np.random.Generator) -> List[tuple]:
+    """Conversations drawn from a skewed vocabulary, so some words are common and others rare"""
+    vocabulary = TOPICS + [f"ident_{i}" for i in range(5000)]
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    weights /= weights.sum()
+    draws = rng.choice(len(vocabulary), size=(count, 70), p=weights)
+    rows = []
+    for i in range(count):
+        words = [vocabulary[w] for w in draws[i]]
+        query = "How do I " + " ".join(words[:8]) + "?"
+        response = " ".join(words[8:]) + "."
+        code = f"def {words[8]}_{i}({words[9]}):\n    return {words[10]}\n" if i % 3 == 0 else None
+        rows.append(("2025-01-01T00:00:00", query, response, code, "Python" if code else None))
+    return rows
+
+
+def hashed_encoder(dimension: int):
+    """Deterministic bag-of-words vectors, standing in for the model when only index cost matters"""
+    def encode(texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), dimension), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                h = zlib.crc32(word.encode("utf-8"))
+                vectors[row, h % dimension] += 1.0 if h & 1 << 31 else -1.0
+        return vectors
+    return encode
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Hybrid retrieval latency on a large history")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--synthetic", action="store_true", help="Hashed bag-of-words vectors instead of the model")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the summary rows to this file")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    timer = StageTimer()
+    workdir = tempfile.mkdtemp(prefix="bench_retrieval_")
+
+    with timer.stage("setup", "db_seed"):
+        db = HistoryDB(os.path.join(workdir, "history.db"))
+        rows = synthetic_rows(args.rows, rng)
+        # One transaction instead of add_conversation per row; the triggers fill the keyword index
+        conn = sqlite3.connect(db.db_path)
+        conn.executemany("""
+            INSERT INTO conversations (timestamp, user_query, ai_response, code_snippet, language)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
+        conn.commit()
+        conn.close()
+
+    search = SemanticSearch()
+    if args.synthetic:
+        search.encode = hashed_encoder(384)
+    with timer.stage("setup", "index_build"):
+        search.attach(db)
+
+    retriever = HybridRetriever(db, search)
+    queries = [rows[i][1] for i in rng.integers(0, len(rows), args.queries)]
+    for query in queries:
+        start = time.perf_counter()
+        retriever.search(query, k=args.k)
+        timer.record("hybrid", "search", time.perf_counter() - start)
+        for name, ms in retriever.last_timings.items():
+            timer.record("hybrid", name[:-3], ms / 1000)
+        with timer.stage("keyword", "search_by_keyword"):
+            db.search_by_keyword(" ".join(query.split()[3:5]), limit=20)
+
+    summary = timer.summary()
+    encoder = "hashed bag-of-words" if args.synthetic else search.model_name
+    print(f"{args.rows:,} conversations, {search.index.ntotal:,} passages in a {search.kind} index, {encoder}\n")
+    print_table(summary, ["group", "stage", "n", "p50_ms", "p95_ms", "mean_ms"])
+    if args.json:
+        write_json(args.json, summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
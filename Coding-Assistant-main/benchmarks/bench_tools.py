@@ -0,0 +1,201 @@
+"""End-to-end latency of every tool's code path, with per-stage timings.
+
+Runs the same calls the pages make (history DB, embedding index, LLM stream, save) against the
+deterministic stub backend, so results are comparable between runs and machines:
+
+    python benchmarks/bench_tools.py --iterations 20 --history 500
+    python benchmarks/bench_tools.py --json run.json --baseline before.json
+    python benchmarks/bench_tools.py --backend ollama       # real local model (or OLLAMA_BASE_URL stub_server)
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+from common import StageTimer, find_regressions, print_table, write_json
+
+from batch_review import docs_prompt, quality_prompt, tests_prompt
+from database import HistoryDB
+from llm_handler import AsyncLLMHandler, LLMHandler, StubBackend, submit
+from retrieval import HybridRetriever
+
+TOOLS = ["chat", "bug_fix", "quality", "refactor", "docs", "tests", "explainer"]
+
+SAMPLE_CODE = '''def average(values):
+    total = 0
+    for v in values:
+        total += v
+    return total / len(values)
+
+
+def load_users(path):
+    users = []
+    for line in open(path):
+        name, age = line.split(",")
+        users.append({"name": name, "age": int(age)})
+    return users
+'''
+
+
+def seed_history(db: HistoryDB, count: int):
+    """Fill the history with synthetic conversations of realistic size"""
+    topics = ["sorting a list", "reading a CSV file", "async HTTP requests", "SQL joins", "unit testing",
+              "regular expressions", "binary search", "caching results", "parsing JSON", "recursion"]
+    for i in range(count):
+        topic = topics[i % len(topics)]
+        db.add_conversation(f"How do I handle {topic} in Python? (#{i})",
+                            f"Here's the deal with {topic}: keep it simple and test the edge cases. " * 8,
+                            SAMPLE_CODE if i % 3 == 0 else None, "Python" if i % 3 == 0 else None)
+
+
+def stream_llm(timer: StageTimer, tool: str, chunks) -> str:
+    """Drain a stream, recording time to first token and total generation time"""
+    start = time.perf_counter()
+    parts = []
+    for chunk in chunks:
+        if not parts:
+            timer.record(tool, "llm_ttft", time.perf_counter() - start)
+        parts.append(chunk)
+    timer.record(tool, "llm", time.perf_counter() - start)
+    return "".join(parts)
+
+
+def run_chat(timer, db, search, llm, i):
+    query = f"How should I cache expensive function calls? (run {i})"
+    context = []
+    if search is not None:
+        # Same steps as the Chat page
+        with timer.stage("chat", "search"):
+            similar = HybridRetriever(db, search).search(query, k=3)
+        context = [f"Q: {s[2]}\nA: {s[3]}" for s in similar]
+    response = stream_llm(timer, "chat", llm.generate_response_stream(query, context, [], use_cache=False))
+    with timer.stage("chat", "save"):
+        db.add_conversation(query, response, tool="chat")
+
+
+def run_bug_fix(timer, db, search, llm, i):
+    allm = AsyncLLMHandler(llm)
+    code = SAMPLE_CODE + f"\n# run {i}\n"
+    fix_prompt = f"Fix the bugs in this Python code:\n\n{code}\n\nError message: ZeroDivisionError"
+    explain_prompt = f"Code:\n{code}\n"
+    # The explanation overlaps with the fix, as on the Bug Fixer page
+    explanation_future = submit(allm.analyze_bugs(explain_prompt, "Python", use_cache=False))
+    fixed = stream_llm(timer, "bug_fix", llm.fix_bug_stream(fix_prompt, "Python", use_cache=False))
+    with timer.stage("bug_fix", "explanation_wait"):
+        explanation_future.result()
+    with timer.stage("bug_fix", "save"):
+        db.add_conversation("Fix bug in Python", fixed, fixed, "Python", tool="bug_fix")
+
+
+def run_quality(timer, db, search, llm, i):
+    prompt = quality_prompt(SAMPLE_CODE + f"\n# run {i}\n", "Python")
+    analysis = stream_llm(timer, "quality", llm.analyze_quality_stream(prompt, use_cache=False))
+    with timer.stage("quality", "save"):
+        db.add_conversation("Quality analysis: Python", analysis, SAMPLE_CODE, "Python", tool="quality")
+
+
+def run_refactor(timer, db, search, llm, i):
+    prompt = f"Refactor this Python code to improve readability:\n\n{SAMPLE_CODE}\n# run {i}\n"
+    prompt += "\n\nIMPORTANT: Preserve the exact behavior and functionality."
+    refactored = stream_llm(timer, "refactor", llm.refactor_code_stream(prompt, "Python", use_cache=False))
+    with timer.stage("refactor", "save"):
+        db.add_conversation("Refactor Python code", refactored, refactored, "Python", tool="refactor")
+
+
+def run_docs(timer, db, search, llm, i):
+    prompt = docs_prompt(SAMPLE_CODE + f"\n# run {i}\n", "Python")
+    docs = stream_llm(timer, "docs", llm.generate_docs_stream(prompt, "Python", use_cache=False))
+    with timer.stage("docs", "save"):
+        db.add_conversation("Generate docs for Python", docs, SAMPLE_CODE, "Python", tool="docs")
+
+
+def run_tests(timer, db, search, llm, i):
+    prompt = tests_prompt(SAMPLE_CODE + f"\n# run {i}\n", "Python")
+    tests = stream_llm(timer, "tests", llm.generate_tests_stream(prompt, "Python", use_cache=False))
+    with timer.stage("tests", "save"):
+        db.add_conversation("Generate tests for Python", tests, tests, "Python", tool="tests")
+
+
+def run_explainer(timer, db, search, llm, i):
+    prompt = f"Explain this Python code at a Detailed level:\n\n{SAMPLE_CODE}\n# run {i}\n"
+    explanation = stream_llm(timer, "explainer", llm.explain_code_stream(prompt, use_cache=False))
+    with timer.stage("explainer", "save"):
+        db.add_conversation("Explain Python code", explanation, SAMPLE_CODE, "Python", tool="explainer")
+
+
+RUNNERS = {
+    "chat": run_chat,
+    "bug_fix": run_bug_fix,
+    "quality": run_quality,
+    "refactor": run_refactor,
+    "docs": run_docs,
+    "tests": run_tests,
+    "explainer": run_explainer,
+}
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Per-stage latency of every tool's code path")
+    parser.add_argument("--tools", nargs="+", choices=TOOLS, default=TOOLS)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--history", type=int, default=200, help="Synthetic conversations to seed the DB with")
+    parser.add_argument("--backend", choices=["stub", "ollama"], default="stub")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=0, help="Stub generation rate, 0 for no delay")
+    parser.add_argument("--response-tokens", type=int, default=200)
+    parser.add_argument("--no-search", action="store_true", help="Skip the embedding model and index stages")
+    parser.add_argument("--json", help="Write the summary rows to this file")
+    parser.add_argument("--baseline", help="Summary JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p50 slowdown vs the baseline")
+    args = parser.parse_args(argv)
+
+    timer = StageTimer()
+    workdir = tempfile.mkdtemp(prefix="bench_tools_")
+
+    with timer.stage("setup", "db_seed"):
+        db = HistoryDB(os.path.join(workdir, "history.db"))
+        seed_history(db, args.history)
+
+    search = None
+    if not args.no_search:
+        with timer.stage("setup", "embedding_model_load"):
+            from embeddings import SemanticSearch
+            search = SemanticSearch()
+            search.encode(["warm up"])
+        with timer.stage("setup", "index_build"):
+            search.attach(db)
+
+    if args.backend == "stub":
+        backend = StubBackend(args.latency, args.tokens_per_sec, args.response_tokens)
+        llm = LLMHandler(backend=backend, enable_cache=False)
+    else:
+        llm = LLMHandler(enable_cache=False)
+
+    for tool in args.tools:
+        for i in range(args.iterations):
+            with timer.stage(tool, "total"):
+                RUNNERS[tool](timer, db, search, llm, i)
+            if search is not None:
+                # Saving only queues the index update; this is how long until it is searchable
+                with timer.stage(tool, "index_flush"):
+                    search.flush()
+
+    rows = timer.summary()
+    print(f"{args.backend} backend, {args.iterations} iterations, {args.history} seeded conversations\n")
+    print_table(rows, ["group", "stage", "n", "p50_ms", "p95_ms", "mean_ms"])
+
+    if args.json:
+        write_json(args.json, rows)
+    if args.baseline:
+        regressions = find_regressions(rows, args.baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:\n" + "\n".join(f"  {r}" for r in regressions))
+            return 1
+        print(f"\nNo stage slower than the baseline by more than {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Shared timing and reporting helpers for the benchmark scripts"""
+import json
+import math
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List
+
+# Benchmarks import the app modules directly
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    values = sorted(values)
+    return values[min(len(values) - 1, max(int(math.ceil(q * len(values))) - 1, 0))]
+
+
+class StageTimer:
+    """Collect wall-clock samples per (group, stage)"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def record(self, group: str, stage: str, seconds: float):
+        self.samples[(group, stage)].append(seconds)
+
+    @contextmanager
+    def stage(self, group: str, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(group, stage, time.perf_counter() - start)
+
+    def summary(self) -> List[Dict]:
+        """One row per (group, stage) with count, p50, p95 and mean in milliseconds"""
+        rows = []
+        for (group, stage), values in self.samples.items():
+            rows.append({
+                "group": group,
+                "stage": stage,
+                "n": len(values),
+                "p50_ms": percentile(values, 0.5) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "mean_ms": sum(values) / len(values) * 1000,
+            })
+        return rows
+
+
+def print_table(rows: List[Dict], columns: List[str]):
+    """Print rows as an aligned text table"""
+    def fmt(value):
+        return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+    widths = {c: max(len(c), *(len(fmt(r[c])) for r in rows)) if rows else len(c) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    print("  ".join("-" * widths[c] for c in columns))
+    for row in rows:
+        print("  ".join(fmt(row[c]).ljust(widths[c]) for c in columns))
+
+
+def write_json(path: str, rows: List[Dict]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=2)
+
+
+def find_regressions(rows: List[Dict], baseline_path: str, tolerance: float = 0.2,
+                     metric: str = "p50_ms", min_ms: float = 1.0) -> List[str]:
+    """Rows whose metric grew by more than tolerance over a saved baseline run"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["group"], r["stage"]): r for r in json.load(f)}
+
+    regressions = []
+    for row in rows:
+        before = baseline.get((row["group"], row["stage"]))
+        # Sub-millisecond stages are too noisy to compare
+        if before and before[metric] >= min_ms and row[metric] > before[metric] * (1 + tolerance):
+            regressions.append(f"{row['group']}/{row['stage']}: {metric} {before[metric]:.2f} -> {row[metric]:.2f}")
+    return regressions
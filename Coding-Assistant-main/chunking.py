@@ -0,0 +1,100 @@
+"""Split conversations into bounded passages for embedding"""
+import re
+from typing import List, Tuple
+
+# all-MiniLM-L6-v2 reads 256 word pieces: roughly 1000 characters of prose, fewer of code
+MAX_PROSE_CHARS = 900
+MAX_CODE_CHARS = 600
+# Later passages of very long conversations are dropped, bounding the encode cost of one item
+MAX_PASSAGES = 32
+
+FENCE = re.compile(r"```[^\n]*\n(.*?)(?:```|$)", re.DOTALL)
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+# A line that starts a top-level block in most languages (not indented, not a closing bracket)
+TOP_LEVEL = re.compile(r"^(?![\s)\]}])\S")
+
+
+def _pack(pieces: List[str], limit: int, separator: str) -> List[str]:
+    """Greedily join consecutive pieces into chunks of at most limit characters"""
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(separator) + len(piece) > limit:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}{separator}{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _hard_split(text: str, limit: int) -> List[str]:
+    """Cut text at whitespace near every limit characters"""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind(" ", 0, limit)
+        cut = cut if cut > limit // 2 else limit
+        parts.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        parts.append(text)
+    return parts
+
+
+def chunk_prose(text: str, limit: int = MAX_PROSE_CHARS) -> List[str]:
+    """Paragraph-aware chunks: whole paragraphs where they fit, else sentences, else hard cuts"""
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if len(paragraph) <= limit:
+            pieces.append(paragraph)
+            continue
+        for sentence in SENTENCE_END.split(paragraph):
+            pieces.extend(_hard_split(sentence, limit))
+    return _pack(pieces, limit, "\n\n")
+
+
+def chunk_code(code: str, limit: int = MAX_CODE_CHARS) -> List[str]:
+    """Code-aware chunks: split between top-level definitions, then between lines of oversized blocks"""
+    blocks, current = [], []
+    for line in code.strip("\n").splitlines():
+        # A new top-level statement after a blank line starts a new block (def, class, function, ...)
+        if current and TOP_LEVEL.match(line) and not current[-1].strip():
+            blocks.append("\n".join(current).strip("\n"))
+            current = []
+        current.append(line.rstrip())
+    if current:
+        blocks.append("\n".join(current).strip("\n"))
+
+    pieces = []
+    for block in blocks:
+        if len(block) <= limit:
+            pieces.append(block)
+            continue
+        lines = []
+        for line in block.splitlines():
+            lines.extend(_hard_split(line, limit) if len(line) > limit else [line])
+        pieces.extend(_pack(lines, limit, "\n"))
+    return _pack([p for p in pieces if p.strip()], limit, "\n\n")
+
+
+def split_fenced(text: str) -> Tuple[str, List[str]]:
+    """Separate the fenced code blocks of a markdown response from its prose"""
+    code = [block for block in FENCE.findall(text) if block.strip()]
+    return FENCE.sub("\n\n", text), code
+
+
+def conversation_passages(conv: Tuple) -> List[str]:
+    """Passages embedded for a conversation row, at most MAX_PASSAGES"""
+    # conv: (id, timestamp, user_query, ai_response, code_snippet, language)
+    prose, code = split_fenced(conv[3] or "")
+    # The question leads the prose, so a short conversation stays a single passage
+    passages = chunk_prose(f"{conv[2] or ''}\n\n{prose}")
+    # Tools that save the generated code as the snippet too would otherwise embed it twice
+    if conv[4] and conv[4].strip() not in (conv[3] or ""):
+        code.append(conv[4])
+    for block in code:
+        passages.extend(chunk_code(block))
+    return passages[:MAX_PASSAGES] or [conv[2] or ""]
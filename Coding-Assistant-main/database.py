@@ -1,16 +1,126 @@
+import atexit
+import queue
+import re
 import sqlite3
-from datetime import datetime
-from typing import List, Tuple
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Pages (and the batch CLI) that save conversations, stored in conversations.tool
+TOOLS = ("chat", "code_generator", "bug_fix", "quality", "refactor", "docs", "tests", "explainer")
+
+# conversation_stats rows computed from scratch: (day, language, tool, conversations), '' for no language/tool
+STATS_FROM_CONVERSATIONS = """
+    SELECT substr(timestamp, 1, 10) AS day, coalesce(language, '') AS language, coalesce(tool, '') AS tool,
+        COUNT(*) AS conversations
+    FROM conversations GROUP BY 1, 2, 3
+"""
 
 class HistoryDB:
-    def __init__(self, db_path: str = "history.db"):
+    # Keyword queries keep at most this many terms, preferring the rarest
+    MAX_QUERY_TERMS = 8
+    # Terms in more than this share of conversations are dropped: they barely move BM25 yet dominate its cost
+    COMMON_TERM_SHARE = 0.05
+    # Keyword search ranks at most this many of the newest matches: BM25 must score every row it orders
+    RANKED_MATCHES = 5_000
+    # Characters of each column in a history page preview (get_page); the full text is loaded on demand
+    PREVIEW_CHARS = {"user_query": 200, "ai_response": 500, "code_snippet": 300}
+    # Idle connections kept open for reuse; a burst beyond this opens extra ones that are closed afterwards
+    POOL_SIZE = 8
+    # Seconds a write waits for another session's write to finish before "database is locked"
+    BUSY_TIMEOUT = 10.0
+    # Per-connection statement cache, so repeated queries skip re-parsing
+    CACHED_STATEMENTS = 128
+    # Write-behind: queued conversations are written once this many are waiting, or the oldest has waited WRITE_DELAY seconds
+    WRITE_BATCH_SIZE = 64
+    WRITE_DELAY = 0.5
+    # Past this many queued conversations a save writes the queue itself, bounding memory and data at risk
+    WRITE_QUEUE_LIMIT = 5_000
+    
+    def __init__(self, db_path: str = "history.db", write_behind: bool = False):
         self.db_path = db_path
+        self._pool = queue.LifoQueue(maxsize=self.POOL_SIZE)
+        self._listeners = []
+        self.fts = False  # whether SQLite has FTS5 and the keyword index exists
+        self._doc_frequencies: Dict[str, int] = {}  # term -> conversations containing it (approximate)
+        self._doc_total = 0
         self._init_db()
+        
+        self.write_behind = write_behind
+        self._pending: List[Tuple] = []  # conversation rows queued for writing, oldest first
+        self._pending_since = 0.0
+        self._write_cond = threading.Condition()
+        self._writing = threading.Lock()  # one batch at a time, so rows are written in the order they were saved
+        self.written = 0
+        self.write_batches = 0
+        self.write_failures = 0
+        self.last_write_ms = 0.0
+        if write_behind:
+            threading.Thread(target=self._write_loop, name="history-writer", daemon=True).start()
+            atexit.register(self.flush)
+    
+    def add_listener(self, listener: Callable[[str, object], None]):
+        """Call listener(event, payload) after each change: ("add", row), ("delete", id) or ("clear", None)"""
+        self._listeners.append(listener)
+    
+    def _notify(self, event: str, payload=None):
+        for listener in self._listeners:
+            try:
+                listener(event, payload)
+            except Exception as e:
+                # A failing listener (e.g. the search index) must not lose the write
+                print(f"History listener failed on {event}: {e}")
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection tuned for many short reads and small writes from several threads"""
+        # isolation_level IMMEDIATE: a write takes the lock when its transaction starts, so it waits
+        # (up to BUSY_TIMEOUT) instead of failing when it can't upgrade a read lock
+        conn = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT, isolation_level="IMMEDIATE",
+                               check_same_thread=False, cached_statements=self.CACHED_STATEMENTS)
+        # WAL makes commits durable at checkpoints rather than on every write; a power cut can
+        # lose the last few conversations but never corrupts the database
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA cache_size = -16000")  # 16 MB of page cache per connection
+        conn.execute("PRAGMA mmap_size = 268435456")  # read through a 256 MB memory map
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+    
+    @contextmanager
+    def _connection(self):
+        """Borrow a pooled connection; the block runs as one transaction, rolled back if it raises"""
+        # Pooled rather than per thread: Streamlit runs every script rerun on a new thread
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+    
+    def close(self):
+        """Write queued conversations, then close the idle pooled connections (busy ones close when returned)"""
+        self.flush()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
     
     def _init_db(self):
         """Initialize database with required tables"""
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT)
         cursor = conn.cursor()
+        # Readers no longer wait for writers (nor writers for readers); the setting is stored in the file
+        cursor.execute("PRAGMA journal_mode = WAL")
+        if cursor.fetchone()[0].lower() != "wal":
+            print(f"SQLite WAL mode unavailable for {self.db_path}, using the rollback journal")
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS conversations (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -18,79 +128,546 @@ class HistoryDB:
                 user_query TEXT NOT NULL,
                 ai_response TEXT NOT NULL,
                 code_snippet TEXT,
-                language TEXT
+                language TEXT,
+                tool TEXT
+            )
+        """)
+        self._migrate(cursor)
+        # Embeddings by content hash, so restarts and index rebuilds only embed changed text
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                text_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (text_hash, model)
             )
         """)
+        self.fts = self._init_fts(cursor)
+        self._init_stats(cursor)
         conn.commit()
         conn.close()
     
-    def add_conversation(self, user_query: str, ai_response: str, 
-                        code_snippet: str = None, language: str = None):
-        """Store a conversation turn"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _migrate(self, cursor):
+        """Bring databases created by older versions up to the current schema"""
+        cursor.execute("PRAGMA table_info(conversations)")
+        if "tool" not in {column[1] for column in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE conversations ADD COLUMN tool TEXT")
+            # Older rows are attributed to a tool by the titles the pages give them
+            cursor.execute("""
+                UPDATE conversations SET tool = CASE
+                    WHEN user_query LIKE 'Fix bug in %' THEN 'bug_fix'
+                    WHEN user_query LIKE 'Quality analysis: %' OR user_query LIKE 'Batch quality: %' THEN 'quality'
+                    WHEN user_query LIKE 'Refactor %' THEN 'refactor'
+                    WHEN user_query LIKE 'Document %' OR user_query LIKE 'Batch docs: %' THEN 'docs'
+                    WHEN user_query LIKE 'Generate tests for %' OR user_query LIKE 'Batch tests: %' THEN 'tests'
+                    WHEN user_query LIKE 'Explain % code' THEN 'explainer'
+                    WHEN code_snippet IS NOT NULL AND language IS NOT NULL THEN 'code_generator'
+                    ELSE 'chat'
+                END
+            """)
+        # Filtered search narrows by these before touching the vector index, and history pages (newest
+        # first, optionally filtered) read them in order; every index implicitly ends with the id
+        cursor.execute("DROP INDEX IF EXISTS idx_conversations_language")
+        cursor.execute("DROP INDEX IF EXISTS idx_conversations_tool")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations (timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversations_language_time ON conversations (language, timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversations_tool_time ON conversations (tool, timestamp)")
+    
+    def _init_stats(self, cursor):
+        """Conversation counts per day, language and tool, kept current by triggers so dashboards never scan history"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'conversation_stats'")
+        exists = cursor.fetchone() is not None
+        cursor.executescript("""
+            CREATE TABLE IF NOT EXISTS conversation_stats (
+                day TEXT NOT NULL,
+                language TEXT NOT NULL,
+                tool TEXT NOT NULL,
+                conversations INTEGER NOT NULL,
+                PRIMARY KEY (day, language, tool)
+            ) WITHOUT ROWID;
+            CREATE TRIGGER IF NOT EXISTS conversation_stats_insert AFTER INSERT ON conversations BEGIN
+                INSERT INTO conversation_stats (day, language, tool, conversations)
+                VALUES (substr(new.timestamp, 1, 10), coalesce(new.language, ''), coalesce(new.tool, ''), 1)
+                ON CONFLICT (day, language, tool) DO UPDATE SET conversations = conversations + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS conversation_stats_delete AFTER DELETE ON conversations BEGIN
+                UPDATE conversation_stats SET conversations = conversations - 1
+                WHERE day = substr(old.timestamp, 1, 10) AND language = coalesce(old.language, '')
+                    AND tool = coalesce(old.tool, '');
+                DELETE FROM conversation_stats
+                WHERE day = substr(old.timestamp, 1, 10) AND language = coalesce(old.language, '')
+                    AND tool = coalesce(old.tool, '') AND conversations <= 0;
+            END;
+            CREATE TRIGGER IF NOT EXISTS conversation_stats_update AFTER UPDATE OF timestamp, language, tool ON conversations BEGIN
+                UPDATE conversation_stats SET conversations = conversations - 1
+                WHERE day = substr(old.timestamp, 1, 10) AND language = coalesce(old.language, '')
+                    AND tool = coalesce(old.tool, '');
+                DELETE FROM conversation_stats
+                WHERE day = substr(old.timestamp, 1, 10) AND language = coalesce(old.language, '')
+                    AND tool = coalesce(old.tool, '') AND conversations <= 0;
+                INSERT INTO conversation_stats (day, language, tool, conversations)
+                VALUES (substr(new.timestamp, 1, 10), coalesce(new.language, ''), coalesce(new.tool, ''), 1)
+                ON CONFLICT (day, language, tool) DO UPDATE SET conversations = conversations + 1;
+            END;
+        """)
+        if not exists:
+            # Count conversations saved before the rollup existed
+            cursor.execute(f"INSERT INTO conversation_stats (day, language, tool, conversations) {STATS_FROM_CONVERSATIONS}")
+    
+    def rebuild_stats(self) -> int:
+        """Recompute the statistics rollup from the conversations; returns how many rollup rows were wrong"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            # Missing or miscounted rows, then rows for conversations that no longer exist
+            cursor.execute(f"SELECT COUNT(*) FROM ({STATS_FROM_CONVERSATIONS} EXCEPT SELECT * FROM conversation_stats)")
+            wrong = cursor.fetchone()[0]
+            cursor.execute(f"""
+                SELECT COUNT(*) FROM (SELECT day, language, tool FROM conversation_stats
+                EXCEPT SELECT day, language, tool FROM ({STATS_FROM_CONVERSATIONS}))
+            """)
+            wrong += cursor.fetchone()[0]
+            cursor.execute("DELETE FROM conversation_stats")
+            cursor.execute(f"INSERT INTO conversation_stats (day, language, tool, conversations) {STATS_FROM_CONVERSATIONS}")
+        return wrong
+    
+    def _init_fts(self, cursor) -> bool:
+        """Full-text index over the conversations, kept current by triggers; False without FTS5"""
+        cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'conversations_fts'")
+        row = cursor.fetchone()
+        if row and "prefix" not in row[0]:
+            # Created by an older version without prefix indexes; rebuilt below from the conversations
+            cursor.execute("DROP TABLE IF EXISTS conversations_fts_vocab")
+            cursor.execute("DROP TABLE conversations_fts")
+            row = None
+        try:
+            # External content: the index stores tokens only, the text stays in conversations.
+            # "_" is part of a token so snake_case identifiers in code match whole.
+            # Prefix indexes on the first 2 and 3 characters keep search-as-you-type prefix queries fast.
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+                    user_query, ai_response, code_snippet,
+                    content='conversations', content_rowid='id', tokenize="unicode61 tokenchars '_'",
+                    prefix='2 3'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            print(f"SQLite FTS5 unavailable, keyword retrieval falls back to LIKE: {e}")
+            return False
+        cursor.executescript("""
+            CREATE TRIGGER IF NOT EXISTS conversations_fts_insert AFTER INSERT ON conversations BEGIN
+                INSERT INTO conversations_fts (rowid, user_query, ai_response, code_snippet)
+                VALUES (new.id, new.user_query, new.ai_response, new.code_snippet);
+            END;
+            CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON conversations BEGIN
+                INSERT INTO conversations_fts (conversations_fts, rowid, user_query, ai_response, code_snippet)
+                VALUES ('delete', old.id, old.user_query, old.ai_response, old.code_snippet);
+            END;
+            CREATE TRIGGER IF NOT EXISTS conversations_fts_update AFTER UPDATE ON conversations BEGIN
+                INSERT INTO conversations_fts (conversations_fts, rowid, user_query, ai_response, code_snippet)
+                VALUES ('delete', old.id, old.user_query, old.ai_response, old.code_snippet);
+                INSERT INTO conversations_fts (rowid, user_query, ai_response, code_snippet)
+                VALUES (new.id, new.user_query, new.ai_response, new.code_snippet);
+            END;
+        """)
         cursor.execute("""
-            INSERT INTO conversations (timestamp, user_query, ai_response, code_snippet, language)
-            VALUES (?, ?, ?, ?, ?)
-        """, (datetime.now().isoformat(), user_query, ai_response, code_snippet, language))
-        conn.commit()
-        conn.close()
+            CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts_vocab USING fts5vocab(conversations_fts, row)
+        """)
+        if row is None:
+            # Index conversations saved before the keyword index existed
+            cursor.execute("INSERT INTO conversations_fts (conversations_fts) VALUES ('rebuild')")
+        return True
+    
+    def add_conversation(self, user_query: str, ai_response: str, 
+                        code_snippet: str = None, language: str = None, tool: str = None) -> Optional[int]:
+        """Store a conversation turn and return its id (None in write-behind mode, where it is queued)"""
+        row = (datetime.now().isoformat(), user_query, ai_response, code_snippet, language, tool)
+        if self.write_behind:
+            with self._write_cond:
+                if not self._pending:
+                    self._pending_since = time.monotonic()
+                self._pending.append(row)
+                self._write_cond.notify()
+                backlog = len(self._pending) >= self.WRITE_QUEUE_LIMIT
+            if backlog:
+                self._write_pending()
+            return None
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO conversations (timestamp, user_query, ai_response, code_snippet, language, tool)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, row)
+            conversation_id = cursor.lastrowid
+        self._notify("add", (conversation_id,) + row)
+        return conversation_id
+    
+    def _write_loop(self):
+        while True:
+            with self._write_cond:
+                self._write_cond.wait_for(lambda: self._pending)
+                # A full batch goes at once, a partial one when its oldest row has waited WRITE_DELAY
+                self._write_cond.wait_for(lambda: len(self._pending) >= self.WRITE_BATCH_SIZE,
+                                          max(0.0, self._pending_since + self.WRITE_DELAY - time.monotonic()))
+            self._write_pending()
+    
+    def _write_pending(self) -> bool:
+        """Write every queued conversation in one transaction, then notify listeners; False if it failed"""
+        with self._writing:
+            with self._write_cond:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return True
+            start = time.monotonic()
+            try:
+                with self._connection() as conn:
+                    cursor = conn.cursor()
+                    # Taking the write lock first means every id above the current maximum is one of ours
+                    cursor.execute("BEGIN IMMEDIATE")
+                    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM conversations")
+                    last_id = cursor.fetchone()[0]
+                    cursor.executemany("""
+                        INSERT INTO conversations (timestamp, user_query, ai_response, code_snippet, language, tool)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """, rows)
+                    cursor.execute("SELECT id FROM conversations WHERE id > ? ORDER BY id", (last_id,))
+                    ids = [row[0] for row in cursor.fetchall()]
+            except sqlite3.Error as e:
+                # Keep the rows; the writer retries them after WRITE_DELAY
+                print(f"Writing {len(rows)} queued conversations failed: {e}")
+                with self._write_cond:
+                    self._pending[:0] = rows
+                    self._pending_since = time.monotonic()
+                    self.write_failures += len(rows)
+                return False
+            
+            self.written += len(rows)
+            self.write_batches += 1
+            self.last_write_ms = (time.monotonic() - start) * 1000
+            for conversation_id, row in zip(ids, rows):
+                self._notify("add", (conversation_id,) + row)
+        return True
+    
+    def flush(self) -> bool:
+        """Write the conversations queued in write-behind mode now; False if that failed (they stay queued)"""
+        return self._write_pending()
+    
+    def write_stats(self) -> dict:
+        """Write-behind queue depth, age of the oldest queued conversation and batch statistics"""
+        with self._write_cond:
+            pending = len(self._pending)
+            oldest = time.monotonic() - self._pending_since if pending else 0.0
+        return {
+            "write_behind": self.write_behind,
+            "queue_depth": pending,
+            "oldest_wait_seconds": oldest,
+            "written": self.written,
+            "batches": self.write_batches,
+            "avg_batch_size": self.written / self.write_batches if self.write_batches else 0.0,
+            "last_batch_ms": self.last_write_ms,
+            "failures": self.write_failures,
+        }
     
     def get_all_conversations(self) -> List[Tuple]:
         """Retrieve all conversation history"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM conversations ORDER BY timestamp DESC")
-        results = cursor.fetchall()
-        conn.close()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM conversations ORDER BY timestamp DESC")
+            results = cursor.fetchall()
         return results
     
-    def search_by_keyword(self, keyword: str) -> List[Tuple]:
-        """Search conversations by keyword"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM conversations 
-            WHERE user_query LIKE ? OR ai_response LIKE ? OR code_snippet LIKE ?
-            ORDER BY timestamp DESC
-        """, (f"%{keyword}%", f"%{keyword}%", f"%{keyword}%"))
-        results = cursor.fetchall()
-        conn.close()
+    def get_page(self, after: Tuple[str, int] = None, limit: int = 10, language: str = None, tool: str = None,
+                 since: str = None, until: str = None) -> List[Tuple]:
+        """Preview rows of the next limit conversations, newest first, following the (timestamp, id) key after"""
+        # Keyset pagination: the index seeks straight to the key, so page 1000 costs the same as page 1.
+        # Rows are (id, timestamp, user_query, ai_response, code_snippet, language, tool, response length,
+        # code length, query length), the text columns cut to PREVIEW_CHARS; the key of the next page is
+        # (row[1], row[0]).
+        where, params = self._filter_sql(language, tool, since, until)
+        if after:
+            where = " AND ".join(filter(None, [where, "(timestamp, id) < (?, ?)"]))
+            params += list(after)
+        previews = ", ".join(f"substr({column}, 1, {chars})" for column, chars in self.PREVIEW_CHARS.items())
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT id, timestamp, {previews}, language, tool, length(ai_response), length(code_snippet),
+                       length(user_query)
+                FROM conversations {"WHERE " + where if where else ""}
+                ORDER BY timestamp DESC, id DESC LIMIT ?
+            """, params + [limit])
+            results = cursor.fetchall()
+        return results
+    
+    def count(self, language: str = None, tool: str = None, since: str = None, until: str = None) -> int:
+        """Number of conversations matching the filters"""
+        if not since and not until:
+            # Whole-history counts come from the rollup, whatever the history size
+            where, params = self._filter_sql(language, tool, table="conversation_stats")
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT COALESCE(SUM(conversations), 0) FROM conversation_stats {'WHERE ' + where if where else ''}", params)
+                return cursor.fetchone()[0]
+        where, params = self._filter_sql(language, tool, since, until)
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            # Counts entries of the narrowest covering index, never reading the conversation text
+            cursor.execute(f"SELECT COUNT(*) FROM conversations {'WHERE ' + where if where else ''}", params)
+            return cursor.fetchone()[0]
+    
+    @staticmethod
+    def _filter_sql(language: str = None, tool: str = None, since: str = None, until: str = None,
+                    table: str = "conversations") -> Tuple[str, list]:
+        """AND-ed WHERE conditions (empty string for none) and their parameters; since/until are ISO timestamps"""
+        conditions, params = [], []
+        for condition, value in ((f"{table}.language = ?", language), (f"{table}.tool = ?", tool),
+                                 (f"{table}.timestamp >= ?", since), (f"{table}.timestamp < ?", until)):
+            if value:
+                conditions.append(condition)
+                params.append(value)
+        return " AND ".join(conditions), params
+    
+    def filter_ids(self, language: str = None, tool: str = None, since: str = None,
+                   until: str = None) -> Optional[List[int]]:
+        """Ids of the conversations matching the filters, or None when there are no filters"""
+        where, params = self._filter_sql(language, tool, since, until)
+        if not where:
+            return None
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT id FROM conversations WHERE {where}", params)
+            results = [row[0] for row in cursor.fetchall()]
+        return results
+    
+    @staticmethod
+    def match_expression(keyword: str) -> str:
+        """FTS5 query matching every word of keyword: "quoted text" is a phrase, word* a prefix"""
+        terms = []
+        for phrase, word in re.findall(r'"([^"]*)"?|(\S+)', keyword):
+            words = re.findall(r"\w+", phrase or word)
+            if not words:
+                continue
+            # Quoted, so words like AND/NEAR and punctuation are never FTS5 syntax
+            term = '"' + " ".join(words) + '"'
+            if word.endswith("*"):
+                term += "*"
+            terms.append(term)
+        return " ".join(terms)
+    
+    def search_by_keyword(self, keyword: str, language: str = None, tool: str = None,
+                          since: str = None, until: str = None, limit: int = 50, offset: int = 0) -> List[Tuple]:
+        """Conversations containing every word of keyword, best BM25 match first, with a highlighted snippet"""
+        # Rows are the conversation columns plus the snippet (matches in **bold**; None without FTS5)
+        where, params = self._filter_sql(language, tool, since, until)
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            if self.fts:
+                match = self.match_expression(keyword)
+                if not match:
+                    return []
+                # Walking matches newest first is cheap, so find where the newest RANKED_MATCHES end and
+                # only rank those; a one-word query matching most of a huge history stays interactive
+                cursor.execute(f"""
+                    SELECT conversations_fts.rowid
+                    FROM conversations_fts JOIN conversations ON conversations.id = conversations_fts.rowid
+                    WHERE conversations_fts MATCH ? {"AND " + where if where else ""}
+                    ORDER BY conversations_fts.rowid DESC LIMIT 1 OFFSET ?
+                """, [match] + params + [max(self.RANKED_MATCHES, offset + limit) - 1])
+                oldest = cursor.fetchone()
+                cursor.execute(f"""
+                    SELECT conversations_fts.rowid
+                    FROM conversations_fts JOIN conversations ON conversations.id = conversations_fts.rowid
+                    WHERE conversations_fts MATCH ? AND conversations_fts.rowid >= ? {"AND " + where if where else ""}
+                    ORDER BY rank LIMIT ? OFFSET ?
+                """, [match, oldest[0] if oldest else 0] + params + [limit, offset])
+                ranked = [row[0] for row in cursor.fetchall()]
+                if not ranked:
+                    return []
+                # Snippets are built only for the page of results, not for every row the ranking scored
+                cursor.execute(f"""
+                    SELECT conversations.*, snippet(conversations_fts, -1, '**', '**', '…', 24)
+                    FROM conversations_fts JOIN conversations ON conversations.id = conversations_fts.rowid
+                    WHERE conversations_fts MATCH ? AND conversations_fts.rowid IN ({",".join("?" * len(ranked))})
+                """, [match] + ranked)
+                rows = {row[0]: row for row in cursor.fetchall()}
+                return [rows[i] for i in ranked if i in rows]
+            else:
+                cursor.execute(f"""
+                    SELECT *, NULL FROM conversations 
+                    WHERE (user_query LIKE ? OR ai_response LIKE ? OR code_snippet LIKE ?) {"AND " + where if where else ""}
+                    ORDER BY timestamp DESC LIMIT ? OFFSET ?
+                """, [f"%{keyword}%", f"%{keyword}%", f"%{keyword}%"] + params + [limit, offset])
+            results = cursor.fetchall()
         return results
     
+    def _query_terms(self, cursor, words: List[str]) -> List[str]:
+        """The query words worth matching: the rarest few, leaving out ones most conversations contain"""
+        # The live count comes from the rollup, so reading it on every call is cheap
+        cursor.execute("SELECT COALESCE(SUM(conversations), 0) FROM conversation_stats")
+        total = cursor.fetchone()[0]
+        # Document frequencies change slowly, so they are cached until the history grows or shrinks by a tenth.
+        # Local references: another thread may replace the cache while this one reads it.
+        frequencies, cached_total = self._doc_frequencies, self._doc_total
+        if len(frequencies) > 20_000 or abs(total - cached_total) > cached_total * 0.1:
+            frequencies = {}
+            self._doc_frequencies, self._doc_total = frequencies, total
+        counts = {}
+        for word in words:
+            if word not in frequencies:
+                cursor.execute("SELECT doc FROM conversations_fts_vocab WHERE term = ?", (word,))
+                row = cursor.fetchone()
+                # A word the history doesn't contain yet may be in the next conversation, so it isn't cached
+                if not row or not row[0]:
+                    counts[word] = 0
+                    continue
+                frequencies[word] = row[0]
+            counts[word] = frequencies[word]
+        
+        ranked = sorted((df, word) for word, df in counts.items() if df)
+        terms = [word for df, word in ranked if df <= total * self.COMMON_TERM_SHARE]
+        # Only common words: still rank by the two least common
+        return (terms or [word for _, word in ranked[:2]])[:self.MAX_QUERY_TERMS]
+    
+    def search_lexical(self, query: str, limit: int = 20, language: str = None, tool: str = None,
+                       since: str = None, until: str = None) -> List[int]:
+        """Ids of the conversations best matching any word of the query, by BM25 rank"""
+        words = list(dict.fromkeys(re.findall(r"\w+", query.lower())))
+        if not words:
+            return []
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            if self.fts:
+                terms = self._query_terms(cursor, words)
+                if not terms:
+                    return []
+                # Quoted, so words like AND/NEAR and punctuation are never FTS5 syntax
+                match = " OR ".join(f'"{term}"' for term in terms)
+                where, params = self._filter_sql(language, tool, since, until)
+                if where:
+                    cursor.execute(f"""
+                        SELECT conversations_fts.rowid FROM conversations_fts
+                        JOIN conversations ON conversations.id = conversations_fts.rowid
+                        WHERE conversations_fts MATCH ? AND {where}
+                        ORDER BY rank LIMIT ?
+                    """, [match] + params + [limit])
+                else:
+                    cursor.execute("""
+                        SELECT rowid FROM conversations_fts WHERE conversations_fts MATCH ?
+                        ORDER BY rank LIMIT ?
+                    """, (match, limit))
+            else:
+                where, params = self._filter_sql(language, tool, since, until)
+                cursor.execute(f"""
+                    SELECT id FROM conversations
+                    WHERE (user_query LIKE ? OR ai_response LIKE ? OR code_snippet LIKE ?) {"AND " + where if where else ""}
+                    ORDER BY timestamp DESC LIMIT ?
+                """, [f"%{query}%", f"%{query}%", f"%{query}%"] + params + [limit])
+            results = [row[0] for row in cursor.fetchall()]
+        return results
+    
+    def get_conversations(self, conversation_ids: List[int]) -> List[Tuple]:
+        """Conversation rows by id, in the order given (missing ids are skipped)"""
+        rows = {}
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(conversation_ids), 500):
+                chunk = conversation_ids[start:start + 500]
+                cursor.execute(f"SELECT * FROM conversations WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                rows.update((row[0], row) for row in cursor.fetchall())
+        return [rows[i] for i in conversation_ids if i in rows]
+    
     def clear_all(self):
         """Clear all conversation history"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM conversations")
-        conn.commit()
-        conn.close()
+        # Queued conversations are history too; written first so listeners see them added, then cleared
+        self.flush()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM conversations")
+            # Embeddings are derived from the history, so they go too
+            cursor.execute("DELETE FROM embedding_cache")
+        self._doc_frequencies, self._doc_total = {}, 0
+        self._notify("clear")
     
     def delete_conversation(self, conversation_id: int):
         """Delete a specific conversation"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
-        conn.commit()
-        conn.close()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+        self._notify("delete", conversation_id)
+    
+    def get_cached_embeddings(self, text_hashes: List[str], model: str) -> Dict[str, bytes]:
+        """Look up stored embedding vectors (raw float32 bytes) by text hash"""
+        found = {}
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(text_hashes), 500):
+                chunk = text_hashes[start:start + 500]
+                cursor.execute(f"""
+                    SELECT text_hash, vector FROM embedding_cache
+                    WHERE model = ? AND text_hash IN ({",".join("?" * len(chunk))})
+                """, [model] + chunk)
+                found.update(cursor.fetchall())
+        return found
+    
+    def cache_embeddings(self, model: str, vectors: Dict[str, bytes]):
+        """Store embedding vectors (raw float32 bytes) by text hash"""
+        if not vectors:
+            return
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (text_hash, model, vector) VALUES (?, ?, ?)",
+                [(text_hash, model, vector) for text_hash, vector in vectors.items()]
+            )
     
     def get_stats(self):
-        """Get database statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Get database statistics (from the rollup, so the cost doesn't grow with the history)"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            # Total conversations
+            cursor.execute("SELECT COALESCE(SUM(conversations), 0) FROM conversation_stats")
+            total = cursor.fetchone()[0]
+            
+            # Conversations by language and by tool
+            cursor.execute("""
+                SELECT language, SUM(conversations) 
+                FROM conversation_stats 
+                WHERE language != '' 
+                GROUP BY language
+            """)
+            by_language = cursor.fetchall()
+            cursor.execute("SELECT tool, SUM(conversations) FROM conversation_stats WHERE tool != '' GROUP BY tool")
+            by_tool = cursor.fetchall()
         
-        # Total conversations
-        cursor.execute("SELECT COUNT(*) FROM conversations")
-        total = cursor.fetchone()[0]
-        
-        # Conversations by language
-        cursor.execute("""
-            SELECT language, COUNT(*) 
-            FROM conversations 
-            WHERE language IS NOT NULL 
-            GROUP BY language
-        """)
-        by_language = cursor.fetchall()
+        return {"total": total, "by_language": dict(by_language), "by_tool": dict(by_tool)}
+    
+    def usage_series(self, days: int = 30, group_by: str = None) -> Dict[str, List]:
+        """Conversations per day over the last days days, as chart columns: {"day": [...], series: [...]}"""
+        # One series per language or tool with group_by="language"/"tool" ("none" for rows without one),
+        # else a single "conversations" series; days without conversations count 0
+        if group_by not in (None, "language", "tool"):
+            raise ValueError(f"Unsupported usage grouping: {group_by}")
+        first = datetime.now().date() - timedelta(days=days - 1)
+        day_list = [(first + timedelta(days=i)).isoformat() for i in range(days)]
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT day, {group_by or "'conversations'"}, SUM(conversations) FROM conversation_stats
+                WHERE day >= ? GROUP BY 1, 2
+            """, (day_list[0],))
+            rows = cursor.fetchall()
         
-        conn.close()
-        return {"total": total, "by_language": dict(by_language)}
+        positions = {day: i for i, day in enumerate(day_list)}
+        series = {}
+        for day, group, conversations in rows:
+            if day in positions:
+                series.setdefault(group or "none", [0] * days)[positions[day]] = conversations
+        return {"day": day_list, **dict(sorted(series.items()))}
+
+
+if __name__ == "__main__":
+    # python database.py [history.db]: consistency check and repair of the statistics rollup
+    import sys
+    db = HistoryDB(sys.argv[1] if len(sys.argv) > 1 else "history.db")
+    print(f"Statistics rebuilt; {db.rebuild_stats()} rollup rows were out of date")
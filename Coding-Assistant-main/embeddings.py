@@ -1,53 +1,629 @@
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from typing import List, Tuple
+from typing import Dict, List, Tuple
+import atexit
+from collections import OrderedDict
+import hashlib
+import json
+import math
+import os
+import threading
+
+from chunking import MAX_PASSAGES, conversation_passages
+from index_worker import IndexWorker
+from lazy_imports import load
+
+faiss = load("faiss")
+
+# "auto" starts with exact search and moves to approximate indexes as the history grows
+INDEX_KINDS = ("auto", "flat", "hnsw", "ivf")
+FLAT_MAX_VECTORS = 10_000
+HNSW_MAX_VECTORS = 500_000
+IVF_MIN_TRAINING = 1_000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 256
+# Vector storage: float32, 8-bit scalar quantization (4x smaller) or product quantization (32x smaller)
+QUANTIZATIONS = ("none", "sq8", "pq")
+# Vectors needed to train the quantizer; smaller histories stay float32 (and take little memory anyway)
+QUANTIZE_MIN_VECTORS = {"none": 0, "sq8": 1_000, "pq": 10_000}
+# Embedding model runtimes: PyTorch, PyTorch with int8 Linear layers, ONNX Runtime, ONNX Runtime int8
+EMBEDDING_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+# Quantized ONNX export shipped in the all-MiniLM-L6-v2 hub repo (AVX2 runs on any x86-64 server CPU)
+ONNX_INT8_FILE = "onnx/model_quint8_avx2.onnx"
+PQ_SUB_DIMS = 8  # dimensions per product-quantizer byte: 384-dim vectors become 48-byte codes
+# Vectors are passages, with id conversation_id * PASSAGE_STRIDE + position
+PASSAGE_STRIDE = 64
+assert MAX_PASSAGES <= PASSAGE_STRIDE
+
+def choose_index_kind(count: int, configured: str = "auto") -> str:
+    """Index kind for a corpus size: flat (exact) up to 10k vectors, then HNSW, then IVF"""
+    if configured == "ivf" and count < IVF_MIN_TRAINING:
+        return "flat"  # too few vectors to train centroids
+    if configured != "auto":
+        return configured
+    if count <= FLAT_MAX_VECTORS:
+        return "flat"
+    if count <= HNSW_MAX_VECTORS:
+        return "hnsw"
+    return "ivf"
+
+def load_embedding_model(model_name: str, backend: str = "torch", threads: int = None):
+    """SentenceTransformer on the CPU runtime named by backend; falls back to plain PyTorch if that is unavailable"""
+    sentence_transformers = load("sentence_transformers")
+    if backend.startswith("onnx"):
+        model_kwargs = {}
+        if backend == "onnx-int8":
+            model_kwargs["file_name"] = os.getenv("EMBEDDING_ONNX_FILE", ONNX_INT8_FILE)
+        try:
+            # Needs sentence-transformers>=3.2 with the onnx extra (optimum, onnxruntime)
+            if threads:
+                session_options = load("onnxruntime").SessionOptions()
+                session_options.intra_op_num_threads = threads
+                model_kwargs["session_options"] = session_options
+            return sentence_transformers.SentenceTransformer(model_name, device="cpu", backend="onnx",
+                                                             model_kwargs=model_kwargs)
+        except Exception as e:
+            print(f"ONNX embedding backend unavailable, using PyTorch: {e}")
+            backend = "torch"
+    
+    if threads:
+        load("torch").set_num_threads(threads)
+    model = sentence_transformers.SentenceTransformer(model_name, device="cpu")
+    if backend == "torch-int8":
+        torch = load("torch")
+        # int8 weights for every Linear layer, activations quantized on the fly: ~2x faster on CPU
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+def choose_quantization(count: int, configured: str = "none", kind: str = None) -> str:
+    """Vector storage for a corpus size and index kind: the configured quantization once there is enough to train it"""
+    # FAISS's flat PQ index can't take an id selector, so filtered searches would fail; flat indexes use sq8
+    if configured == "pq" and kind == "flat":
+        configured = "sq8"
+    return configured if count >= QUANTIZE_MIN_VECTORS[configured] else "none"
+
+def pq_subquantizers(dimension: int) -> int:
+    """Number of PQ sub-vectors, about PQ_SUB_DIMS dimensions each and dividing the dimension evenly"""
+    return next(m for m in range(max(1, dimension // PQ_SUB_DIMS), 0, -1) if dimension % m == 0)
+
+def index_footprint(kind: str, quantization: str, count: int, dimension: int) -> int:
+    """Approximate bytes an index of count vectors holds (codes, ids and graph links; not codebooks)"""
+    code = {"none": 4 * dimension, "sq8": dimension, "pq": pq_subquantizers(dimension)}[quantization]
+    per_vector = code + 8  # 64-bit id
+    if kind == "hnsw":
+        per_vector += 2 * HNSW_M * 4 * 1.05  # level-0 links, plus the few vectors on upper levels
+    return int(count * per_vector)
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Unit-length copy of the vectors, so inner product is cosine similarity"""
+    vectors = np.array(vectors, dtype='float32', copy=True)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def tune_index(index, kind: str):
+    """Set the query-time accuracy/speed knobs (also after loading from disk)"""
+    if kind == "hnsw":
+        faiss.downcast_index(index.index).hnsw.efSearch = HNSW_EF_SEARCH
+    elif kind == "ivf":
+        index.nprobe = max(1, min(index.nlist, int(math.sqrt(index.nlist))))
+    return index
+
+def passage_ids(conversation_id: int, count: int) -> np.ndarray:
+    """Vector ids of a conversation's passages"""
+    return np.arange(count, dtype='int64') + conversation_id * PASSAGE_STRIDE
+
+def make_index(kind: str, dimension: int, training_vectors: np.ndarray = None, quantization: str = "none"):
+    """Empty cosine-similarity index of the given kind keyed by passage id (quantizers and IVF are trained first)"""
+    ip = faiss.METRIC_INNER_PRODUCT
+    sq8 = faiss.ScalarQuantizer.QT_8bit
+    m = pq_subquantizers(dimension)
+    if kind == "hnsw":
+        if quantization == "sq8":
+            hnsw = faiss.IndexHNSWSQ(dimension, sq8, HNSW_M, ip)
+        elif quantization == "pq":
+            hnsw = faiss.IndexHNSWPQ(dimension, m, HNSW_M, 8, ip)
+        else:
+            hnsw = faiss.IndexHNSWFlat(dimension, HNSW_M, ip)
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index = faiss.IndexIDMap(hnsw)
+    elif kind == "ivf":
+        # ~4*sqrt(n) lists, with at least 39 training points per centroid as FAISS recommends
+        count = len(training_vectors)
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+        centroids = faiss.IndexFlatIP(dimension)
+        if quantization == "sq8":
+            index = faiss.IndexIVFScalarQuantizer(centroids, dimension, nlist, sq8, ip)
+        elif quantization == "pq":
+            index = faiss.IndexIVFPQ(centroids, dimension, nlist, m, 8, ip)
+        else:
+            index = faiss.IndexIVFFlat(centroids, dimension, nlist, ip)
+    else:
+        if quantization == "sq8":
+            storage = faiss.IndexScalarQuantizer(dimension, sq8, ip)
+        elif quantization == "pq":
+            raise ValueError("Flat indexes can't use pq storage (filtered searches need an id selector)")
+        else:
+            storage = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIDMap(storage)
+    if not index.is_trained:
+        index.train(training_vectors)
+    return tune_index(index, kind)
 
 class SemanticSearch:
-    def __init__(self):
-        self.embeddings = SentenceTransformer('all-MiniLM-L6-v2')
+    # Unsaved index changes tolerated before writing the index file again
+    SAVE_EVERY = 25
+    
+    # HNSW can't delete vectors, so deletions are tombstoned until this many pile up
+    COMPACT_AFTER = 1_000
+    
+    # Passages fetched per wanted conversation, since one conversation can match with several
+    FETCH_PER_RESULT = 8
+    
+    # PQ distances are coarse: this many times more conversations are re-ranked with their exact cached vectors
+    RERANK_FACTOR = 10
+    
+    # Upper bound on HNSW efSearch when a selective filter makes the graph walk look further for allowed vectors
+    FILTERED_EF_MAX = 4_096
+    
+    # Query embeddings kept, so a prompt embedded by the semantic cache isn't embedded again for retrieval
+    QUERY_CACHE_SIZE = 1_024
+    
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', index_kind: str = None, quantization: str = None,
+                 backend: str = None, batch_size: int = None, threads: int = None):
+        self.model_name = model_name
+        self.backend = backend or os.getenv("EMBEDDING_BACKEND", "torch")
+        if self.backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend {self.backend!r}, expected one of {EMBEDDING_BACKENDS}")
+        # Larger batches than the library's 32 amortize per-call overhead when reindexing on CPU
+        self.batch_size = batch_size or int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+        self.threads = threads or int(os.getenv("EMBEDDING_THREADS", "0")) or None
+        self.index_kind = index_kind or os.getenv("SEARCH_INDEX", "auto")
+        if self.index_kind not in INDEX_KINDS:
+            raise ValueError(f"Unknown index kind {self.index_kind!r}, expected one of {INDEX_KINDS}")
+        self.index_quantization = quantization or os.getenv("SEARCH_QUANTIZATION", "none")
+        if self.index_quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {self.index_quantization!r}, expected one of {QUANTIZATIONS}")
+        self.kind = None  # kind of the current index
+        self.quantization = None  # vector storage of the current index
+        self.tombstones = set()  # passage ids of deleted conversations still in an HNSW index
+        self._embeddings = None  # SentenceTransformer, loaded on first encode
+        self._model_lock = threading.Lock()
+        self._query_cache = OrderedDict()  # query text -> unit vector, least recently used first
+        self._query_lock = threading.Lock()
+        self.query_hits = 0
+        self.query_misses = 0
         self.index = None
-        self.texts = []
-        self.metadata = []
+        # Ids only: rows are read from the database for the few conversations a search returns
+        self.hashes: Dict[int, str] = {}  # conversation id -> hash of the embedded text
+        self.passages: Dict[int, int] = {}  # conversation id -> number of passages in the index
+        self.db = None
+        self.worker = None  # IndexWorker applying history changes in the background
+        self.index_path = None
+        self._unsaved = 0
+        # Shared between sessions, so index updates must not interleave with searches
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+    
+    @property
+    def embeddings(self):
+        """The embedding model; torch and the weights are only loaded when something is first encoded"""
+        if self._embeddings is None:
+            with self._model_lock:
+                if self._embeddings is None:
+                    self._embeddings = load_embedding_model(self.model_name, self.backend, self.threads)
+        return self._embeddings
+    
+    @property
+    def model_loaded(self) -> bool:
+        return self._embeddings is not None
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts as a float32 matrix"""
+        return np.array(self.embeddings.encode(texts, batch_size=self.batch_size)).astype('float32')
+    
+    def encode_queries(self, texts: List[str]) -> np.ndarray:
+        """Normalized embeddings of short query texts, served from an LRU cache where possible"""
+        with self._query_lock:
+            found = {}
+            for text in texts:
+                if text in self._query_cache:
+                    self._query_cache.move_to_end(text)
+                    found[text] = self._query_cache[text]
+            self.query_hits += sum(text in found for text in texts)
+            missing = [text for text in dict.fromkeys(texts) if text not in found]
+            self.query_misses += len(missing)
+        
+        if missing:
+            vectors = normalize(self.encode(missing))
+            with self._query_lock:
+                for text, vector in zip(missing, vectors):
+                    self._query_cache[text] = found[text] = vector
+                while len(self._query_cache) > self.QUERY_CACHE_SIZE:
+                    self._query_cache.popitem(last=False)
+        return np.vstack([found[text] for text in texts])
+    
+    def query_cache_stats(self) -> dict:
+        with self._query_lock:
+            lookups = self.query_hits + self.query_misses
+            return {
+                "hits": self.query_hits,
+                "misses": self.query_misses,
+                "hit_rate": self.query_hits / lookups if lookups else 0.0,
+                "entries": len(self._query_cache),
+            }
+    
+    @staticmethod
+    def conversation_text(conv: Tuple) -> str:
+        """Text of a conversation row, hashed to notice edits"""
+        # conv: (id, timestamp, user_query, ai_response, code_snippet, language)
+        text = f"{conv[2]} {conv[3]}"  # Combine query and response
+        if conv[4]:  # Add code snippet if exists
+            text += f" {conv[4]}"
+        return text
+    
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts, reusing vectors from the database's embedding cache when attached"""
+        if self.db is None:
+            return self.encode(texts)
+        
+        hashes = [self.text_hash(text) for text in texts]
+        cached = self.db.get_cached_embeddings(list(set(hashes)), self.model_name)
+        missing = {h: text for h, text in zip(hashes, texts) if h not in cached}
+        if missing:
+            vectors = self.encode(list(missing.values()))
+            new = {h: vector.tobytes() for h, vector in zip(missing, vectors)}
+            self.db.cache_embeddings(self.model_name, new)
+            cached.update(new)
+        return np.vstack([np.frombuffer(cached[h], dtype='float32') for h in hashes])
+    
+    def embed_conversations(self, conversations: List[Tuple]) -> Tuple[np.ndarray, np.ndarray, Dict[int, int]]:
+        """Normalized passage vectors of the conversations, their ids and the passage count of each"""
+        texts, ids, counts = [], [], {}
+        for conv in conversations:
+            passages = conversation_passages(conv)
+            texts.extend(passages)
+            ids.append(passage_ids(conv[0], len(passages)))
+            counts[conv[0]] = len(passages)
+        return normalize(self.embed(texts)), np.concatenate(ids), counts
     
     def build_index(self, conversations: List[Tuple]):
         """Build FAISS index from conversation history"""
         if not conversations:
+            self.clear()
             return
         
-        self.texts = []
-        self.metadata = []
-        
-        for conv in conversations:
-            # conv: (id, timestamp, user_query, ai_response, code_snippet, language)
-            text = f"{conv[2]} {conv[3]}"  # Combine query and response
-            if conv[4]:  # Add code snippet if exists
-                text += f" {conv[4]}"
-            self.texts.append(text)
-            self.metadata.append(conv)
-        
         # Generate embeddings
-        vectors = self.embeddings.encode(self.texts)
-        vectors_array = np.array(vectors).astype('float32')
+        vectors_array, ids, counts = self.embed_conversations(conversations)
         
         # Create FAISS index
-        dimension = vectors_array.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(vectors_array)
+        kind = choose_index_kind(len(ids), self.index_kind)
+        quantization = choose_quantization(len(ids), self.index_quantization, kind)
+        index = make_index(kind, vectors_array.shape[1], vectors_array, quantization)
+        index.add_with_ids(vectors_array, ids)
+        
+        with self._lock:
+            self.hashes = {conv[0]: self.text_hash(self.conversation_text(conv)) for conv in conversations}
+            self.passages = counts
+            self.index = index
+            self.kind = kind
+            self.quantization = quantization
+            self.tombstones = set()
+        self.save()
+    
+    def _delete_ids(self, conversation_ids: List[int]):
+        """Remove the conversations' passages, or tombstone them where the index can't delete (call with the lock held)"""
+        ids = [passage_ids(conv_id, self.passages.pop(conv_id, 0)) for conv_id in conversation_ids]
+        ids = np.concatenate(ids) if ids else np.empty(0, dtype='int64')
+        if self.kind == "hnsw":
+            self.tombstones.update(ids.tolist())
+        else:
+            self.index.remove_ids(ids)
+    
+    def _layout_fits(self, kind: str, quantization: str, count: int) -> bool:
+        """Whether an index of this kind and vector storage is right for count vectors"""
+        # Quantized storage is kept even if the history shrinks below the training minimum again
+        configured = choose_quantization(math.inf, self.index_quantization, kind)
+        if quantization not in (choose_quantization(count, self.index_quantization, kind), configured):
+            return False
+        wanted = choose_index_kind(count, self.index_kind)
+        if self.index_kind == "auto":
+            # Only ever move up, so a history hovering around a threshold doesn't rebuild back and forth
+            order = ("flat", "hnsw", "ivf")
+            return order.index(kind) >= order.index(wanted)
+        return kind == wanted
+    
+    def _needs_rebuild(self) -> bool:
+        """Too many tombstones, or the history outgrew the current index kind or storage"""
+        vectors = sum(self.passages.values())
+        return len(self.tombstones) >= self.COMPACT_AFTER or not self._layout_fits(self.kind, self.quantization, vectors)
     
-    def search(self, query: str, k: int = 3) -> List[Tuple]:
-        """Search for similar conversations"""
-        if not self.index or self.index.ntotal == 0:
-            return []
+    def _rebuild(self):
+        """Build the index again from the database; vectors come from the embedding cache, so this is index work only"""
+        if self.db is not None:
+            self.build_index(self.db.get_all_conversations())
+    
+    def add(self, conversation: Tuple):
+        """Index one new conversation: one batch of at most MAX_PASSAGES embeddings"""
+        self.add_many([conversation])
+    
+    def add_many(self, conversations: List[Tuple]):
+        """Index new conversations with a single encode call for all their passages"""
+        if not conversations:
+            return
+        vectors, ids, counts = self.embed_conversations(conversations)
         
-        query_vector = self.embeddings.encode([query])
-        query_array = np.array(query_vector).astype('float32')
+        with self._lock:
+            if self.index is None:
+                self.kind = choose_index_kind(len(ids), self.index_kind)
+                self.quantization = choose_quantization(len(ids), self.index_quantization, self.kind)
+                self.index = make_index(self.kind, vectors.shape[1], vectors, self.quantization)
+            existing = [conv[0] for conv in conversations if conv[0] in self.passages]
+            if existing:
+                self._delete_ids(existing)
+            # Ids are never reused, but a re-added row must not stay hidden behind its own tombstones
+            self.tombstones.difference_update(ids.tolist())
+            self.index.add_with_ids(vectors, ids)
+            for conv in conversations:
+                self.hashes[conv[0]] = self.text_hash(self.conversation_text(conv))
+            self.passages.update(counts)
+            self._unsaved += len(conversations)
+            rebuild = self._needs_rebuild()
+        if rebuild:
+            self._rebuild()
+        else:
+            self._maybe_save()
+    
+    def remove(self, conversation_id: int):
+        """Drop one conversation from the index"""
+        rebuild = False
+        with self._lock:
+            if self.index is not None and conversation_id in self.passages:
+                self.hashes.pop(conversation_id, None)
+                self._delete_ids([conversation_id])
+                self._unsaved += 1
+                rebuild = self._needs_rebuild()
+        if rebuild:
+            self._rebuild()
+        else:
+            self._maybe_save()
+    
+    def clear(self):
+        """Empty the index"""
+        with self._lock:
+            self.index = None
+            self.kind = None
+            self.quantization = None
+            self.hashes = {}
+            self.passages = {}
+            self.tombstones = set()
+        self.save()
+    
+    def _maybe_save(self):
+        if self._unsaved >= self.SAVE_EVERY:
+            self.save()
+    
+    def save(self):
+        """Write the index and its id -> text hash manifest next to the database"""
+        if not self.index_path:
+            return
+        manifest_path = self.index_path + ".json"
+        # One save at a time; searches only wait for the in-memory copy, not for the disk
+        with self._save_lock:
+            with self._lock:
+                self._unsaved = 0
+                if self.index is None:
+                    for path in (self.index_path, manifest_path):
+                        if os.path.exists(path):
+                            os.remove(path)
+                    return
+                data = faiss.serialize_index(self.index)
+                manifest = {"model": self.model_name, "metric": "cosine", "kind": self.kind,
+                            "quantization": self.quantization, "dimension": self.index.d,
+                            "passage_stride": PASSAGE_STRIDE, "hashes": dict(self.hashes),
+                            "passages": dict(self.passages), "tombstones": sorted(self.tombstones)}
+            
+            # Write to temp files and swap them in, so a crash never leaves a torn index behind
+            data.tofile(self.index_path + ".tmp")
+            with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(self.index_path + ".tmp", self.index_path)
+            os.replace(manifest_path + ".tmp", manifest_path)
+    
+    def load(self) -> bool:
+        """Load the saved index (memory-mapped where FAISS supports it); False if missing or stale"""
+        manifest_path = self.index_path + ".json"
+        if not (os.path.exists(self.index_path) and os.path.exists(manifest_path)):
+            return False
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            # Older files hold L2 flat indexes over unnormalized vectors
+            if manifest.get("model") != self.model_name or manifest.get("metric") != "cosine":
+                return False
+            # Older files hold one vector per conversation
+            if manifest.get("passage_stride") != PASSAGE_STRIDE:
+                return False
+            vectors = sum(manifest["passages"].values())
+            if not self._layout_fits(manifest["kind"], manifest.get("quantization", "none"), vectors):
+                return False
+            # Memory-mapped IVF lists are read-only, and this index is updated in place
+            if manifest["kind"] == "ivf":
+                index = faiss.read_index(self.index_path)
+            else:
+                try:
+                    index = faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP)
+                except RuntimeError:
+                    index = faiss.read_index(self.index_path)
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"Could not load search index, rebuilding: {e}")
+            return False
+        
+        with self._lock:
+            self.index = tune_index(index, manifest["kind"])
+            self.kind = manifest["kind"]
+            self.quantization = manifest.get("quantization", "none")
+            self.hashes = {int(i): h for i, h in manifest["hashes"].items()}
+            self.passages = {int(i): n for i, n in manifest["passages"].items()}
+            self.tombstones = set(manifest.get("tombstones", []))
+        return True
+    
+    def attach(self, db, index_path: str = None, background: bool = None):
+        """Load or build the index for a database, then follow its adds and deletes (on a worker thread by default)"""
+        self.db = db
+        self.index_path = index_path or os.path.splitext(db.db_path)[0] + ".faiss"
         
-        distances, indices = self.index.search(query_array, min(k, self.index.ntotal))
+        # Listen before reading the rows: changes saved while the index is loaded or built are held
+        # back and applied after it, so none fall between the snapshot and the listener
+        held = []
+        gate = threading.Lock()
+        apply = None
         
-        results = []
-        for idx in indices[0]:
-            if idx < len(self.metadata):
-                results.append(self.metadata[idx])
+        def listener(event: str, payload):
+            with gate:
+                if apply is None:
+                    held.append((event, payload))
+                    return
+            apply(event, payload)
         
-        return results
+        db.add_listener(listener)
+        conversations = db.get_all_conversations()
+        
+        if not self.load():
+            self.build_index(conversations)
+        else:
+            self._reconcile(conversations)
+        
+        if background is None:
+            background = os.getenv("BACKGROUND_INDEXING", "1") != "0"
+        atexit.register(self.save)
+        if background:
+            self.worker = IndexWorker(self)
+            # Registered last so it runs first at exit: pending changes are indexed before the final save
+            atexit.register(self.flush)
+        
+        # Held changes may already be in the snapshot; re-adding or re-deleting a conversation is harmless
+        with gate:
+            target = self.worker.submit if background else self.on_history_change
+            for event, payload in held:
+                target(event, payload)
+            apply = target
+    
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until the background worker has indexed every change so far; False on timeout"""
+        return self.worker.flush(timeout) if self.worker else True
+    
+    def _reconcile(self, conversations: List[Tuple]):
+        """Bring a loaded index in line with the database: only new or changed rows are embedded"""
+        rows = {conv[0]: conv for conv in conversations}
+        current = {conv_id: self.text_hash(self.conversation_text(conv)) for conv_id, conv in rows.items()}
+        stale = [conv_id for conv_id, h in self.hashes.items() if current.get(conv_id) != h]
+        fresh = [rows[conv_id] for conv_id, h in current.items() if self.hashes.get(conv_id) != h]
+        
+        with self._lock:
+            if stale:
+                self._delete_ids(stale)
+                for conv_id in stale:
+                    self.hashes.pop(conv_id, None)
+        
+        if fresh:
+            vectors, ids, counts = self.embed_conversations(fresh)
+            with self._lock:
+                self.tombstones.difference_update(ids.tolist())
+                self.index.add_with_ids(vectors, ids)
+                self.passages.update(counts)
+                for conv in fresh:
+                    self.hashes[conv[0]] = current[conv[0]]
+        
+        with self._lock:
+            rebuild = self._needs_rebuild()
+        if rebuild:
+            self.build_index(conversations)
+        elif stale or fresh:
+            self.save()
+    
+    def on_history_change(self, event: str, payload):
+        """HistoryDB listener keeping the index in step with the conversations table"""
+        if event == "add":
+            self.add(payload)
+        elif event == "delete":
+            self.remove(payload)
+        elif event == "clear":
+            self.clear()
+    
+    def _filter_params(self, allowed_ids: List[int], fetch: int):
+        """FAISS search parameters restricting a search to the passages of the allowed conversations (call with the lock held)"""
+        conv_ids = np.array([conv_id for conv_id in allowed_ids if conv_id in self.passages], dtype='int64')
+        counts = np.array([self.passages[conv_id] for conv_id in conv_ids.tolist()], dtype='int64')
+        # Passage ids of every allowed conversation: id * stride + 0 .. count-1
+        starts = np.repeat(conv_ids * PASSAGE_STRIDE, counts)
+        positions = np.arange(len(starts)) - np.repeat(np.cumsum(counts) - counts, counts)
+        selector = faiss.IDSelectorBatch(starts + positions)
+        # The fewer vectors pass the filter, the more of the index a search has to visit to find them
+        spread = max(1, self.index.ntotal // max(1, len(starts)))
+        if self.kind == "hnsw":
+            ef = min(max(HNSW_EF_SEARCH, fetch * spread), self.FILTERED_EF_MAX)
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=ef), len(starts)
+        if self.kind == "ivf":
+            return faiss.SearchParametersIVF(sel=selector, nprobe=min(self.index.nlist, self.index.nprobe * spread)), len(starts)
+        return faiss.SearchParameters(sel=selector), len(starts)
+    
+    def search_ids(self, query: str, k: int = 3, allowed_ids: List[int] = None) -> List[Tuple[int, float]]:
+        """(conversation id, cosine similarity) of the most similar allowed conversations, by best-matching passage"""
+        # allowed_ids (from HistoryDB.filter_ids) is applied inside FAISS rather than to the results,
+        # which a selective filter could otherwise leave empty
+        with self._lock:
+            index = self.index
+            if index is None or index.ntotal == 0 or allowed_ids is not None and not allowed_ids:
+                return []
+        
+        query_array = self.encode_queries([query])
+        rerank = self.quantization == "pq" and self.db is not None
+        wanted = k * self.RERANK_FACTOR if rerank else k
+        
+        # Searching under the lock keeps ids and passage counts consistent with concurrent adds/removes
+        with self._lock:
+            # Over-fetch past tombstoned vectors and extra passages of the same conversations
+            fetch = min(wanted * self.FETCH_PER_RESULT + len(self.tombstones), index.ntotal)
+            params = None
+            if allowed_ids is not None:
+                params, allowed = self._filter_params(allowed_ids, fetch)
+                if not allowed:
+                    return []
+                fetch = min(fetch, allowed)
+            distances, indices = index.search(query_array, fetch, params=params)
+            results, seen = [], set()
+            # Hits come best first, so the first passage seen of a conversation is its best
+            for similarity, idx in zip(distances[0], indices[0]):
+                conv_id = int(idx) // PASSAGE_STRIDE
+                if idx < 0 or idx in self.tombstones or conv_id in seen or conv_id not in self.passages:
+                    continue
+                seen.add(conv_id)
+                results.append((conv_id, float(similarity)))
+                if len(results) == wanted:
+                    break
+        
+        if rerank:
+            results = self._rerank(query_array[0], results)
+        return results[:k]
+    
+    def _rerank(self, query_vector: np.ndarray, results: List[Tuple[int, float]]) -> List[Tuple[int, float]]:
+        """Re-score candidates by exact cosine similarity of their best passage, from the embedding cache"""
+        rows = self.db.get_conversations([conv_id for conv_id, _ in results])
+        hashes = {row[0]: [self.text_hash(p) for p in conversation_passages(row)] for row in rows}
+        cached = self.db.get_cached_embeddings(list({h for hs in hashes.values() for h in hs}), self.model_name)
+        scores = dict(results)
+        for conv_id, conv_hashes in hashes.items():
+            vectors = [np.frombuffer(cached[h], dtype='float32') for h in conv_hashes if h in cached]
+            if vectors:
+                scores[conv_id] = float(np.max(normalize(np.vstack(vectors)) @ query_vector))
+        return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+    
+    def search(self, query: str, k: int = 3, **filters) -> List[Tuple]:
+        """Search for similar conversations, ranked by their best-matching passage (rows come from the attached database)"""
+        # filters: HistoryDB.filter_ids() arguments - language, tool, since, until
+        allowed_ids = self.db.filter_ids(**filters) if filters else None
+        return self.db.get_conversations([conv_id for conv_id, _ in self.search_ids(query, k, allowed_ids)])
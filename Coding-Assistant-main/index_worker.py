@@ -0,0 +1,99 @@
+"""Background thread applying history changes to the search index, so saving never waits on embeddings"""
+import queue
+import threading
+import time
+from collections import deque
+from typing import List, Tuple
+
+
+class IndexWorker:
+    """Feed HistoryDB changes to a SemanticSearch in order, embedding new conversations in batches"""
+
+    # Most conversations embedded in one encode call
+    BATCH_SIZE = 64
+
+    def __init__(self, search):
+        self.search = search
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._enqueued = deque()  # submit time of every change not applied yet, oldest first
+        self.indexed = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_batch_ms = 0.0
+        self.last_lag_ms = 0.0  # submit-to-searchable time of the oldest change in the last batch
+        self._thread = threading.Thread(target=self._run, name="index-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, event: str, payload=None):
+        """HistoryDB listener: queue the change and return immediately"""
+        with self._cond:
+            self._enqueued.append(time.monotonic())
+        self._queue.put((event, payload))
+
+    def _next_batch(self) -> List[Tuple]:
+        """Block for the next change; an add collects the adds already queued behind it"""
+        batch = [self._queue.get()]
+        if batch[0][0] != "add":
+            return batch
+        # No waiting for more: while one batch is encoded, the next one builds up by itself
+        while len(batch) < self.BATCH_SIZE:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item[0] != "add":
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            start = time.monotonic()
+            adds = [payload for event, payload in batch if event == "add"]
+            if adds:
+                try:
+                    self.search.add_many(adds)
+                    self.indexed += len(adds)
+                except Exception as e:
+                    # Losing some adds only costs search recall; the worker must keep running
+                    self.failures += len(adds)
+                    print(f"Background indexing failed: {e}")
+            # A batch only ends in a non-add change, which must follow the adds before it. It is applied
+            # even when they failed, or a deleted conversation would stay searchable
+            if batch[-1][0] != "add":
+                try:
+                    self.search.on_history_change(*batch[-1])
+                except Exception as e:
+                    self.failures += 1
+                    print(f"Background index {batch[-1][0]} failed: {e}")
+
+            done = time.monotonic()
+            with self._cond:
+                self.last_lag_ms = (done - self._enqueued[0]) * 1000
+                for _ in batch:
+                    self._enqueued.popleft()
+                self.batches += 1
+                self.last_batch_ms = (done - start) * 1000
+                self._cond.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until every change submitted so far is searchable; False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._enqueued, timeout)
+
+    def stats(self) -> dict:
+        with self._cond:
+            pending = len(self._enqueued)
+            lag = time.monotonic() - self._enqueued[0] if pending else 0.0
+            return {
+                "queue_depth": pending,
+                "lag_seconds": lag,
+                "indexed": self.indexed,
+                "batches": self.batches,
+                "avg_batch_size": self.indexed / self.batches if self.batches else 0.0,
+                "last_batch_ms": self.last_batch_ms,
+                "last_lag_ms": self.last_lag_ms,
+                "failures": self.failures,
+            }
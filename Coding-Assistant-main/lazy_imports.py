@@ -0,0 +1,40 @@
+"""Deferred imports of heavy libraries, with the time each one took to load"""
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+_lock = threading.Lock()
+_import_times = {}  # name -> seconds its first import took in this process
+
+
+def _record(name: str, seconds: float):
+    with _lock:
+        _import_times.setdefault(name, seconds)
+
+
+def load(module_name: str):
+    """Import a module on first use and record how long that first import took"""
+    # import_module (not a sys.modules lookup) so a module another thread is still importing is waited for
+    first = module_name not in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if first:
+        _record(module_name, time.perf_counter() - start)
+    return module
+
+
+@contextmanager
+def timed(name: str):
+    """Record the time a block takes the first time it runs, e.g. an import statement"""
+    start = time.perf_counter()
+    yield
+    _record(name, time.perf_counter() - start)
+
+
+def import_report() -> List[Tuple[str, float]]:
+    """(module, seconds) for everything loaded through here, slowest first"""
+    with _lock:
+        return sorted(_import_times.items(), key=lambda item: item[1], reverse=True)
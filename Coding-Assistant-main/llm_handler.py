@@ -1,30 +1,664 @@
-from langchain_community.llms import Ollama
-from typing import List
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+import asyncio
+import concurrent.futures
+import hashlib
+import json
 import os
+import re
+import sqlite3
+import threading
+import time
+
+from lazy_imports import load
+from llm_router import LLMRouter
+
+
+class ResponseCache:
+    """Two-level response cache: an in-memory LRU in front of a SQLite store"""
+    
+    def __init__(self, db_path: str = "response_cache.db", max_memory_entries: int = 256,
+                 max_disk_entries: int = 5000, ttl: float = 7 * 24 * 3600):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> (created, response)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._init_db()
+    
+    def _init_db(self):
+        """Initialize the on-disk cache table"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                method TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL,
+                response TEXT NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_accessed ON response_cache(accessed)")
+        conn.commit()
+        conn.close()
+    
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        """Normalize line endings and trailing whitespace without touching indentation"""
+        lines = prompt.replace("\r\n", "\n").strip().split("\n")
+        return "\n".join(line.rstrip() for line in lines)
+    
+    @staticmethod
+    def make_key(backend: str, model: str, temperature: float, method: str, prompt: str) -> str:
+        """Hash the request identity into a cache key"""
+        payload = json.dumps([backend, model, temperature, method, ResponseCache.normalize_prompt(prompt)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _remember(self, key: str, created: float, response: str):
+        """Insert into the in-memory LRU, evicting the least recently used entry"""
+        self._memory[key] = (created, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached response or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[0] <= self.ttl:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+            self._memory.pop(key, None)
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT created, response FROM response_cache WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        if row and now - row[0] > self.ttl:
+            cursor.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            row = None
+        elif row:
+            cursor.execute("UPDATE response_cache SET accessed = ? WHERE key = ?", (now, key))
+        conn.commit()
+        conn.close()
+        
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, row[0], row[1])
+        return row[1]
+    
+    def set(self, key: str, method: str, response: str):
+        """Store a response in both levels and trim the disk store to its size bound"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, response)
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT OR REPLACE INTO response_cache (key, method, created, accessed, response)
+            VALUES (?, ?, ?, ?, ?)
+        """, (key, method, now, now, response))
+        cursor.execute("DELETE FROM response_cache WHERE created < ?", (now - self.ttl,))
+        cursor.execute("""
+            DELETE FROM response_cache WHERE key IN (
+                SELECT key FROM response_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_disk_entries,))
+        conn.commit()
+        conn.close()
+    
+    def clear(self):
+        """Drop every cached response and reset counters"""
+        with self._lock:
+            self._memory.clear()
+            self.memory_hits = self.disk_hits = self.misses = 0
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM response_cache")
+        conn.commit()
+        conn.close()
+    
+    def stats(self) -> dict:
+        """Get hit/miss counters and sizes"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM response_cache")
+        disk_entries = cursor.fetchone()[0]
+        conn.close()
+        
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> ResponseCache:
+    """Get the process-wide response cache shared by all handlers"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
+
+
+class _StreamFlight:
+    """Chunks of one in-flight stream, replayed to every caller subscribed to it"""
+    
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.task = None  # producing task of an async leader, kept referenced until it ends
+        self._cond = threading.Condition()
+        self._waiters = []  # (loop, asyncio.Event) of async subscribers waiting for the next chunk
+    
+    def _notify(self):
+        self._cond.notify_all()
+        for loop, event in self._waiters:
+            loop.call_soon_threadsafe(event.set)
+        self._waiters.clear()
+    
+    def publish(self, chunk: str):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._notify()
+    
+    def finish(self, error: BaseException = None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._notify()
+    
+    def subscribe(self) -> Iterator[str]:
+        """Yield every chunk from the start, then follow the stream until it ends"""
+        position = 0
+        while True:
+            with self._cond:
+                while position == len(self.chunks) and not self.done:
+                    self._cond.wait()
+                chunks = self.chunks[position:]
+                done, error = self.done, self.error
+            for chunk in chunks:
+                yield chunk
+            position += len(chunks)
+            if done and position == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+    
+    async def asubscribe(self) -> AsyncIterator[str]:
+        """subscribe() for event loops: waits for chunks without blocking the loop"""
+        loop = asyncio.get_running_loop()
+        position = 0
+        while True:
+            with self._cond:
+                chunks = self.chunks[position:]
+                done, error = self.done, self.error
+                event = None
+                if not chunks and not done:
+                    event = asyncio.Event()
+                    self._waiters.append((loop, event))
+            if event is not None:
+                await event.wait()
+                continue
+            for chunk in chunks:
+                yield chunk
+            position += len(chunks)
+            if done and position == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """Collapse concurrent identical LLM calls into one backend call shared by every caller"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> concurrent.futures.Future of the in-flight call
+        self._streams = {}  # key -> _StreamFlight
+        self.leaders = 0
+        self.coalesced = 0
+    
+    def begin(self, key: str) -> Tuple[concurrent.futures.Future, bool]:
+        """Join the in-flight call for key, or start one; returns (future, is_leader)"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = concurrent.futures.Future()
+            self._calls[key] = future
+            self.leaders += 1
+            return future, True
+    
+    def end(self, key: str, future: concurrent.futures.Future, result: Any = None, error: BaseException = None):
+        """Hand the leader's result (or error) to every waiter and retire the call"""
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    
+    def do(self, key: str, fn) -> Any:
+        """Run fn() unless an identical call is already running, in which case wait for its result"""
+        future, leader = self.begin(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.end(key, future, error=e)
+            raise
+        self.end(key, future, result)
+        return result
+    
+    def stream(self, key: str, produce) -> Iterator[str]:
+        """Subscribe to the in-flight stream for key, starting produce() on a worker thread if there is none"""
+        with self._lock:
+            flight = self._streams.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight.subscribe()
+            flight = _StreamFlight()
+            self._streams[key] = flight
+            self.leaders += 1
+        
+        # The stream is drained by its own thread so a caller that stops reading (a Streamlit rerun)
+        # doesn't cut it off for the others
+        def pump():
+            error = None
+            try:
+                for chunk in produce():
+                    flight.publish(chunk)
+            except BaseException as e:
+                error = e
+            finally:
+                with self._lock:
+                    self._streams.pop(key, None)
+                flight.finish(error)
+        
+        threading.Thread(target=pump, name="llm-stream", daemon=True).start()
+        return flight.subscribe()
+    
+    def astream(self, key: str, produce) -> AsyncIterator[str]:
+        """stream() for event loops: produce() is an async generator drained by its own task"""
+        with self._lock:
+            flight = self._streams.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight.asubscribe()
+            flight = _StreamFlight()
+            self._streams[key] = flight
+            self.leaders += 1
+        
+        async def pump():
+            error = None
+            try:
+                async for chunk in produce():
+                    flight.publish(chunk)
+            except BaseException as e:
+                error = e
+            finally:
+                with self._lock:
+                    self._streams.pop(key, None)
+                flight.finish(error)
+        
+        flight.task = asyncio.ensure_future(pump())
+        return flight.asubscribe()
+    
+    def stats(self) -> dict:
+        """Backend calls made, callers that piggybacked on one, and calls in flight"""
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls) + len(self._streams),
+            }
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    """Get the process-wide single-flight group shared by all handlers"""
+    return _single_flight
+
+
+# Prompt token budgets per backend. Llama 3.1 on Ollama runs with a small default context
+# window and its latency grows with prompt length; Gemini Flash has plenty of room.
+TOKEN_BUDGETS = {
+    "ollama": int(os.getenv("OLLAMA_TOKEN_BUDGET", "3072")),
+    "gemini": int(os.getenv("GEMINI_TOKEN_BUDGET", "32000")),
+}
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate without loading a tokenizer"""
+    if not text:
+        return 0
+    # Words and punctuation approximate BPE pieces for code; the length bound covers long identifiers
+    return max(len(_TOKEN_RE.findall(text)), len(text) // 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to roughly max_tokens, keeping the beginning"""
+    if max_tokens <= 0:
+        return ""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    cut = int(len(text) * max_tokens / tokens)
+    while cut > 0 and estimate_tokens(text[:cut] + " …") > max_tokens:
+        cut = int(cut * 0.9)
+    return text[:cut].rstrip() + " …"
+
+
+class PromptBuilder:
+    """Assemble the chat prompt against a token budget"""
+    
+    # Below this many remaining tokens a truncated piece is more noise than help
+    MIN_PIECE_TOKENS = 32
+    
+    def __init__(self, token_budget: int, recent_messages: int = 2, context_item_tokens: int = 512):
+        self.token_budget = token_budget
+        self.recent_messages = recent_messages
+        self.context_item_tokens = context_item_tokens
+    
+    def build(self, system_prompt: str, user_query: str, context: Union[str, List[str]] = None,
+              chat_history: List = None) -> Tuple[str, dict]:
+        """Build the prompt and report how many tokens each part used"""
+        if isinstance(context, str):
+            context = [context] if context.strip() else []
+        context = context or []
+        chat_history = chat_history or []
+        
+        usage = {"budget": self.token_budget, "system": 0, "context": 0, "history": 0,
+                 "query": 0, "total": 0, "dropped": 0, "truncated": 0, "over_budget": False}
+        
+        # The system prompt and the question are always sent whole; cutting the question (or a pasted
+        # snippet in it) would change what is asked, so an oversized one is sent anyway with a warning
+        system_text = system_prompt + "\n\n"
+        usage["system"] = estimate_tokens(system_text)
+        query_text = f"User: {user_query}\nAssistant:"
+        usage["query"] = estimate_tokens(query_text)
+        remaining = self.token_budget - usage["system"] - usage["query"]
+        if remaining < 0:
+            usage["over_budget"] = True
+            print(f"Warning: prompt is {-remaining} tokens over the {self.token_budget} token budget")
+        
+        # Pieces in order of value: the latest exchange, retrieved context by rank, then older history
+        history_lines = [
+            f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}\n"
+            for msg in chat_history
+        ]
+        split = max(len(history_lines) - self.recent_messages, 0)
+        pieces = [("history", i, history_lines[i]) for i in range(len(history_lines) - 1, split - 1, -1)]
+        for i, item in enumerate(context):
+            if estimate_tokens(item) > self.context_item_tokens:
+                item = truncate_to_tokens(item, self.context_item_tokens)
+                usage["truncated"] += 1
+            pieces.append(("context", i, item + "\n"))
+        pieces += [("history", i, history_lines[i]) for i in range(split - 1, -1, -1)]
+        
+        # The context header is charged with the first context piece, so it costs nothing when none fit
+        header = "Relevant past conversations (use them if they help):\n"
+        header_tokens = estimate_tokens(header)
+        
+        kept = {"history": {}, "context": {}}
+        for kind, i, text in pieces:
+            overhead = header_tokens if kind == "context" and not kept["context"] else 0
+            tokens = estimate_tokens(text)
+            if tokens + overhead > remaining:
+                if remaining - overhead < self.MIN_PIECE_TOKENS:
+                    usage["dropped"] += 1
+                    continue
+                text = truncate_to_tokens(text, remaining - overhead - 1) + "\n"
+                tokens = estimate_tokens(text)
+                usage["truncated"] += 1
+            kept[kind][i] = text
+            usage[kind] += tokens + overhead
+            remaining -= tokens + overhead
+        
+        full_prompt = system_text
+        if kept["context"]:
+            full_prompt += header + "".join(kept["context"][i] for i in sorted(kept["context"])) + "\n"
+        full_prompt += "".join(kept["history"][i] for i in sorted(kept["history"]))
+        full_prompt += query_text
+        
+        usage["total"] = usage["system"] + usage["context"] + usage["history"] + usage["query"]
+        return full_prompt, usage
+
+
+class BatchResult(NamedTuple):
+    index: int  # Position of the input, results arrive in completion order
+    input: Any
+    output: Optional[str]
+    error: Optional[Exception]
+    attempts: int
+
+
+# Tool methods that can run over many inputs
+BATCH_METHODS = ("generate_response", "generate_code", "fix_bug", "analyze_bugs", "analyze_quality",
+                 "refactor_code", "generate_docs", "generate_tests", "explain_code")
+
+# Fenced code in a chat question is part of what is asked, so the semantic cache matches it exactly
+_CODE_BLOCK_RE = re.compile(r"```.*?(?:```|$)", re.S)
+
+_TRANSIENT_MARKERS = ("429", "500", "502", "503", "504", "rate limit", "timed out", "timeout",
+                      "temporarily", "unavailable", "resource exhausted", "connection")
+
+
+def is_transient_error(exc: Exception) -> bool:
+    """Whether an LLM call failure is worth retrying"""
+    # requests/aiohttp connection errors derive from OSError
+    if isinstance(exc, (OSError, TimeoutError)):
+        return True
+    message = str(exc).lower()
+    return any(marker in message for marker in _TRANSIENT_MARKERS)
+
+
+class OllamaBackend:
+    """Local Llama via Ollama"""
+    
+    name = "ollama"
+    
+    def __init__(self, model: str = "llama3.1:latest", temperature: float = 0.7, base_url: str = None):
+        self.model = model
+        self.temperature = temperature
+        # OLLAMA_BASE_URL points at a remote Ollama box (or stub_server.py for benchmarks)
+        self.base_url = base_url or os.getenv("OLLAMA_BASE_URL")
+        self._llm = None
+    
+    @property
+    def llm(self):
+        """LangChain client, created on the first call so importing langchain doesn't delay page loads"""
+        if self._llm is None:
+            Ollama = load("langchain_community.llms").Ollama
+            if self.base_url:
+                self._llm = Ollama(model=self.model, temperature=self.temperature, base_url=self.base_url)
+            else:
+                self._llm = Ollama(model=self.model, temperature=self.temperature)
+        return self._llm
+    
+    def invoke(self, prompt: str) -> str:
+        return self.llm.invoke(prompt)
+    
+    def stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self.llm.stream(prompt):
+            if chunk:
+                yield chunk
+    
+    async def ainvoke(self, prompt: str) -> str:
+        return await self.llm.ainvoke(prompt)
+    
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        async for chunk in self.llm.astream(prompt):
+            if chunk:
+                yield chunk
+
+
+class GeminiBackend:
+    """Google Gemini over the generativeai API"""
+    
+    name = "gemini"
+    
+    def __init__(self, api_key: str, model: str = "gemini-2.0-flash-exp"):
+        try:
+            genai = load("google.generativeai")
+        except ImportError:
+            raise ImportError("Please install google-generativeai: pip install google-generativeai")
+        genai.configure(api_key=api_key)
+        self.model = model
+        self.llm = genai.GenerativeModel(model)
+    
+    def invoke(self, prompt: str) -> str:
+        return self.llm.generate_content(prompt).text
+    
+    def stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self.llm.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+    
+    async def ainvoke(self, prompt: str) -> str:
+        return (await self.llm.generate_content_async(prompt)).text
+    
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.llm.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+_STUB_WORDS = ("the", "function", "returns", "a", "list", "of", "values", "so", "we", "can", "refactor",
+               "this", "loop", "into", "comprehension", "and", "ship", "it", "cache", "index", "query",
+               "error", "handle", "edge", "case", "test", "input", "output", "pro", "tip:", "nice")
+
+
+class StubBackend:
+    """Deterministic offline backend with a set latency, token rate and response size, for benchmarks"""
+    
+    name = "stub"
+    
+    def __init__(self, latency: float = 0.2, tokens_per_sec: float = 50.0, response_tokens: int = 200):
+        self.latency = latency  # seconds before the first token
+        self.tokens_per_sec = tokens_per_sec  # 0 means no generation delay
+        self.response_tokens = response_tokens
+        self.model = f"stub-{response_tokens}t"
+    
+    @classmethod
+    def from_env(cls) -> "StubBackend":
+        """Build from STUB_LATENCY, STUB_TOKENS_PER_SEC and STUB_RESPONSE_TOKENS"""
+        return cls(float(os.getenv("STUB_LATENCY", "0.2")), float(os.getenv("STUB_TOKENS_PER_SEC", "50")),
+                   int(os.getenv("STUB_RESPONSE_TOKENS", "200")))
+    
+    def tokens(self, prompt: str) -> List[str]:
+        """The response for a prompt, as chunks: prose around a code block, same prompt -> same text"""
+        code = ["\n\n```python\n", "def ", "stub", "(x):\n", "    return ", "x\n", "```\n\n"]
+        seed = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big")
+        words = []
+        for _ in range(max(self.response_tokens - len(code), 1)):
+            seed = (seed * 6364136223846793005 + 1442695040888963407) % 2 ** 64
+            words.append(_STUB_WORDS[seed % len(_STUB_WORDS)] + " ")
+        middle = len(words) // 2
+        return (words[:middle] + code + words[middle:])[:max(self.response_tokens, 1)]
+    
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+    
+    def invoke(self, prompt: str) -> str:
+        tokens = self.tokens(prompt)
+        time.sleep(self.latency + len(tokens) * self._token_delay())
+        return "".join(tokens)
+    
+    def stream(self, prompt: str) -> Iterator[str]:
+        time.sleep(self.latency)
+        delay = self._token_delay()
+        for token in self.tokens(prompt):
+            if delay:
+                time.sleep(delay)
+            yield token
+    
+    async def ainvoke(self, prompt: str) -> str:
+        tokens = self.tokens(prompt)
+        await asyncio.sleep(self.latency + len(tokens) * self._token_delay())
+        return "".join(tokens)
+    
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        await asyncio.sleep(self.latency)
+        delay = self._token_delay()
+        for token in self.tokens(prompt):
+            if delay:
+                await asyncio.sleep(delay)
+            yield token
+
 
 class LLMHandler:
-    def __init__(self, model: str = "llama3.1:latest", use_gemini: bool = False, api_key: str = None):
+    def __init__(self, model: str = "llama3.1:latest", use_gemini: bool = False, api_key: str = None,
+                 temperature: float = 0.7, cache: ResponseCache = None, enable_cache: bool = True,
+                 token_budget: int = None, cloud_fallback: bool = False, hedge_after: float = None,
+                 semantic_cache=None, coalesce: bool = True, backend=None):
         self.use_gemini = use_gemini
         self.model_name = model
+        self.temperature = temperature
+        self.cache = (cache or get_default_cache()) if enable_cache else None
+        # Optional SemanticCache for chat questions that are worded differently (code must match exactly)
+        self.semantic_cache = semantic_cache if enable_cache else None
+        # Identical requests from different sessions that overlap share one backend call
+        self.single_flight = get_single_flight() if coalesce else None
+        # Per-thread stats so a handler shared between sessions reports each caller's own timings
+        self._local = threading.local()
         
-        if use_gemini and api_key:
+        ollama = OllamaBackend(model, temperature) if backend is None else None
+        gemini = None
+        if backend is None and api_key and (use_gemini or cloud_fallback):
             try:
-                import google.generativeai as genai
-                genai.configure(api_key=api_key)
-                self.llm = genai.GenerativeModel('gemini-2.0-flash-exp')
-                self.gemini_model = "gemini-2.0-flash-exp"
-                self.is_gemini = True
+                gemini = GeminiBackend(api_key)
             except ImportError:
-                raise ImportError("Please install google-generativeai: pip install google-generativeai")
+                if use_gemini:
+                    raise
             except Exception as e:
                 print(f"Error initializing Gemini: {e}")
-                # Fallback to Ollama
-                self.llm = Ollama(model=model, temperature=0.7)
-                self.is_gemini = False
+        
+        # The sidebar toggle is a preference: the router falls back to (or hedges with) the other backend.
+        # Code only goes to the cloud from a local-first setup when cloud_fallback is enabled.
+        if backend is not None:
+            # An explicit backend (e.g. StubBackend) replaces routing altogether
+            self.backend = backend
+        elif use_gemini and gemini:
+            self.backend = LLMRouter([gemini, ollama], hedge_after=hedge_after)
+        elif gemini:
+            self.backend = LLMRouter([ollama, gemini], hedge_after=hedge_after)
         else:
-            self.llm = Ollama(model=model, temperature=0.7)
-            self.is_gemini = False
-            
+            self.backend = ollama
+        self.is_gemini = bool(use_gemini and gemini)
+        
         self.system_prompt = """You are a chill tech bro coding assistant who's really good at solving problems. You're knowledgeable, confident, and make coding feel easy.
 
 Your vibe:
@@ -51,127 +685,189 @@ Examples of your style:
 - "Let's ship this!"
 
 Stay helpful, stay cool, and help them write better code."""
+        
+        self.token_budget = token_budget or TOKEN_BUDGETS["gemini" if self.is_gemini else "ollama"]
+        self.prompt_builder = PromptBuilder(self.token_budget)
     
-    def generate_response(self, user_query: str, context: str = "", 
-                         chat_history: List = None) -> str:
-        """Generate AI response with optional context and history"""
-        if self.is_gemini:
-            # Gemini API format - Simple and direct
-            full_prompt = self.system_prompt + "\n\n"
-            
-            if chat_history and len(chat_history) > 0:
-                # Only include last 3 exchanges
-                recent_history = chat_history[-6:] if len(chat_history) > 6 else chat_history
-                for msg in recent_history:
-                    role = "User" if msg["role"] == "user" else "Assistant"
-                    full_prompt += f"{role}: {msg['content']}\n"
-            
-            full_prompt += f"User: {user_query}\nAssistant:"
+    @property
+    def last_ttft(self) -> float:
+        """Seconds until the first chunk of the last stream on this thread arrived"""
+        return getattr(self._local, "ttft", None)
+    
+    @property
+    def last_prompt_usage(self) -> dict:
+        """Token usage per prompt part of the last chat prompt built on this thread"""
+        return getattr(self._local, "prompt_usage", None)
+    
+    def _cache_key(self, method: str, full_prompt: str) -> str:
+        return ResponseCache.make_key(self.backend.name, self.backend.model, self.temperature, method, full_prompt)
+    
+    def _semantic_scope(self, method: str, code: str = "") -> tuple:
+        # Code is matched exactly through its hash; only the wording of the question is compared by embedding
+        digest = hashlib.sha256(code.encode("utf-8")).hexdigest() if code else ""
+        return (method, self.backend.name, self.backend.model, self.temperature, digest)
+    
+    def router_stats(self) -> Optional[dict]:
+        """Per-backend latency and health, or None when there is only one backend"""
+        if isinstance(self.backend, LLMRouter):
+            return self.backend.stats()
+        return None
+    
+    def _invoke(self, method: str, full_prompt: str, use_cache: bool = True,
+                semantic: Tuple[str, str] = None) -> str:
+        """Run a prompt against the active backend and return the full text"""
+        key = None
+        if self.cache and use_cache:
+            key = self._cache_key(method, full_prompt)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        vector = None
+        if self.semantic_cache and use_cache and semantic:
+            question, code = semantic
+            scope = self._semantic_scope(method, code)
+            cached, vector = self.semantic_cache.lookup(scope, question)
+            if cached is not None:
+                return cached
+        
+        def call() -> str:
+            response = self.backend.invoke(full_prompt)
+            if key:
+                self.cache.set(key, method, response)
+            if vector is not None:
+                self.semantic_cache.store(scope, question, response, vector)
+            return response
+        
+        if not self.single_flight:
+            return call()
+        # Coalesce even with the cache bypassed: an overlapping identical call is just as fresh
+        return self.single_flight.do(key or self._cache_key(method, full_prompt), call)
+    
+    def _stream(self, method: str, full_prompt: str, use_cache: bool = True,
+                semantic: Tuple[str, str] = None) -> Iterator[str]:
+        """Run a prompt against the active backend and yield text chunks as they arrive"""
+        start = time.perf_counter()
+        self._local.ttft = None
+        
+        key = None
+        if self.cache and use_cache:
+            key = self._cache_key(method, full_prompt)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._local.ttft = time.perf_counter() - start
+                yield cached
+                return
+        
+        vector = None
+        if self.semantic_cache and use_cache and semantic:
+            question, code = semantic
+            scope = self._semantic_scope(method, code)
+            cached, vector = self.semantic_cache.lookup(scope, question)
+            if cached is not None:
+                self._local.ttft = time.perf_counter() - start
+                yield cached
+                return
+        
+        def produce() -> Iterator[str]:
+            parts = []
+            for chunk in self.backend.stream(full_prompt):
+                parts.append(chunk)
+                yield chunk
             
-            response = self.llm.generate_content(full_prompt)
-            return response.text
+            # Only complete streams are cached; an abandoned generator never gets here
+            if key:
+                self.cache.set(key, method, "".join(parts))
+            if vector is not None:
+                self.semantic_cache.store(scope, question, "".join(parts), vector)
+        
+        if self.single_flight:
+            chunks = self.single_flight.stream(key or self._cache_key(method, full_prompt), produce)
         else:
-            # Ollama format - Simple and direct
-            full_prompt = self.system_prompt + "\n\n"
-            
-            if chat_history and len(chat_history) > 0:
-                # Only include last 3 exchanges
-                recent_history = chat_history[-6:] if len(chat_history) > 6 else chat_history
-                for msg in recent_history:
-                    role = "User" if msg["role"] == "user" else "Assistant"
-                    full_prompt += f"{role}: {msg['content']}\n"
-            
-            full_prompt += f"User: {user_query}\nAssistant:"
-            
-            response = self.llm.invoke(full_prompt)
-            return response
+            chunks = produce()
+        for chunk in chunks:
+            if self._local.ttft is None:
+                self._local.ttft = time.perf_counter() - start
+            yield chunk
     
-    def generate_code(self, prompt: str, language: str) -> str:
-        """Generate code based on description"""
-        full_prompt = f"""You are a code generation expert. Generate clean, efficient, and well-commented {language} code.
+    @staticmethod
+    def _semantic_request(user_query: str, chat_history: List = None) -> Optional[Tuple[str, str]]:
+        """Split a chat question into the wording matched by similarity and the fenced code matched exactly"""
+        # Follow-up questions depend on the conversation, and a bare code paste has no wording to compare
+        if chat_history:
+            return None
+        code = "\n".join(_CODE_BLOCK_RE.findall(user_query))
+        question = _CODE_BLOCK_RE.sub(" ", user_query).strip()
+        return (question, code) if question else None
+    
+    def _response_prompt(self, user_query: str, context: Union[str, List[str]] = "",
+                         chat_history: List = None) -> str:
+        """Build the chat prompt from system prompt, retrieved context, history and query within the token budget"""
+        full_prompt, usage = self.prompt_builder.build(self.system_prompt, user_query, context, chat_history)
+        self._local.prompt_usage = usage
+        return full_prompt
+    
+    def _code_prompt(self, prompt: str, language: str) -> str:
+        return f"""You are a code generation expert. Generate clean, efficient, and well-commented {language} code.
 
 {prompt}
 
 Provide ONLY the code without explanations. Make it production-ready."""
-        
-        if self.is_gemini:
-            response = self.llm.generate_content(full_prompt)
-            return response.text
-        else:
-            return self.llm.invoke(full_prompt)
     
-    def fix_bug(self, prompt: str, language: str) -> str:
-        """Fix bugs in code"""
-        full_prompt = f"""You are a debugging expert. Analyze and fix the bugs in the provided {language} code.
+    def _bug_prompt(self, prompt: str, language: str) -> str:
+        return f"""You are a debugging expert. Analyze and fix the bugs in the provided {language} code.
 
 {prompt}
 
 Provide ONLY the fixed code without explanations."""
-        
-        if self.is_gemini:
-            response = self.llm.generate_content(full_prompt)
-            return response.text
-        else:
-            return self.llm.invoke(full_prompt)
     
-    def analyze_quality(self, prompt: str) -> str:
-        """Analyze code quality"""
-        full_prompt = f"""You are a code quality expert. Provide a detailed analysis covering:
+    def _bug_analysis_prompt(self, prompt: str, language: str) -> str:
+        return f"""You are a debugging expert. Analyze the bugs in the provided {language} code and explain how to fix each one.
+
+{prompt}
+
+Provide a detailed analysis in this format:
+## 🐛 Bugs Found
+
+1. **Bug Name**: Brief description
+   - **Severity**: Critical/High/Medium/Low
+   - **Issue**: What was wrong
+   - **Fix**: How it was fixed
+
+2. (Continue for each bug found)
+
+## ✅ Summary
+Brief summary of all fixes applied."""
+    
+    def _quality_prompt(self, prompt: str) -> str:
+        return f"""You are a code quality expert. Provide a detailed analysis covering:
 1. Issues found (with severity: Critical/High/Medium/Low)
 2. Specific recommendations for improvement
 3. Code examples for fixes
 
 {prompt}"""
-        
-        if self.is_gemini:
-            response = self.llm.generate_content(full_prompt)
-            return response.text
-        else:
-            return self.llm.invoke(full_prompt)
     
-    def refactor_code(self, prompt: str, language: str) -> str:
-        """Refactor code"""
-        full_prompt = f"""You are a refactoring expert. Refactor the provided {language} code according to the specified goals.
+    def _refactor_prompt(self, prompt: str, language: str) -> str:
+        return f"""You are a refactoring expert. Refactor the provided {language} code according to the specified goals.
 
 {prompt}
 
 Provide ONLY the refactored code without explanations."""
-        
-        if self.is_gemini:
-            response = self.llm.generate_content(full_prompt)
-            return response.text
-        else:
-            return self.llm.invoke(full_prompt)
     
-    def generate_docs(self, prompt: str, language: str) -> str:
-        """Generate documentation"""
-        full_prompt = f"""You are a technical documentation expert. Generate comprehensive documentation for the {language} code.
+    def _docs_prompt(self, prompt: str, language: str) -> str:
+        return f"""You are a technical documentation expert. Generate comprehensive documentation for the {language} code.
 
 {prompt}"""
-        
-        if self.is_gemini:
-            response = self.llm.generate_content(full_prompt)
-            return response.text
-        else:
-            return self.llm.invoke(full_prompt)
     
-    def generate_tests(self, prompt: str, language: str) -> str:
-        """Generate unit tests"""
-        full_prompt = f"""You are a test automation expert. Generate comprehensive unit tests for the {language} code.
+    def _tests_prompt(self, prompt: str, language: str) -> str:
+        return f"""You are a test automation expert. Generate comprehensive unit tests for the {language} code.
 
 {prompt}
 
 Provide ONLY the test code without explanations."""
-        
-        if self.is_gemini:
-            response = self.llm.generate_content(full_prompt)
-            return response.text
-        else:
-            return self.llm.invoke(full_prompt)
     
-    def explain_code(self, prompt: str) -> str:
-        """Explain code"""
-        full_prompt = f"""You are a code educator. Provide a clear, structured explanation of the code.
+    def _explain_prompt(self, prompt: str) -> str:
+        return f"""You are a code educator. Provide a clear, structured explanation of the code.
 
 {prompt}
 
@@ -180,9 +876,318 @@ Structure your explanation with:
 2. Step-by-step breakdown
 3. Key concepts and patterns used
 4. Potential improvements or considerations"""
+    
+    def generate_response(self, user_query: str, context: Union[str, List[str]] = "", 
+                         chat_history: List = None, use_cache: bool = True) -> str:
+        """Generate AI response with optional context and history"""
+        return self._invoke("generate_response", self._response_prompt(user_query, context, chat_history), use_cache,
+                            self._semantic_request(user_query, chat_history))
+    
+    def generate_response_stream(self, user_query: str, context: Union[str, List[str]] = "",
+                                 chat_history: List = None, use_cache: bool = True) -> Iterator[str]:
+        """Stream AI response with optional context and history"""
+        return self._stream("generate_response", self._response_prompt(user_query, context, chat_history), use_cache,
+                            self._semantic_request(user_query, chat_history))
+    
+    def generate_code(self, prompt: str, language: str, use_cache: bool = True) -> str:
+        """Generate code based on description"""
+        return self._invoke("generate_code", self._code_prompt(prompt, language), use_cache)
+    
+    def generate_code_stream(self, prompt: str, language: str, use_cache: bool = True) -> Iterator[str]:
+        """Stream generated code"""
+        return self._stream("generate_code", self._code_prompt(prompt, language), use_cache)
+    
+    def fix_bug(self, prompt: str, language: str, use_cache: bool = True) -> str:
+        """Fix bugs in code"""
+        return self._invoke("fix_bug", self._bug_prompt(prompt, language), use_cache)
+    
+    def fix_bug_stream(self, prompt: str, language: str, use_cache: bool = True) -> Iterator[str]:
+        """Stream fixed code"""
+        return self._stream("fix_bug", self._bug_prompt(prompt, language), use_cache)
+    
+    def analyze_bugs(self, prompt: str, language: str, use_cache: bool = True) -> str:
+        """Explain the bugs in code and how to fix them"""
+        return self._invoke("analyze_bugs", self._bug_analysis_prompt(prompt, language), use_cache)
+    
+    def analyze_bugs_stream(self, prompt: str, language: str, use_cache: bool = True) -> Iterator[str]:
+        """Stream bug analysis"""
+        return self._stream("analyze_bugs", self._bug_analysis_prompt(prompt, language), use_cache)
+    
+    def analyze_quality(self, prompt: str, use_cache: bool = True) -> str:
+        """Analyze code quality"""
+        return self._invoke("analyze_quality", self._quality_prompt(prompt), use_cache)
+    
+    def analyze_quality_stream(self, prompt: str, use_cache: bool = True) -> Iterator[str]:
+        """Stream code quality analysis"""
+        return self._stream("analyze_quality", self._quality_prompt(prompt), use_cache)
+    
+    def refactor_code(self, prompt: str, language: str, use_cache: bool = True) -> str:
+        """Refactor code"""
+        return self._invoke("refactor_code", self._refactor_prompt(prompt, language), use_cache)
+    
+    def refactor_code_stream(self, prompt: str, language: str, use_cache: bool = True) -> Iterator[str]:
+        """Stream refactored code"""
+        return self._stream("refactor_code", self._refactor_prompt(prompt, language), use_cache)
+    
+    def generate_docs(self, prompt: str, language: str, use_cache: bool = True) -> str:
+        """Generate documentation"""
+        return self._invoke("generate_docs", self._docs_prompt(prompt, language), use_cache)
+    
+    def generate_docs_stream(self, prompt: str, language: str, use_cache: bool = True) -> Iterator[str]:
+        """Stream generated documentation"""
+        return self._stream("generate_docs", self._docs_prompt(prompt, language), use_cache)
+    
+    def generate_tests(self, prompt: str, language: str, use_cache: bool = True) -> str:
+        """Generate unit tests"""
+        return self._invoke("generate_tests", self._tests_prompt(prompt, language), use_cache)
+    
+    def generate_tests_stream(self, prompt: str, language: str, use_cache: bool = True) -> Iterator[str]:
+        """Stream generated unit tests"""
+        return self._stream("generate_tests", self._tests_prompt(prompt, language), use_cache)
+    
+    def explain_code(self, prompt: str, use_cache: bool = True) -> str:
+        """Explain code"""
+        return self._invoke("explain_code", self._explain_prompt(prompt), use_cache)
+    
+    def explain_code_stream(self, prompt: str, use_cache: bool = True) -> Iterator[str]:
+        """Stream code explanation"""
+        return self._stream("explain_code", self._explain_prompt(prompt), use_cache)
+    
+    def batch(self, method: str, inputs: Iterable, max_concurrency: int = 4, retries: int = 2,
+              backoff: float = 1.0, use_cache: bool = True, ordered: bool = False) -> Iterator[BatchResult]:
+        """Run one tool method over many inputs with bounded parallelism, yielding results as they finish"""
+        # Inputs are prompt strings or tuples of positional args, e.g. (prompt, "Python") for generate_docs.
+        # Transient failures are retried with backoff; other errors come back in the result so one
+        # bad input doesn't stop the batch.
+        if method not in BATCH_METHODS:
+            raise ValueError(f"Unsupported batch method: {method}")
+        fn = getattr(self, method)
+        
+        def run(index: int, item) -> BatchResult:
+            args = item if isinstance(item, tuple) else (item,)
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    return BatchResult(index, item, fn(*args, use_cache=use_cache), None, attempt)
+                except Exception as e:
+                    if attempt > retries or not is_transient_error(e):
+                        return BatchResult(index, item, None, e, attempt)
+                    time.sleep(backoff * 2 ** (attempt - 1))
+        
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm-batch")
+        try:
+            futures = [pool.submit(run, i, item) for i, item in enumerate(inputs)]
+            completed = futures if ordered else concurrent.futures.as_completed(futures)
+            for future in completed:
+                yield future.result()
+        finally:
+            # Abandoning the generator cancels whatever hasn't started yet
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Get the long-lived event loop that async LLM calls run on"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            # One loop for the process: backend async clients bind to the loop they were first used on
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-event-loop", daemon=True).start()
+        return _loop
+
+
+def submit(coro: Awaitable) -> concurrent.futures.Future:
+    """Schedule a coroutine on the shared event loop without blocking the caller"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+
+async def gather_limited(coros: Iterable[Awaitable], max_concurrency: int = 4,
+                         return_exceptions: bool = False) -> list:
+    """Await coroutines concurrently, at most max_concurrency at a time, preserving order"""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def run(coro):
+        async with semaphore:
+            return await coro
+    
+    return await asyncio.gather(*(run(c) for c in coros), return_exceptions=return_exceptions)
+
+
+def run_concurrently(coros: Iterable[Awaitable], max_concurrency: int = 4,
+                     return_exceptions: bool = False) -> list:
+    """Run coroutines concurrently from synchronous code and return their results in order"""
+    return submit(gather_limited(coros, max_concurrency, return_exceptions)).result()
+
+
+class AsyncLLMHandler:
+    """Asyncio version of LLMHandler sharing its backend, prompts and response cache"""
+    
+    def __init__(self, handler: LLMHandler):
+        self.handler = handler
+        self.backend = handler.backend
+        self.cache = handler.cache
+        self.semantic_cache = handler.semantic_cache
+    
+    async def _semantic_lookup(self, method: str, semantic: Tuple[str, str], use_cache: bool) -> Tuple[Optional[str], Any]:
+        """Semantic cache lookup off the event loop, since it runs the embedding model"""
+        if not (self.semantic_cache and use_cache and semantic):
+            return None, None
+        question, code = semantic
+        return await asyncio.to_thread(self.semantic_cache.lookup, self.handler._semantic_scope(method, code), question)
+    
+    def _semantic_store(self, method: str, semantic: Tuple[str, str], response: str, vector):
+        question, code = semantic
+        self.semantic_cache.store(self.handler._semantic_scope(method, code), question, response, vector)
+    
+    async def _ainvoke(self, method: str, full_prompt: str, use_cache: bool = True,
+                       semantic: Tuple[str, str] = None) -> str:
+        """Run a prompt against the active backend without blocking the event loop"""
+        key = None
+        if self.cache and use_cache:
+            key = self.handler._cache_key(method, full_prompt)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        cached, vector = await self._semantic_lookup(method, semantic, use_cache)
+        if cached is not None:
+            return cached
+        
+        flight = self.handler.single_flight
+        if flight:
+            flight_key = key or self.handler._cache_key(method, full_prompt)
+            future, leader = flight.begin(flight_key)
+            if not leader:
+                return await asyncio.wrap_future(future)
+        
+        try:
+            response = await self.backend.ainvoke(full_prompt)
+            if key:
+                self.cache.set(key, method, response)
+            if vector is not None:
+                self._semantic_store(method, semantic, response, vector)
+        except BaseException as e:
+            if flight:
+                flight.end(flight_key, future, error=e)
+            raise
+        
+        if flight:
+            flight.end(flight_key, future, response)
+        return response
+    
+    async def _astream(self, method: str, full_prompt: str, use_cache: bool = True,
+                       semantic: Tuple[str, str] = None) -> AsyncIterator[str]:
+        """Run a prompt against the active backend and yield text chunks as they arrive"""
+        key = None
+        if self.cache and use_cache:
+            key = self.handler._cache_key(method, full_prompt)
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        
+        cached, vector = await self._semantic_lookup(method, semantic, use_cache)
+        if cached is not None:
+            yield cached
+            return
+        
+        async def produce() -> AsyncIterator[str]:
+            parts = []
+            async for chunk in self.backend.astream(full_prompt):
+                parts.append(chunk)
+                yield chunk
+            
+            if key:
+                self.cache.set(key, method, "".join(parts))
+            if vector is not None:
+                self._semantic_store(method, semantic, "".join(parts), vector)
         
-        if self.is_gemini:
-            response = self.llm.generate_content(full_prompt)
-            return response.text
+        # Shares in-flight streams with the sync handler too, since both use the same keys
+        flight = self.handler.single_flight
+        if flight:
+            chunks = flight.astream(key or self.handler._cache_key(method, full_prompt), produce)
         else:
-            return self.llm.invoke(full_prompt)
+            chunks = produce()
+        async for chunk in chunks:
+            yield chunk
+    
+    async def generate_response(self, user_query: str, context: Union[str, List[str]] = "",
+                                chat_history: List = None, use_cache: bool = True) -> str:
+        """Generate AI response with optional context and history"""
+        return await self._ainvoke("generate_response", self.handler._response_prompt(user_query, context, chat_history), use_cache,
+                                   self.handler._semantic_request(user_query, chat_history))
+    
+    def generate_response_stream(self, user_query: str, context: Union[str, List[str]] = "",
+                                 chat_history: List = None, use_cache: bool = True) -> AsyncIterator[str]:
+        """Stream AI response with optional context and history"""
+        return self._astream("generate_response", self.handler._response_prompt(user_query, context, chat_history), use_cache,
+                             self.handler._semantic_request(user_query, chat_history))
+    
+    async def generate_code(self, prompt: str, language: str, use_cache: bool = True) -> str:
+        """Generate code based on description"""
+        return await self._ainvoke("generate_code", self.handler._code_prompt(prompt, language), use_cache)
+    
+    def generate_code_stream(self, prompt: str, language: str, use_cache: bool = True) -> AsyncIterator[str]:
+        """Stream generated code"""
+        return self._astream("generate_code", self.handler._code_prompt(prompt, language), use_cache)
+    
+    async def fix_bug(self, prompt: str, language: str, use_cache: bool = True) -> str:
+        """Fix bugs in code"""
+        return await self._ainvoke("fix_bug", self.handler._bug_prompt(prompt, language), use_cache)
+    
+    def fix_bug_stream(self, prompt: str, language: str, use_cache: bool = True) -> AsyncIterator[str]:
+        """Stream fixed code"""
+        return self._astream("fix_bug", self.handler._bug_prompt(prompt, language), use_cache)
+    
+    async def analyze_bugs(self, prompt: str, language: str, use_cache: bool = True) -> str:
+        """Explain the bugs in code and how to fix them"""
+        return await self._ainvoke("analyze_bugs", self.handler._bug_analysis_prompt(prompt, language), use_cache)
+    
+    def analyze_bugs_stream(self, prompt: str, language: str, use_cache: bool = True) -> AsyncIterator[str]:
+        """Stream bug analysis"""
+        return self._astream("analyze_bugs", self.handler._bug_analysis_prompt(prompt, language), use_cache)
+    
+    async def analyze_quality(self, prompt: str, use_cache: bool = True) -> str:
+        """Analyze code quality"""
+        return await self._ainvoke("analyze_quality", self.handler._quality_prompt(prompt), use_cache)
+    
+    def analyze_quality_stream(self, prompt: str, use_cache: bool = True) -> AsyncIterator[str]:
+        """Stream code quality analysis"""
+        return self._astream("analyze_quality", self.handler._quality_prompt(prompt), use_cache)
+    
+    async def refactor_code(self, prompt: str, language: str, use_cache: bool = True) -> str:
+        """Refactor code"""
+        return await self._ainvoke("refactor_code", self.handler._refactor_prompt(prompt, language), use_cache)
+    
+    def refactor_code_stream(self, prompt: str, language: str, use_cache: bool = True) -> AsyncIterator[str]:
+        """Stream refactored code"""
+        return self._astream("refactor_code", self.handler._refactor_prompt(prompt, language), use_cache)
+    
+    async def generate_docs(self, prompt: str, language: str, use_cache: bool = True) -> str:
+        """Generate documentation"""
+        return await self._ainvoke("generate_docs", self.handler._docs_prompt(prompt, language), use_cache)
+    
+    def generate_docs_stream(self, prompt: str, language: str, use_cache: bool = True) -> AsyncIterator[str]:
+        """Stream generated documentation"""
+        return self._astream("generate_docs", self.handler._docs_prompt(prompt, language), use_cache)
+    
+    async def generate_tests(self, prompt: str, language: str, use_cache: bool = True) -> str:
+        """Generate unit tests"""
+        return await self._ainvoke("generate_tests", self.handler._tests_prompt(prompt, language), use_cache)
+    
+    def generate_tests_stream(self, prompt: str, language: str, use_cache: bool = True) -> AsyncIterator[str]:
+        """Stream generated unit tests"""
+        return self._astream("generate_tests", self.handler._tests_prompt(prompt, language), use_cache)
+    
+    async def explain_code(self, prompt: str, use_cache: bool = True) -> str:
+        """Explain code"""
+        return await self._ainvoke("explain_code", self.handler._explain_prompt(prompt), use_cache)
+    
+    def explain_code_stream(self, prompt: str, use_cache: bool = True) -> AsyncIterator[str]:
+        """Stream code explanation"""
+        return self._astream("explain_code", self.handler._explain_prompt(prompt), use_cache)
@@ -0,0 +1,460 @@
+import asyncio
+import concurrent.futures
+import math
+import queue
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Iterator, List, Optional
+
+# Calls that may be hedged run on a shared pool, since the loser keeps running in the background
+_primary_pool = concurrent.futures.ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-call")
+# Hedges get their own pool so they never queue behind primaries. At most MAX_HEDGES run at once,
+# past that a slow call just waits for its primary instead of adding load to the other backend
+MAX_HEDGES = 8
+_hedge_pool = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_HEDGES, thread_name_prefix="llm-hedge")
+_hedge_slots = threading.BoundedSemaphore(MAX_HEDGES)
+
+
+class BackendStats:
+    """Rolling latency and error rate of one backend"""
+
+    def __init__(self, window: int = 50):
+        self.latencies = deque(maxlen=window)  # full answers from invoke
+        self.ttfts = deque(maxlen=window)  # time to first chunk of streams
+        self.outcomes = deque(maxlen=window)  # True for success
+        self.calls = 0
+        self.last_failure = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool, streaming: bool = False):
+        with self._lock:
+            self.calls += 1
+            self.outcomes.append(ok)
+            if ok:
+                (self.ttfts if streaming else self.latencies).append(latency)
+            else:
+                self.last_failure = time.time()
+
+    def percentile(self, q: float, streaming: bool = False) -> Optional[float]:
+        with self._lock:
+            values = sorted(self.ttfts if streaming else self.latencies)
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(math.ceil(q * len(values))) - 1)]
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self.outcomes:
+                return 0.0
+            return self.outcomes.count(False) / len(self.outcomes)
+
+    @property
+    def samples(self) -> int:
+        with self._lock:
+            return len(self.outcomes)
+
+
+class LLMRouter:
+    """Route each call to the best healthy backend, with fallback and optional hedged requests"""
+
+    name = "router"
+
+    def __init__(self, backends: List, hedge_after: float = None, window: int = 50,
+                 max_error_rate: float = 0.5, min_samples: int = 5, cooldown: float = 30.0,
+                 preference_weight: float = 3.0):
+        # backends are in preference order; the first one is what the user picked
+        self.backends = backends
+        self.hedge_after = hedge_after
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        # A non-preferred backend must be this many times faster (p50) to be picked over the preferred one
+        self.preference_weight = preference_weight
+        self.model = "+".join(f"{b.name}:{b.model}" for b in backends)
+        self.stats_by_backend = {b.name: BackendStats(window) for b in backends}
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def _healthy(self, backend) -> bool:
+        stats = self.stats_by_backend[backend.name]
+        if stats.samples < self.min_samples or stats.error_rate <= self.max_error_rate:
+            return True
+        # Give a failing backend another chance once the cooldown has passed
+        return time.time() - stats.last_failure > self.cooldown
+
+    def _score(self, rank: int, backend, streaming: bool = False) -> float:
+        p50 = self.stats_by_backend[backend.name].percentile(0.5, streaming)
+        if p50 is None:
+            # Untried: the preferred backend goes first, the others only get traffic via fallback or hedging
+            return 0.0 if rank == 0 else math.inf
+        return p50 if rank == 0 else p50 * self.preference_weight
+
+    def ranked(self, streaming: bool = False) -> List:
+        """Backends in the order they should be tried for the next call; streams are ranked by time to first chunk"""
+        ranked = sorted(enumerate(self.backends),
+                        key=lambda rb: (not self._healthy(rb[1]), self._score(*rb, streaming), rb[0]))
+        return [backend for _, backend in ranked]
+
+    @staticmethod
+    def _take_hedge_slot() -> bool:
+        return _hedge_slots.acquire(blocking=False)
+
+    def _timed(self, backend, prompt: str) -> str:
+        start = time.perf_counter()
+        try:
+            result = backend.invoke(prompt)
+        except Exception:
+            self.stats_by_backend[backend.name].record(time.perf_counter() - start, False)
+            raise
+        self.stats_by_backend[backend.name].record(time.perf_counter() - start, True)
+        return result
+
+    def _first_success(self, order: List, prompt: str, error: Exception = None) -> str:
+        """Try backends in order until one answers"""
+        for backend in order:
+            try:
+                return self._timed(backend, prompt)
+            except Exception as e:
+                print(f"LLM backend {backend.name} failed, trying next: {e}")
+                error = e
+        raise error
+
+    def invoke(self, prompt: str) -> str:
+        order = self.ranked()
+        if self.hedge_after is None or len(order) < 2:
+            return self._first_success(order, prompt)
+
+        # Hedge: if the primary is slower than hedge_after, race it against the runner-up
+        primary = _primary_pool.submit(self._timed, order[0], prompt)
+        try:
+            return primary.result(timeout=self.hedge_after)
+        except concurrent.futures.TimeoutError:
+            pass
+        except Exception as e:
+            print(f"LLM backend {order[0].name} failed, trying next: {e}")
+            return self._first_success(order[1:], prompt, e)
+
+        if not self._take_hedge_slot():
+            try:
+                return primary.result()
+            except Exception as e:
+                print(f"LLM backend {order[0].name} failed, trying next: {e}")
+                return self._first_success(order[1:], prompt, e)
+        self.hedges_fired += 1
+        secondary = _hedge_pool.submit(self._timed, order[1], prompt)
+        secondary.add_done_callback(lambda _: _hedge_slots.release())
+        pending = {primary, secondary}
+        error = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is secondary:
+                        self.hedges_won += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _stream_in_order(self, order: List, prompt: str, error: Exception = None) -> Iterator[str]:
+        """Stream from backends in order, falling back only while nothing has been yielded"""
+        for backend in order:
+            start = time.perf_counter()
+            ttft = None
+            try:
+                for chunk in backend.stream(prompt):
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    yield chunk
+            except Exception as e:
+                self.stats_by_backend[backend.name].record(time.perf_counter() - start, False, streaming=True)
+                # A half-streamed answer can't be retried
+                if ttft is not None:
+                    raise
+                print(f"LLM backend {backend.name} failed, trying next: {e}")
+                error = e
+                continue
+            self.stats_by_backend[backend.name].record(ttft or time.perf_counter() - start, True, streaming=True)
+            return
+        raise error
+
+    def _pump(self, backend, prompt: str, out: queue.Queue, stop: threading.Event, hedge: bool = False):
+        """Drain a backend stream into out as (backend, kind, value) until it ends or stop is set"""
+        start = time.perf_counter()
+        ttft = None
+        try:
+            stream = backend.stream(prompt)
+            try:
+                for chunk in stream:
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    # A loser still reaches its first chunk, so its time to first chunk gets recorded
+                    if stop.is_set():
+                        break
+                    out.put((backend, "chunk", chunk))
+            finally:
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
+        except Exception as e:
+            self.stats_by_backend[backend.name].record(time.perf_counter() - start, False, streaming=True)
+            out.put((backend, "error", e))
+            return
+        finally:
+            if hedge:
+                _hedge_slots.release()
+        self.stats_by_backend[backend.name].record(ttft or time.perf_counter() - start, True, streaming=True)
+        out.put((backend, "done", None))
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        order = self.ranked(streaming=True)
+        if self.hedge_after is None or len(order) < 2:
+            yield from self._stream_in_order(order, prompt)
+            return
+
+        # Hedge on time to first chunk: whichever backend yields first is kept and the other is stopped
+        out = queue.Queue()
+        running = {}  # backend name -> stop event, for streams started that haven't failed
+        tried = set()
+
+        def start(backend, hedge: bool = False):
+            running[backend.name] = threading.Event()
+            tried.add(backend.name)
+            pool = _hedge_pool if hedge else _primary_pool
+            pool.submit(self._pump, backend, prompt, out, running[backend.name], hedge)
+
+        start(order[0])
+        deadline = time.perf_counter() + self.hedge_after
+        waited = False
+        try:
+            while True:
+                try:
+                    backend, kind, value = out.get(timeout=None if waited else max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    waited = True
+                    if self._take_hedge_slot():
+                        self.hedges_fired += 1
+                        start(order[1], hedge=True)
+                    continue
+                if kind == "chunk":
+                    break
+                if kind == "done":
+                    # Finished without a single chunk: an empty answer is still an answer
+                    return
+                print(f"LLM backend {backend.name} failed, trying next: {value}")
+                del running[backend.name]
+                if not running:
+                    # Nothing was yielded, so the backends not tried yet can still take over
+                    yield from self._stream_in_order([b for b in order if b.name not in tried], prompt, value)
+                    return
+
+            winner = backend
+            for name, stop in running.items():
+                if name != winner.name:
+                    stop.set()
+            if winner is not order[0]:
+                self.hedges_won += 1
+            yield value
+            while True:
+                backend, kind, value = out.get()
+                if backend is not winner:
+                    continue
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            # Also runs when the caller abandons the stream, so no backend keeps generating for nobody
+            for stop in running.values():
+                stop.set()
+
+    async def _atimed(self, backend, prompt: str) -> str:
+        start = time.perf_counter()
+        try:
+            result = await backend.ainvoke(prompt)
+        except Exception:
+            self.stats_by_backend[backend.name].record(time.perf_counter() - start, False)
+            raise
+        self.stats_by_backend[backend.name].record(time.perf_counter() - start, True)
+        return result
+
+    async def _afirst_success(self, order: List, prompt: str, error: Exception = None) -> str:
+        """Try backends in order until one answers"""
+        for backend in order:
+            try:
+                return await self._atimed(backend, prompt)
+            except Exception as e:
+                print(f"LLM backend {backend.name} failed, trying next: {e}")
+                error = e
+        raise error
+
+    async def ainvoke(self, prompt: str) -> str:
+        order = self.ranked()
+        if self.hedge_after is None or len(order) < 2:
+            return await self._afirst_success(order, prompt)
+
+        primary = asyncio.ensure_future(self._atimed(order[0], prompt))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if primary in done:
+            if primary.exception() is None:
+                return primary.result()
+            print(f"LLM backend {order[0].name} failed, trying next: {primary.exception()}")
+            return await self._afirst_success(order[1:], prompt, primary.exception())
+
+        if not self._take_hedge_slot():
+            try:
+                return await primary
+            except Exception as e:
+                print(f"LLM backend {order[0].name} failed, trying next: {e}")
+                return await self._afirst_success(order[1:], prompt, e)
+        self.hedges_fired += 1
+        secondary = asyncio.ensure_future(self._atimed(order[1], prompt))
+        secondary.add_done_callback(lambda _: _hedge_slots.release())
+        pending = {primary, secondary}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is secondary:
+                        self.hedges_won += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    async def _astream_in_order(self, order: List, prompt: str, error: Exception = None) -> AsyncIterator[str]:
+        """Stream from backends in order, falling back only while nothing has been yielded"""
+        for backend in order:
+            start = time.perf_counter()
+            ttft = None
+            try:
+                async for chunk in backend.astream(prompt):
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    yield chunk
+            except Exception as e:
+                self.stats_by_backend[backend.name].record(time.perf_counter() - start, False, streaming=True)
+                if ttft is not None:
+                    raise
+                print(f"LLM backend {backend.name} failed, trying next: {e}")
+                error = e
+                continue
+            self.stats_by_backend[backend.name].record(ttft or time.perf_counter() - start, True, streaming=True)
+            return
+        raise error
+
+    async def _apump(self, backend, prompt: str, out: asyncio.Queue, stop: threading.Event, hedge: bool = False):
+        """Drain a backend stream into out as (backend, kind, value) until it ends or stop is set"""
+        start = time.perf_counter()
+        ttft = None
+        try:
+            stream = backend.astream(prompt)
+            try:
+                async for chunk in stream:
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    if stop.is_set():
+                        break
+                    out.put_nowait((backend, "chunk", chunk))
+            finally:
+                aclose = getattr(stream, "aclose", None)
+                if aclose:
+                    await aclose()
+        except Exception as e:
+            self.stats_by_backend[backend.name].record(time.perf_counter() - start, False, streaming=True)
+            out.put_nowait((backend, "error", e))
+            return
+        finally:
+            if hedge:
+                _hedge_slots.release()
+        self.stats_by_backend[backend.name].record(ttft or time.perf_counter() - start, True, streaming=True)
+        out.put_nowait((backend, "done", None))
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        order = self.ranked(streaming=True)
+        if self.hedge_after is None or len(order) < 2:
+            async for chunk in self._astream_in_order(order, prompt):
+                yield chunk
+            return
+
+        # Same race as stream(), with tasks instead of pool threads
+        out = asyncio.Queue()
+        running = {}
+        tried = set()
+
+        def start(backend, hedge: bool = False):
+            running[backend.name] = threading.Event()
+            tried.add(backend.name)
+            asyncio.ensure_future(self._apump(backend, prompt, out, running[backend.name], hedge))
+
+        start(order[0])
+        deadline = time.perf_counter() + self.hedge_after
+        waited = False
+        try:
+            while True:
+                try:
+                    timeout = None if waited else max(deadline - time.perf_counter(), 0)
+                    backend, kind, value = await asyncio.wait_for(out.get(), timeout)
+                except asyncio.TimeoutError:
+                    waited = True
+                    if self._take_hedge_slot():
+                        self.hedges_fired += 1
+                        start(order[1], hedge=True)
+                    continue
+                if kind == "chunk":
+                    break
+                if kind == "done":
+                    return
+                print(f"LLM backend {backend.name} failed, trying next: {value}")
+                del running[backend.name]
+                if not running:
+                    async for chunk in self._astream_in_order([b for b in order if b.name not in tried], prompt, value):
+                        yield chunk
+                    return
+
+            winner = backend
+            for name, stop in running.items():
+                if name != winner.name:
+                    stop.set()
+            if winner is not order[0]:
+                self.hedges_won += 1
+            yield value
+            while True:
+                backend, kind, value = await out.get()
+                if backend is not winner:
+                    continue
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            for stop in running.values():
+                stop.set()
+
+    def stats(self) -> dict:
+        """Rolling latency, error rate and health per backend, in current routing order"""
+        backends = {}
+        for backend in self.ranked():
+            stats = self.stats_by_backend[backend.name]
+            backends[backend.name] = {
+                "model": backend.model,
+                "calls": stats.calls,
+                "p50": stats.percentile(0.5),
+                "p95": stats.percentile(0.95),
+                "ttft_p50": stats.percentile(0.5, streaming=True),
+                "ttft_p95": stats.percentile(0.95, streaming=True),
+                "error_rate": stats.error_rate,
+                "healthy": self._healthy(backend),
+            }
+        return {
+            "preferred": self.backends[0].name,
+            "backends": backends,
+            "hedge_after": self.hedge_after,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+        }
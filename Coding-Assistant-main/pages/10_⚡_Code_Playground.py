@@ -6,16 +6,6 @@ import os
 
 st.set_page_config(page_title="Code Playground", page_icon="⚡", layout="wide")
 
-# Initialize components if not already done
-if 'llm' not in st.session_state:
-    from database import HistoryDB
-    from embeddings import SemanticSearch
-    from llm_handler import LLMHandler
-    
-    st.session_state.db = HistoryDB()
-    st.session_state.search = SemanticSearch()
-    st.session_state.llm = LLMHandler(model="llama3.1:latest")
-
 # Load custom CSS
 def load_css():
     try:
@@ -109,7 +99,7 @@ if run_button and code.strip():
                     st.code(result.stdout, language="text")
                 if result.stderr:
                     st.error(result.stderr)
-                    
+            
             elif language == "JavaScript":
                 # Run JavaScript with Node.js
                 with tempfile.NamedTemporaryFile(mode='w', suffix='.js', delete=False) as f:
@@ -130,11 +120,11 @@ if run_button and code.strip():
                         st.error(result.stderr)
                 finally:
                     os.unlink(temp_file)
-                    
+            
             else:
                 st.warning(f"{language} execution not yet implemented. Currently supports Python and JavaScript.")
                 st.info("Your code is valid and ready to run in a proper environment!")
-                
+        
         except subprocess.TimeoutExpired:
             st.error("Code execution timed out (5 seconds limit)")
         except FileNotFoundError as e:
@@ -2,24 +2,16 @@ import streamlit as st
 
 st.set_page_config(page_title="Chat", page_icon="💬", layout="wide")
 
-# Initialize components if not already done
-if 'db' not in st.session_state:
-    from database import HistoryDB
-    from embeddings import SemanticSearch
-    st.session_state.db = HistoryDB()
-    st.session_state.search = SemanticSearch()
+# Shared components (one instance per process, reused across reruns and sessions)
+import registry
 
-# Always reinitialize LLM based on current settings
-from llm_handler import LLMHandler
-llm = LLMHandler(
-    model="llama3.1:latest",
+db = registry.get_db()
+llm = registry.get_llm(
     use_gemini=st.session_state.get('use_gemini', True),
-    api_key=st.session_state.get('gemini_api_key', '')
+    api_key=st.session_state.get('gemini_api_key', ''),
+    cloud_fallback=st.session_state.get('cloud_fallback', False)
 )
 
-db = st.session_state.db
-search = st.session_state.search
-
 # Load custom CSS
 def load_css():
     try:
@@ -34,6 +26,10 @@ load_css()
 from sidebar_config import render_sidebar
 render_sidebar()
 
+from streaming import render_stream, show_ttft
+
+use_cache = st.session_state.use_cache
+
 st.title("💬 Chat Assistant")
 st.caption("General coding conversations with context awareness")
 
@@ -41,7 +37,7 @@ st.caption("General coding conversations with context awareness")
 with st.sidebar:
     st.markdown("### ⚙️ Settings")
     use_semantic_search = st.checkbox("Use Semantic Search", value=True, 
-                                      help="Find and use relevant past conversations")
+                                      help="Find and use relevant past conversations (keyword + semantic)")
     
     st.markdown("---")
     
@@ -78,22 +74,30 @@ if prompt := st.chat_input("Ask me anything about coding..."):
     # Generate response
     with st.chat_message("assistant"):
         with st.spinner("Thinking..."):
-            context = ""
-            
-            # Semantic search for relevant history
-            if use_semantic_search and db and search:
-                conversations = db.get_all_conversations()
-                if conversations:
-                    search.build_index(conversations)
-                    similar = search.search(prompt, k=3)
-                    if similar:
-                        context = "\n".join([f"Q: {s[2]}\nA: {s[3][:200]}" for s in similar])
+            context = []
             
-            # Generate response
-            response = llm.generate_response(prompt, context, st.session_state.messages[:-1])
-            st.markdown(response)
+            # Hybrid keyword + semantic search for relevant history - the prompt builder trims it to the token budget.
+            # The index follows the history DB; saving a message below only queues it for the background indexer.
+            # The embedding model is only loaded here, the first time semantic search is used.
+            if use_semantic_search:
+                similar = registry.get_retriever().search(prompt, k=3)
+                context = [f"Q: {s[2]}\nA: {s[3]}" for s in similar]
+        
+        # Stream response
+        response = render_stream(llm.generate_response_stream(prompt, context, st.session_state.messages[:-1],
+                                                              use_cache=use_cache))
+        show_ttft(llm)
+        
+        usage = llm.last_prompt_usage
+        if usage:
+            st.caption(
+                f"🧮 Prompt {usage['total']}/{usage['budget']} tokens · system {usage['system']} · "
+                f"context {usage['context']} · history {usage['history']} · query {usage['query']}"
+                + (f" · {usage['dropped']} dropped" if usage['dropped'] else "")
+                + (" · ⚠️ over budget" if usage.get('over_budget') else "")
+            )
     
     # Save to history
     st.session_state.messages.append({"role": "assistant", "content": response})
     if db:
-        db.add_conversation(prompt, response)
+        db.add_conversation(prompt, response, tool="chat")
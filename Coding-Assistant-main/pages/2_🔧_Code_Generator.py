@@ -2,22 +2,17 @@ import streamlit as st
 
 st.set_page_config(page_title="Code Generator", page_icon="🔧", layout="wide")
 
-# Initialize components if not already done
-if 'db' not in st.session_state:
-    from database import HistoryDB
-    from embeddings import SemanticSearch
-    st.session_state.db = HistoryDB()
-    st.session_state.search = SemanticSearch()
+# Shared components (one instance per process, reused across reruns and sessions)
+import registry
+from llm_handler import AsyncLLMHandler, run_concurrently
 
-# Always reinitialize LLM based on current settings
-from llm_handler import LLMHandler
-llm = LLMHandler(
-    model="llama3.1:latest",
+db = registry.get_db()
+llm = registry.get_llm(
     use_gemini=st.session_state.get('use_gemini', True),
-    api_key=st.session_state.get('gemini_api_key', '')
+    api_key=st.session_state.get('gemini_api_key', ''),
+    cloud_fallback=st.session_state.get('cloud_fallback', False)
 )
-
-db = st.session_state.db
+allm = AsyncLLMHandler(llm)
 
 # Load custom CSS
 def load_css():
@@ -33,6 +28,10 @@ load_css()
 from sidebar_config import render_sidebar
 render_sidebar()
 
+from streaming import render_stream, show_ttft
+
+use_cache = st.session_state.use_cache
+
 st.title("🔧 Code Generator")
 st.caption("Generate production-ready code from natural language descriptions")
 
@@ -58,32 +57,49 @@ with col2:
 
 if st.button("✨ Generate Code", type="primary", use_container_width=True):
     if description:
-        with st.spinner(f"Generating {language} code..."):
-            prompt = f"Generate {language} code for: {description}"
-            
-            if include_tests:
-                prompt += "\nInclude comprehensive unit tests."
-            if include_docs:
-                prompt += "\nInclude detailed documentation and comments."
-            if include_examples:
-                prompt += "\nInclude usage examples."
-            
-            response = llm.generate_code(prompt, language)
-            
-            st.markdown("### Generated Code")
-            st.code(response, language=language.lower())
-            
-            # Save to history
-            if db:
-                db.add_conversation(description, response, response, language)
+        prompt = f"Generate {language} code for: {description}"
+        
+        st.markdown("### Generated Code")
+        response = render_stream(llm.generate_code_stream(prompt, language, use_cache=use_cache), language=language.lower())
+        show_ttft(llm)
+        
+        # Tests, docs and examples only depend on the code, so request them together
+        extras = []
+        if include_tests:
+            extras.append(("🧪 Unit Tests", "code", allm.generate_tests(
+                f"Generate comprehensive unit tests for this {language} code:\n\n{response}", language, use_cache=use_cache)))
+        if include_docs:
+            extras.append(("📝 Documentation", "markdown", allm.generate_docs(
+                f"Generate detailed documentation for this {language} code:\n\n{response}", language, use_cache=use_cache)))
+        if include_examples:
+            extras.append(("💡 Usage Examples", "markdown", allm.generate_docs(
+                f"Write practical usage examples for this {language} code:\n\n{response}", language, use_cache=use_cache)))
+        
+        full_response = response
+        if extras:
+            with st.spinner(f"Generating {', '.join(title for title, _, _ in extras)}..."):
+                results = run_concurrently([coro for _, _, coro in extras])
             
-            # Copy button
-            st.download_button(
-                "📋 Download Code",
-                response,
-                f"generated_code.{language.lower()}",
-                use_container_width=True
-            )
+            tabs = st.tabs([title for title, _, _ in extras])
+            for tab, (title, kind, _), result in zip(tabs, extras, results):
+                with tab:
+                    if kind == "code":
+                        st.code(result, language=language.lower())
+                    else:
+                        st.markdown(result)
+                full_response += f"\n\n## {title}\n\n{result}"
+        
+        # Save to history
+        if db:
+            db.add_conversation(description, full_response, response, language, tool="code_generator")
+        
+        # Copy button
+        st.download_button(
+            "📋 Download Code",
+            response,
+            f"generated_code.{language.lower()}",
+            use_container_width=True
+        )
     else:
         st.warning("Please provide a description of what you want to build.")
 
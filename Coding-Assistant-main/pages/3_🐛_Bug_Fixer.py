@@ -2,22 +2,17 @@ import streamlit as st
 
 st.set_page_config(page_title="Bug Fixer", page_icon="🐛", layout="wide")
 
-# Initialize components if not already done
-if 'db' not in st.session_state:
-    from database import HistoryDB
-    from embeddings import SemanticSearch
-    st.session_state.db = HistoryDB()
-    st.session_state.search = SemanticSearch()
+# Shared components (one instance per process, reused across reruns and sessions)
+import registry
+from llm_handler import AsyncLLMHandler, submit
 
-# Always reinitialize LLM based on current settings
-from llm_handler import LLMHandler
-llm = LLMHandler(
-    model="llama3.1:latest",
+db = registry.get_db()
+llm = registry.get_llm(
     use_gemini=st.session_state.get('use_gemini', True),
-    api_key=st.session_state.get('gemini_api_key', '')
+    api_key=st.session_state.get('gemini_api_key', ''),
+    cloud_fallback=st.session_state.get('cloud_fallback', False)
 )
-
-db = st.session_state.db
+allm = AsyncLLMHandler(llm)
 
 # Load custom CSS
 def load_css():
@@ -33,6 +28,10 @@ load_css()
 from sidebar_config import render_sidebar
 render_sidebar()
 
+from streaming import render_stream, show_ttft
+
+use_cache = st.session_state.use_cache
+
 st.title("🐛 Bug Fixer & Debugger")
 st.caption("Analyze, debug, and repair your code")
 
@@ -62,79 +61,66 @@ with col2:
 
 if st.button("🔧 Fix Bug", type="primary", use_container_width=True):
     if buggy_code:
-        with st.spinner("Analyzing and fixing bugs..."):
-            # First, get the fixed code
-            fix_prompt = f"Fix the bugs in this {code_language} code:\n\n{buggy_code}"
+        # Display side by side
+        col_a, col_b = st.columns(2)
+        
+        with col_a:
+            st.markdown("### 🔴 Original Code")
+            st.code(buggy_code, language=code_language.lower())
+        
+        with col_b:
+            st.markdown("### ✅ Fixed Code")
+            fixed_placeholder = st.empty()
+        
+        fix_prompt = f"Fix the bugs in this {code_language} code:\n\n{buggy_code}"
+        if error_msg:
+            fix_prompt += f"\n\nError message: {error_msg}"
+        
+        # Start the bug analysis in the background so it overlaps with the fix
+        explanation_future = None
+        if explain_fix:
+            explain_prompt = f"Code:\n{buggy_code}\n"
             if error_msg:
-                fix_prompt += f"\n\nError message: {error_msg}"
-            
-            fixed_code = llm.fix_bug(fix_prompt, code_language)
-            
-            # Then, get explanation if requested
-            explanation = ""
-            if explain_fix:
-                explain_prompt = f"""Analyze the bugs that were fixed in this {code_language} code.
-
-Original Code:
-{buggy_code}
-
-Fixed Code:
-{fixed_code}
-
-Provide a detailed analysis in this format:
-## 🐛 Bugs Found
-
-1. **Bug Name**: Brief description
-   - **Severity**: Critical/High/Medium/Low
-   - **Issue**: What was wrong
-   - **Fix**: How it was fixed
-
-2. (Continue for each bug found)
-
-## ✅ Summary
-Brief summary of all fixes applied."""
-                
-                explanation = llm.generate_response(explain_prompt)
-            
-            # Display side by side
-            col_a, col_b = st.columns(2)
+                explain_prompt += f"\nError message:\n{error_msg}\n"
             
-            with col_a:
-                st.markdown("### 🔴 Original Code")
-                st.code(buggy_code, language=code_language.lower())
-            
-            with col_b:
-                st.markdown("### ✅ Fixed Code")
-                st.code(fixed_code, language=code_language.lower())
-            
-            # Show explanation below
+            explanation_future = submit(allm.analyze_bugs(explain_prompt, code_language, use_cache=use_cache))
+        
+        # Stream the fixed code meanwhile
+        fixed_code = render_stream(llm.fix_bug_stream(fix_prompt, code_language, use_cache=use_cache),
+                                   language=code_language.lower(), placeholder=fixed_placeholder)
+        show_ttft(llm)
+        
+        # Show explanation below
+        explanation = ""
+        if explanation_future:
+            st.markdown("---")
+            st.markdown("### 📋 Bug Analysis & Fixes")
+            with st.spinner("Finishing bug analysis..."):
+                explanation = explanation_future.result()
+            st.markdown(explanation)
+        
+        # Save to history
+        if db:
+            db.add_conversation(f"Fix bug in {code_language}", fixed_code, fixed_code, code_language, tool="bug_fix")
+        
+        # Download buttons
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                "📥 Download Fixed Code",
+                fixed_code,
+                f"fixed_code.{code_language.lower()}",
+                use_container_width=True
+            )
+        with col2:
             if explanation:
-                st.markdown("---")
-                st.markdown("### 📋 Bug Analysis & Fixes")
-                st.markdown(explanation)
-            
-            # Save to history
-            if db:
-                db.add_conversation(f"Fix bug in {code_language}", fixed_code, fixed_code, code_language)
-            
-            # Download buttons
-            col1, col2 = st.columns(2)
-            with col1:
                 st.download_button(
-                    "📥 Download Fixed Code",
-                    fixed_code,
-                    f"fixed_code.{code_language.lower()}",
+                    "📄 Download Report",
+                    explanation,
+                    "bug_fix_report.md",
+                    "text/markdown",
                     use_container_width=True
                 )
-            with col2:
-                if explanation:
-                    st.download_button(
-                        "📄 Download Report",
-                        explanation,
-                        "bug_fix_report.md",
-                        "text/markdown",
-                        use_container_width=True
-                    )
     else:
         st.warning("Please paste the code you want to fix.")
 
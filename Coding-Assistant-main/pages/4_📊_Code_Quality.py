@@ -2,23 +2,16 @@ import streamlit as st
 
 st.set_page_config(page_title="Code Quality", page_icon="📊", layout="wide")
 
-# Initialize components if not already done
-if 'db' not in st.session_state:
-    from database import HistoryDB
-    from embeddings import SemanticSearch
-    st.session_state.db = HistoryDB()
-    st.session_state.search = SemanticSearch()
-
-# Always reinitialize LLM based on current settings
-from llm_handler import LLMHandler
-llm = LLMHandler(
-    model="llama3.1:latest",
+# Shared components (one instance per process, reused across reruns and sessions)
+import registry
+
+db = registry.get_db()
+llm = registry.get_llm(
     use_gemini=st.session_state.get('use_gemini', True),
-    api_key=st.session_state.get('gemini_api_key', '')
+    api_key=st.session_state.get('gemini_api_key', ''),
+    cloud_fallback=st.session_state.get('cloud_fallback', False)
 )
 
-db = st.session_state.db
-
 # Load custom CSS
 def load_css():
     try:
@@ -33,14 +26,28 @@ load_css()
 from sidebar_config import render_sidebar
 render_sidebar()
 
+from streaming import render_batch, render_stream, show_ttft
+from batch_review import detect_language, quality_prompt
+
+use_cache = st.session_state.use_cache
+
 st.title("📊 Code Quality Analyzer")
 st.caption("Comprehensive code review for performance, security, and best practices")
 
-code_to_analyze = st.text_area(
-    "Paste your code for quality analysis:",
-    height=300,
-    placeholder="Paste the code you want to analyze..."
-)
+mode = st.radio("Mode", ["Single snippet", "Batch upload"], horizontal=True, label_visibility="collapsed")
+
+if mode == "Single snippet":
+    code_to_analyze = st.text_area(
+        "Paste your code for quality analysis:",
+        height=300,
+        placeholder="Paste the code you want to analyze..."
+    )
+else:
+    uploaded_files = st.file_uploader(
+        "Upload source files:",
+        accept_multiple_files=True,
+        help="Each file is analyzed separately. Language is detected from the extension, falling back to the selection below."
+    )
 
 col1, col2, col3, col4 = st.columns(4)
 
@@ -60,36 +67,61 @@ with col4:
     check_style = st.checkbox("✨ Style", value=True)
 
 if st.button("🔍 Analyze Code", type="primary", use_container_width=True):
-    if code_to_analyze:
-        with st.spinner("Analyzing code quality..."):
-            checks = []
-            if check_performance:
-                checks.append("performance and efficiency")
-            if check_security:
-                checks.append("security vulnerabilities")
-            if check_style:
-                checks.append("style and best practices")
-            
-            prompt = f"Analyze this {analysis_language} code for {', '.join(checks)}:\n\n{code_to_analyze}"
-            prompt += "\n\nProvide a detailed analysis with severity levels (Critical/High/Medium/Low) and specific recommendations."
-            
-            response = llm.analyze_quality(prompt)
+    checks = []
+    if check_performance:
+        checks.append("performance and efficiency")
+    if check_security:
+        checks.append("security vulnerabilities")
+    if check_style:
+        checks.append("style and best practices")
+    
+    if mode == "Batch upload":
+        if uploaded_files:
+            jobs = []
+            for f in uploaded_files:
+                language = detect_language(f.name, analysis_language)
+                code = f.getvalue().decode("utf-8", errors="replace")
+                jobs.append((f.name, language, (quality_prompt(code, language, checks),)))
             
             st.markdown("### 📋 Analysis Results")
-            st.markdown(response)
+            results = render_batch(llm, "analyze_quality", jobs, use_cache=use_cache)
             
-            # Save to history
-            if db:
-                db.add_conversation(f"Quality analysis: {analysis_language}", response)
+            report = ""
+            for name, language, output in results:
+                if output is None:
+                    continue
+                report += f"# {name}\n\n{output}\n\n---\n\n"
+                if db:
+                    db.add_conversation(f"Quality analysis: {name}", output, language=language, tool="quality")
             
-            # Export report
             st.download_button(
-                "📥 Download Report",
-                response,
+                "📥 Download Combined Report",
+                report,
                 "code_quality_report.md",
                 "text/markdown",
                 use_container_width=True
             )
+        else:
+            st.warning("Please upload files to analyze.")
+    elif code_to_analyze:
+        prompt = quality_prompt(code_to_analyze, analysis_language, checks)
+        
+        st.markdown("### 📋 Analysis Results")
+        response = render_stream(llm.analyze_quality_stream(prompt, use_cache=use_cache))
+        show_ttft(llm)
+        
+        # Save to history
+        if db:
+            db.add_conversation(f"Quality analysis: {analysis_language}", response, tool="quality")
+        
+        # Export report
+        st.download_button(
+            "📥 Download Report",
+            response,
+            "code_quality_report.md",
+            "text/markdown",
+            use_container_width=True
+        )
     else:
         st.warning("Please paste code to analyze.")
 
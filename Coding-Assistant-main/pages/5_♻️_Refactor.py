@@ -2,23 +2,16 @@ import streamlit as st
 
 st.set_page_config(page_title="Refactor", page_icon="♻️", layout="wide")
 
-# Initialize components if not already done
-if 'db' not in st.session_state:
-    from database import HistoryDB
-    from embeddings import SemanticSearch
-    st.session_state.db = HistoryDB()
-    st.session_state.search = SemanticSearch()
+# Shared components (one instance per process, reused across reruns and sessions)
+import registry
 
-# Always reinitialize LLM based on current settings
-from llm_handler import LLMHandler
-llm = LLMHandler(
-    model="llama3.1:latest",
+db = registry.get_db()
+llm = registry.get_llm(
     use_gemini=st.session_state.get('use_gemini', True),
-    api_key=st.session_state.get('gemini_api_key', '')
+    api_key=st.session_state.get('gemini_api_key', ''),
+    cloud_fallback=st.session_state.get('cloud_fallback', False)
 )
 
-db = st.session_state.db
-
 # Load custom CSS
 def load_css():
     try:
@@ -33,6 +26,10 @@ load_css()
 from sidebar_config import render_sidebar
 render_sidebar()
 
+from streaming import render_stream, show_ttft
+
+use_cache = st.session_state.use_cache
+
 st.title("♻️ Code Refactoring")
 st.caption("Improve code structure, readability, and maintainability")
 
@@ -70,37 +67,36 @@ with col2:
 
 if st.button("♻️ Refactor Code", type="primary", use_container_width=True):
     if code_to_refactor and refactor_goals:
-        with st.spinner("Refactoring code..."):
-            goals_str = ", ".join(refactor_goals)
-            prompt = f"Refactor this {refactor_language} code to {goals_str}:\n\n{code_to_refactor}"
-            
-            if preserve_behavior:
-                prompt += "\n\nIMPORTANT: Preserve the exact behavior and functionality."
-            
-            response = llm.refactor_code(prompt, refactor_language)
-            
-            # Display side by side
-            col_a, col_b = st.columns(2)
-            
-            with col_a:
-                st.markdown("### 📝 Original Code")
-                st.code(code_to_refactor, language=refactor_language.lower())
-            
-            with col_b:
-                st.markdown("### ✨ Refactored Code")
-                st.code(response, language=refactor_language.lower())
-            
-            # Save to history
-            if db:
-                db.add_conversation(f"Refactor {refactor_language}", response, response, refactor_language)
-            
-            # Download
-            st.download_button(
-                "📥 Download Refactored Code",
-                response,
-                f"refactored_code.{refactor_language.lower()}",
-                use_container_width=True
-            )
+        goals_str = ", ".join(refactor_goals)
+        prompt = f"Refactor this {refactor_language} code to {goals_str}:\n\n{code_to_refactor}"
+        
+        if preserve_behavior:
+            prompt += "\n\nIMPORTANT: Preserve the exact behavior and functionality."
+        
+        # Display side by side
+        col_a, col_b = st.columns(2)
+        
+        with col_a:
+            st.markdown("### 📝 Original Code")
+            st.code(code_to_refactor, language=refactor_language.lower())
+        
+        with col_b:
+            st.markdown("### ✨ Refactored Code")
+            response = render_stream(llm.refactor_code_stream(prompt, refactor_language, use_cache=use_cache),
+                                     language=refactor_language.lower())
+            show_ttft(llm)
+        
+        # Save to history
+        if db:
+            db.add_conversation(f"Refactor {refactor_language}", response, response, refactor_language, tool="refactor")
+        
+        # Download
+        st.download_button(
+            "📥 Download Refactored Code",
+            response,
+            f"refactored_code.{refactor_language.lower()}",
+            use_container_width=True
+        )
     else:
         st.warning("Please paste code and select at least one refactoring goal.")
 
@@ -2,23 +2,16 @@ import streamlit as st
 
 st.set_page_config(page_title="Documentation", page_icon="📝", layout="wide")
 
-# Initialize components if not already done
-if 'db' not in st.session_state:
-    from database import HistoryDB
-    from embeddings import SemanticSearch
-    st.session_state.db = HistoryDB()
-    st.session_state.search = SemanticSearch()
-
-# Always reinitialize LLM based on current settings
-from llm_handler import LLMHandler
-llm = LLMHandler(
-    model="llama3.1:latest",
+# Shared components (one instance per process, reused across reruns and sessions)
+import registry
+
+db = registry.get_db()
+llm = registry.get_llm(
     use_gemini=st.session_state.get('use_gemini', True),
-    api_key=st.session_state.get('gemini_api_key', '')
+    api_key=st.session_state.get('gemini_api_key', ''),
+    cloud_fallback=st.session_state.get('cloud_fallback', False)
 )
 
-db = st.session_state.db
-
 # Load custom CSS
 def load_css():
     try:
@@ -33,14 +26,28 @@ load_css()
 from sidebar_config import render_sidebar
 render_sidebar()
 
+from streaming import render_batch, render_stream, show_ttft
+from batch_review import detect_language, docs_prompt
+
+use_cache = st.session_state.use_cache
+
 st.title("📝 Documentation Generator")
 st.caption("Generate comprehensive documentation for your code")
 
-code_to_document = st.text_area(
-    "Paste code to document:",
-    height=300,
-    placeholder="Paste the code you want to document..."
-)
+mode = st.radio("Mode", ["Single snippet", "Batch upload"], horizontal=True, label_visibility="collapsed")
+
+if mode == "Single snippet":
+    code_to_document = st.text_area(
+        "Paste code to document:",
+        height=300,
+        placeholder="Paste the code you want to document..."
+    )
+else:
+    uploaded_files = st.file_uploader(
+        "Upload source files:",
+        accept_multiple_files=True,
+        help="Each file is documented separately. Language is detected from the extension, falling back to the selection below."
+    )
 
 col1, col2 = st.columns(2)
 
@@ -65,30 +72,53 @@ with col2:
 include_examples = st.checkbox("Include usage examples", value=True)
 
 if st.button("📝 Generate Documentation", type="primary", use_container_width=True):
-    if code_to_document:
-        with st.spinner("Generating documentation..."):
-            prompt = f"Generate {doc_style} for this {doc_language} code:\n\n{code_to_document}"
-            
-            if include_examples:
-                prompt += "\n\nInclude practical usage examples."
-            
-            response = llm.generate_docs(prompt, doc_language)
+    if mode == "Batch upload":
+        if uploaded_files:
+            jobs = []
+            for f in uploaded_files:
+                language = detect_language(f.name, doc_language)
+                code = f.getvalue().decode("utf-8", errors="replace")
+                jobs.append((f.name, language, (docs_prompt(code, language, doc_style, include_examples), language)))
             
             st.markdown("### 📄 Generated Documentation")
-            st.markdown(response)
+            results = render_batch(llm, "generate_docs", jobs, use_cache=use_cache)
             
-            # Save to history
-            if db:
-                db.add_conversation(f"Document {doc_language} code", response)
+            combined = ""
+            for name, language, output in results:
+                if output is None:
+                    continue
+                combined += f"# {name}\n\n{output}\n\n---\n\n"
+                if db:
+                    db.add_conversation(f"Document {name}", output, language=language, tool="docs")
             
-            # Download
             st.download_button(
-                "📥 Download Documentation",
-                response,
+                "📥 Download Combined Documentation",
+                combined,
                 "documentation.md",
                 "text/markdown",
                 use_container_width=True
             )
+        else:
+            st.warning("Please upload files to document.")
+    elif code_to_document:
+        prompt = docs_prompt(code_to_document, doc_language, doc_style, include_examples)
+        
+        st.markdown("### 📄 Generated Documentation")
+        response = render_stream(llm.generate_docs_stream(prompt, doc_language, use_cache=use_cache))
+        show_ttft(llm)
+        
+        # Save to history
+        if db:
+            db.add_conversation(f"Document {doc_language} code", response, tool="docs")
+        
+        # Download
+        st.download_button(
+            "📥 Download Documentation",
+            response,
+            "documentation.md",
+            "text/markdown",
+            use_container_width=True
+        )
     else:
         st.warning("Please paste code to document.")
 
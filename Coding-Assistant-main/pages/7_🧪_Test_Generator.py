@@ -2,23 +2,16 @@ import streamlit as st
 
 st.set_page_config(page_title="Test Generator", page_icon="🧪", layout="wide")
 
-# Initialize components if not already done
-if 'db' not in st.session_state:
-    from database import HistoryDB
-    from embeddings import SemanticSearch
-    st.session_state.db = HistoryDB()
-    st.session_state.search = SemanticSearch()
-
-# Always reinitialize LLM based on current settings
-from llm_handler import LLMHandler
-llm = LLMHandler(
-    model="llama3.1:latest",
+# Shared components (one instance per process, reused across reruns and sessions)
+import registry
+
+db = registry.get_db()
+llm = registry.get_llm(
     use_gemini=st.session_state.get('use_gemini', True),
-    api_key=st.session_state.get('gemini_api_key', '')
+    api_key=st.session_state.get('gemini_api_key', ''),
+    cloud_fallback=st.session_state.get('cloud_fallback', False)
 )
 
-db = st.session_state.db
-
 # Load custom CSS
 def load_css():
     try:
@@ -33,14 +26,28 @@ load_css()
 from sidebar_config import render_sidebar
 render_sidebar()
 
+from streaming import render_batch, render_stream, show_ttft
+from batch_review import detect_language, tests_prompt
+
+use_cache = st.session_state.use_cache
+
 st.title("🧪 Unit Test Generator")
 st.caption("Generate comprehensive unit tests for your code")
 
-code_to_test = st.text_area(
-    "Paste code to generate tests for:",
-    height=300,
-    placeholder="Paste the code you want to test..."
-)
+mode = st.radio("Mode", ["Single snippet", "Batch upload"], horizontal=True, label_visibility="collapsed")
+
+if mode == "Single snippet":
+    code_to_test = st.text_area(
+        "Paste code to generate tests for:",
+        height=300,
+        placeholder="Paste the code you want to test..."
+    )
+else:
+    uploaded_files = st.file_uploader(
+        "Upload source files:",
+        accept_multiple_files=True,
+        help="Tests are generated per file. Language is detected from the extension, falling back to the selection below."
+    )
 
 col1, col2, col3 = st.columns(3)
 
@@ -63,32 +70,56 @@ include_edge_cases = st.checkbox("Include edge cases", value=True)
 include_mocks = st.checkbox("Include mocks/stubs", value=False)
 
 if st.button("🧪 Generate Tests", type="primary", use_container_width=True):
-    if code_to_test:
-        with st.spinner("Generating unit tests..."):
-            prompt = f"Generate {test_framework} unit tests for this {test_language} code with {coverage}% coverage:\n\n{code_to_test}"
-            
-            if include_edge_cases:
-                prompt += "\n\nInclude tests for edge cases and error conditions."
-            
-            if include_mocks:
-                prompt += "\n\nInclude mocks and stubs for external dependencies."
-            
-            response = llm.generate_tests(prompt, test_language)
+    if mode == "Batch upload":
+        if uploaded_files:
+            jobs = []
+            for f in uploaded_files:
+                language = detect_language(f.name, test_language)
+                # The selected framework only fits files in the selected language
+                framework = test_framework if language == test_language else None
+                code = f.getvalue().decode("utf-8", errors="replace")
+                prompt = tests_prompt(code, language, framework, coverage, include_edge_cases, include_mocks)
+                jobs.append((f.name, language, (prompt, language)))
             
             st.markdown("### 🧪 Generated Tests")
-            st.code(response, language=test_language.lower())
+            results = render_batch(llm, "generate_tests", jobs, as_code=True, use_cache=use_cache)
             
-            # Save to history
-            if db:
-                db.add_conversation(f"Generate tests for {test_language}", response, response, test_language)
+            combined = ""
+            for name, language, output in results:
+                if output is None:
+                    continue
+                combined += f"# Tests for {name}\n\n```{language.lower()}\n{output}\n```\n\n"
+                if db:
+                    db.add_conversation(f"Generate tests for {name}", output, output, language, tool="tests")
             
-            # Download
             st.download_button(
-                "📥 Download Tests",
-                response,
-                f"test_code.{test_language.lower()}",
+                "📥 Download All Tests",
+                combined,
+                "generated_tests.md",
+                "text/markdown",
                 use_container_width=True
             )
+        else:
+            st.warning("Please upload files to generate tests for.")
+    elif code_to_test:
+        prompt = tests_prompt(code_to_test, test_language, test_framework, coverage, include_edge_cases, include_mocks)
+        
+        st.markdown("### 🧪 Generated Tests")
+        response = render_stream(llm.generate_tests_stream(prompt, test_language, use_cache=use_cache),
+                                 language=test_language.lower())
+        show_ttft(llm)
+        
+        # Save to history
+        if db:
+            db.add_conversation(f"Generate tests for {test_language}", response, response, test_language, tool="tests")
+        
+        # Download
+        st.download_button(
+            "📥 Download Tests",
+            response,
+            f"test_code.{test_language.lower()}",
+            use_container_width=True
+        )
     else:
         st.warning("Please paste code to generate tests for.")
 
@@ -2,23 +2,16 @@ import streamlit as st
 
 st.set_page_config(page_title="Code Explainer", page_icon="🔍", layout="wide")
 
-# Initialize components if not already done
-if 'db' not in st.session_state:
-    from database import HistoryDB
-    from embeddings import SemanticSearch
-    st.session_state.db = HistoryDB()
-    st.session_state.search = SemanticSearch()
-
-# Always reinitialize LLM based on current settings
-from llm_handler import LLMHandler
-llm = LLMHandler(
-    model="llama3.1:latest",
+# Shared components (one instance per process, reused across reruns and sessions)
+import registry
+
+db = registry.get_db()
+llm = registry.get_llm(
     use_gemini=st.session_state.get('use_gemini', True),
-    api_key=st.session_state.get('gemini_api_key', '')
+    api_key=st.session_state.get('gemini_api_key', ''),
+    cloud_fallback=st.session_state.get('cloud_fallback', False)
 )
 
-db = st.session_state.db
-
 # Load custom CSS
 def load_css():
     try:
@@ -33,6 +26,10 @@ load_css()
 from sidebar_config import render_sidebar
 render_sidebar()
 
+from streaming import render_stream, show_ttft
+
+use_cache = st.session_state.use_cache
+
 st.title("🔍 Code Explainer")
 st.caption("Understand code with detailed, structured explanations")
 
@@ -65,37 +62,35 @@ explain_options = st.multiselect(
 
 if st.button("🔍 Explain Code", type="primary", use_container_width=True):
     if code_to_explain:
-        with st.spinner("Analyzing code..."):
-            prompt = f"Explain this {explain_language} code at a {detail_level} level:\n\n{code_to_explain}"
-            
-            if explain_options:
-                prompt += f"\n\nFocus on: {', '.join(explain_options)}"
-            
-            response = llm.explain_code(prompt)
-            
-            # Display code and explanation side by side
-            col_a, col_b = st.columns([1, 1])
-            
-            with col_a:
-                st.markdown("### 📝 Code")
-                st.code(code_to_explain, language=explain_language.lower())
-            
-            with col_b:
-                st.markdown("### 💡 Explanation")
-                st.markdown(response)
-            
-            # Save to history
-            if db:
-                db.add_conversation(f"Explain {explain_language} code", response)
-            
-            # Download
-            st.download_button(
-                "📥 Download Explanation",
-                response,
-                "code_explanation.md",
-                "text/markdown",
-                use_container_width=True
-            )
+        prompt = f"Explain this {explain_language} code at a {detail_level} level:\n\n{code_to_explain}"
+        
+        if explain_options:
+            prompt += f"\n\nFocus on: {', '.join(explain_options)}"
+        
+        # Display code and explanation side by side
+        col_a, col_b = st.columns([1, 1])
+        
+        with col_a:
+            st.markdown("### 📝 Code")
+            st.code(code_to_explain, language=explain_language.lower())
+        
+        with col_b:
+            st.markdown("### 💡 Explanation")
+            response = render_stream(llm.explain_code_stream(prompt, use_cache=use_cache))
+            show_ttft(llm)
+        
+        # Save to history
+        if db:
+            db.add_conversation(f"Explain {explain_language} code", response, tool="explainer")
+        
+        # Download
+        st.download_button(
+            "📥 Download Explanation",
+            response,
+            "code_explanation.md",
+            "text/markdown",
+            use_container_width=True
+        )
     else:
         st.warning("Please paste code to explain.")
 
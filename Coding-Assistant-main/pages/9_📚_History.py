@@ -1,16 +1,13 @@
 import streamlit as st
+from datetime import datetime, timedelta
 
 st.set_page_config(page_title="History", page_icon="📚", layout="wide")
 
-# Initialize components if not already done
-if 'db' not in st.session_state:
-    from database import HistoryDB
-    from embeddings import SemanticSearch
-    st.session_state.db = HistoryDB()
-    st.session_state.search = SemanticSearch()
+# Shared components (one instance per process, reused across reruns and sessions)
+import registry
+from database import TOOLS
 
-db = st.session_state.db
-search = st.session_state.search
+db = registry.get_db()
 
 # Load custom CSS
 def load_css():
@@ -46,6 +43,19 @@ if db:
         else:
             st.metric("Most Used Language", "N/A")
     
+    # Usage over time, read from the per-day rollup
+    with st.expander("📈 Usage over time"):
+        col1, col2 = st.columns(2)
+        with col1:
+            usage_days = st.selectbox("Period", [30, 90, 365], format_func=lambda d: f"Last {d} days", key="usage_days")
+        with col2:
+            usage_split = st.selectbox("Split by", ["Nothing", "Language", "Tool"], key="usage_split")
+        usage = db.usage_series(usage_days, None if usage_split == "Nothing" else usage_split.lower())
+        if len(usage) > 1:
+            st.bar_chart(usage, x="day")
+        else:
+            st.caption("No conversations in this period")
+    
     st.markdown("---")
 
 # Sidebar controls
@@ -55,12 +65,18 @@ with st.sidebar:
     if st.button("🔄 Rebuild Search Index", use_container_width=True):
         if db:
             conversations = db.get_all_conversations()
+            search = registry.get_search()
             if search:
                 search.build_index(conversations)
                 st.success(f"✅ Index rebuilt with {len(conversations)} conversations")
             else:
                 st.error("Search component not available")
     
+    if st.button("📊 Rebuild Statistics", use_container_width=True):
+        if db:
+            wrong = db.rebuild_stats()
+            st.success(f"✅ Statistics rebuilt ({wrong} rollup rows were out of date)")
+    
     st.markdown("---")
     
     # Clear history with confirmation
@@ -117,14 +133,69 @@ with col1:
 with col2:
     search_button = st.button("🔍 Search", use_container_width=True)
 
+search_mode = st.radio("Search mode", ["Keyword", "Hybrid"], horizontal=True, label_visibility="collapsed",
+                       help='Keyword ranks conversations containing every word ("quoted phrase", prefix*); '
+                            'Hybrid ranks the 20 best by keywords and meaning')
+
+# Filters narrow both search modes (inside their indexes, not by discarding results) and the recent list
+PERIODS = {"Any time": None, "Last 24 hours": 1, "Last 7 days": 7, "Last 30 days": 30}
+col1, col2, col3 = st.columns(3)
+with col1:
+    languages = sorted(stats["by_language"]) if db else []
+    filter_language = st.selectbox("Language", ["Any language"] + languages)
+with col2:
+    filter_tool = st.selectbox("Tool", ["Any tool"] + list(TOOLS))
+with col3:
+    filter_period = st.selectbox("Period", list(PERIODS))
+
+filter_choice = (filter_language, filter_tool, filter_period)  # unlike filters["since"], stable across reruns
+filters = {
+    "language": filter_language if filter_language != "Any language" else None,
+    "tool": filter_tool if filter_tool != "Any tool" else None,
+    "since": (datetime.now() - timedelta(days=PERIODS[filter_period])).isoformat() if PERIODS[filter_period] else None,
+}
+
+RESULTS_PER_PAGE = 20
+
 if (keyword and search_button) or keyword:
     if db:
-        results = db.search_by_keyword(keyword)
+        # A new search starts again at its first page
+        search_key = (keyword, search_mode, filter_choice)
+        if st.session_state.get("search_key") != search_key:
+            st.session_state.search_key = search_key
+            st.session_state.search_page = 0
+        
+        has_next = False
+        if search_mode == "Hybrid":
+            retriever = registry.get_retriever()
+            results = retriever.search(keyword, k=RESULTS_PER_PAGE, **filters)
+        else:
+            # One extra row tells whether there is a next page without counting every match
+            results = db.search_by_keyword(keyword, limit=RESULTS_PER_PAGE + 1,
+                                           offset=st.session_state.search_page * RESULTS_PER_PAGE, **filters)
+            has_next = len(results) > RESULTS_PER_PAGE
+            results = results[:RESULTS_PER_PAGE]
         
         if results:
-            st.success(f"Found {len(results)} results")
+            if search_mode == "Hybrid":
+                st.success(f"Found {len(results)} results")
+                st.caption(" · ".join(f"{name[:-3]} {ms:.0f} ms" for name, ms in retriever.last_timings.items()))
+            else:
+                first = st.session_state.search_page * RESULTS_PER_PAGE + 1
+                st.success(f"Results {first}-{first + len(results) - 1}, best match first")
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.button("⬅️ Previous results", disabled=st.session_state.search_page == 0):
+                        st.session_state.search_page -= 1
+                        st.rerun()
+                with col2:
+                    if st.button("More results ➡️", disabled=not has_next):
+                        st.session_state.search_page += 1
+                        st.rerun()
             
             for r in results:
+                if len(r) > 7 and r[7]:  # keyword search: matching passage with the matches in bold
+                    st.caption(r[7])
                 with st.expander(f"📅 {r[1][:19]} | {r[2][:80]}..."):
                     col_a, col_b = st.columns([3, 1])
                     
@@ -144,6 +215,8 @@ if (keyword and search_button) or keyword:
                         st.markdown(f"**Time:** {r[1][11:19]}")
                         if r[5]:
                             st.markdown(f"**Language:** {r[5]}")
+                        if r[6]:
+                            st.markdown(f"**Tool:** {r[6]}")
                         
                         if st.button("🗑️ Delete", key=f"del_{r[0]}", use_container_width=True):
                             db.delete_conversation(r[0])
@@ -156,63 +229,79 @@ else:
     st.markdown("### 📝 Recent Conversations")
     
     if db:
-        conversations = db.get_all_conversations()
+        # Pagination: keyset cursors of the pages visited so far, so each page is one index seek
+        items_per_page = 10
+        total = db.count(**filters)
+        total_pages = max(1, (total + items_per_page - 1) // items_per_page)
         
-        if conversations:
-            # Pagination
-            items_per_page = 10
-            total_pages = (len(conversations) + items_per_page - 1) // items_per_page
-            
-            if 'history_page' not in st.session_state:
-                st.session_state.history_page = 0
-            
+        if st.session_state.get("history_filters") != filter_choice:
+            st.session_state.history_filters = filter_choice
+            st.session_state.history_cursors = [None]
+        page_number = len(st.session_state.history_cursors)
+        page_conversations = db.get_page(st.session_state.history_cursors[-1], items_per_page, **filters)
+        if not page_conversations and page_number > 1:
+            # The rest of this page was deleted
+            st.session_state.history_cursors.pop()
+            st.rerun()
+        
+        if page_conversations:
             # Page navigation
             col1, col2, col3 = st.columns([1, 2, 1])
             with col1:
-                if st.button("⬅️ Previous", disabled=st.session_state.history_page == 0):
-                    st.session_state.history_page -= 1
+                if st.button("⬅️ Previous", disabled=page_number == 1):
+                    st.session_state.history_cursors.pop()
                     st.rerun()
             with col2:
-                st.markdown(f"<center>Page {st.session_state.history_page + 1} of {total_pages}</center>", unsafe_allow_html=True)
+                st.markdown(f"<center>Page {page_number} of {total_pages}</center>", unsafe_allow_html=True)
             with col3:
-                if st.button("Next ➡️", disabled=st.session_state.history_page >= total_pages - 1):
-                    st.session_state.history_page += 1
+                if st.button("Next ➡️", disabled=page_number >= total_pages):
+                    last = page_conversations[-1]
+                    st.session_state.history_cursors.append((last[1], last[0]))
                     st.rerun()
             
             st.markdown("---")
             
-            # Display conversations for current page
-            start_idx = st.session_state.history_page * items_per_page
-            end_idx = start_idx + items_per_page
-            page_conversations = conversations[start_idx:end_idx]
-            
+            # Display conversations for current page (previews; the full text is loaded on request)
             for r in page_conversations:
                 with st.expander(f"📅 {r[1][:19]} | {r[2][:80]}..."):
                     col_a, col_b = st.columns([3, 1])
                     
+                    truncated = r[7] > len(r[3]) or (r[8] or 0) > len(r[4] or "") or r[9] > len(r[2])
+                    show_full = st.session_state.get(f"full_{r[0]}", False)
+                    if show_full:
+                        full = db.get_conversations([r[0]])
+                        r = full[0] if full else r
+                    
                     with col_a:
                         st.markdown(f"**🔹 Query:**")
-                        st.info(r[2])
+                        st.info(r[2] + ("..." if truncated and not show_full and r[9] > len(r[2]) else ""))
                         
                         st.markdown(f"**💬 Response:**")
-                        response_preview = r[3][:500] + "..." if len(r[3]) > 500 else r[3]
-                        st.markdown(response_preview)
+                        st.markdown(r[3] + ("..." if truncated and not show_full else ""))
                         
                         if r[4]:  # code snippet
                             st.markdown(f"**💻 Code:**")
-                            code_preview = r[4][:300] + "..." if len(r[4]) > 300 else r[4]
-                            st.code(code_preview, language=r[5].lower() if r[5] else "")
+                            st.code(r[4], language=r[5].lower() if r[5] else "")
+                        
+                        if truncated and not show_full:
+                            if st.button("📖 Show full conversation", key=f"show_full_{r[0]}"):
+                                st.session_state[f"full_{r[0]}"] = True
+                                st.rerun()
                     
                     with col_b:
                         st.markdown(f"**ID:** {r[0]}")
                         st.markdown(f"**Time:** {r[1][11:19]}")
                         if r[5]:
                             st.markdown(f"**Language:** {r[5]}")
+                        if r[6]:
+                            st.markdown(f"**Tool:** {r[6]}")
                         
                         if st.button("🗑️ Delete", key=f"del_{r[0]}", use_container_width=True):
                             db.delete_conversation(r[0])
                             st.success("Deleted!")
                             st.rerun()
+        elif any(filters.values()):
+            st.info("No conversations match the filters")
         else:
             st.info("📭 No conversations yet. Start chatting to build your history!")
             
@@ -0,0 +1,197 @@
+"""Process-wide registry of components shared by every session and page"""
+import hashlib
+import os
+import sys
+import threading
+
+from database import HistoryDB
+from lazy_imports import import_report, load
+from llm_handler import LLMHandler, StubBackend, get_default_cache, get_single_flight
+from retrieval import HybridRetriever
+from semantic_cache import SemanticCache
+
+DEFAULT_MODEL = "llama3.1:latest"
+
+# Seconds before a slow call is raced against the other backend; unset disables hedging
+HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER")) if os.getenv("LLM_HEDGE_AFTER") else None
+
+# LLM_BACKEND=stub serves every page from the deterministic StubBackend (no Ollama or Gemini needed)
+USE_STUB_BACKEND = os.getenv("LLM_BACKEND", "").lower() == "stub"
+
+# Load the embedding model during background warm-up; 0 defers it to the first semantic search
+WARM_UP_EMBEDDINGS = os.getenv("WARM_UP_EMBEDDINGS", "1") != "0"
+
+# Cosine similarity above which a chat question (same code, different wording) reuses an earlier answer; 0 disables
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+
+# Page scripts rerun on every interaction, so anything they build themselves is rebuilt
+# constantly; components here are created once per process instead
+_lock = threading.RLock()
+# Building the search index can take a while; it has its own lock so it never holds up get_llm/get_db
+_search_lock = threading.Lock()
+_db = None
+_search = None
+_semantic_cache = None
+_retriever = None
+_handlers = {}  # (preferred backend, model, api key fingerprint, cloud fallback) -> LLMHandler
+_warm_up_thread = None
+
+
+def _handler_key(use_gemini: bool, api_key: str, model: str, cloud_fallback: bool) -> tuple:
+    if api_key and (use_gemini or cloud_fallback):
+        # Never keep raw API keys around as dictionary keys
+        fingerprint = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+        return ("gemini" if use_gemini else "ollama", model, fingerprint, cloud_fallback)
+    return ("ollama", model, None, False)
+
+
+def get_db(db_path: str = "history.db") -> HistoryDB:
+    """Get the shared history database handle"""
+    global _db
+    with _lock:
+        if _db is None:
+            # WRITE_BEHIND=1 queues saves and writes them in batches on a background thread
+            _db = HistoryDB(db_path, write_behind=os.getenv("WRITE_BEHIND", "0") == "1")
+        return _db
+
+
+def get_search():
+    """Get the shared semantic search component (one embedding model per process)"""
+    global _search
+    with _search_lock:
+        if _search is None:
+            from embeddings import SemanticSearch
+            search = SemanticSearch()
+            # Indexed once here; after that every saved or deleted conversation updates it in place
+            search.attach(get_db())
+            _search = search
+        return _search
+
+
+def get_retriever() -> HybridRetriever:
+    """Get the shared keyword + vector retriever (loads the search component on first use)"""
+    global _retriever
+    if _retriever is None:
+        search = get_search()
+        with _lock:
+            if _retriever is None:
+                _retriever = HybridRetriever(get_db(), search)
+    return _retriever
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Get the shared semantic response cache, or None when disabled"""
+    global _semantic_cache
+    if SEMANTIC_CACHE_THRESHOLD <= 0:
+        return None
+    with _lock:
+        if _semantic_cache is None:
+            # Reuses the search embedding model, which is only loaded on the first lookup, and its query
+            # cache: a chat prompt checked here is not embedded a second time for retrieval
+            _semantic_cache = SemanticCache(lambda texts: get_search().encode_queries(texts), SEMANTIC_CACHE_THRESHOLD)
+        return _semantic_cache
+
+
+def get_llm(use_gemini: bool = False, api_key: str = None, model: str = DEFAULT_MODEL,
+            cloud_fallback: bool = False) -> LLMHandler:
+    """Get the shared LLM handler for a backend preference/model/API key combination"""
+    key = _handler_key(use_gemini, api_key, model, cloud_fallback)
+    with _lock:
+        if key not in _handlers:
+            _handlers[key] = LLMHandler(model=model, use_gemini=use_gemini, api_key=api_key,
+                                        cloud_fallback=cloud_fallback, hedge_after=HEDGE_AFTER,
+                                        semantic_cache=get_semantic_cache(),
+                                        backend=StubBackend.from_env() if USE_STUB_BACKEND else None)
+        return _handlers[key]
+
+
+def warm_up(use_gemini: bool = False, api_key: str = None, background: bool = False,
+            cloud_fallback: bool = False, embeddings: bool = None):
+    """Build the shared components ahead of the first request"""
+    global _warm_up_thread
+    if embeddings is None:
+        embeddings = WARM_UP_EMBEDDINGS
+    
+    def run():
+        get_db()
+        get_llm(use_gemini, api_key, cloud_fallback=cloud_fallback)
+        # The Ollama client imports langchain on its first call; pay for that here instead
+        load("langchain_community.llms")
+        if embeddings:
+            # Encoding once forces torch and the embedding model weights to load
+            get_search().encode(["warm up"])
+    
+    if not background:
+        run()
+        return
+    
+    # Every new session calls this; only the first one per process starts a thread
+    with _lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=run, name="registry-warm-up", daemon=True)
+            _warm_up_thread.start()
+        return _warm_up_thread
+
+
+def _process_rss() -> int:
+    """Resident set size of this process in bytes, or None if unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS and kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+def memory_report() -> dict:
+    """Summarize what the registry holds and roughly how much memory it uses"""
+    with _lock:
+        report = {
+            "process_rss_bytes": _process_rss(),
+            "db_path": _db.db_path if _db else None,
+            "history_writer": _db.write_stats() if _db else None,
+            "handlers": [f"{backend}:{model}" + (" (cloud fallback)" if fallback else "")
+                         for backend, model, _, fallback in _handlers],
+            "embedding_model_loaded": _search is not None and _search.model_loaded,
+            "embedding_model_bytes": 0,
+            "index_vectors": 0,
+            "index_bytes": 0,
+            "response_cache": get_default_cache().stats(),
+            "semantic_cache": _semantic_cache.stats() if _semantic_cache else None,
+            "single_flight": get_single_flight().stats(),
+        }
+        
+        if _search is not None:
+            if _search.model_loaded:
+                model = _search.embeddings
+                # float PyTorch weights only: int8 packed layers and ONNX sessions aren't counted
+                report["embedding_model_bytes"] = sum(p.numel() * p.element_size() for p in model.parameters())
+            if _search.index is not None:
+                from embeddings import QUANTIZATIONS, index_footprint
+                index = _search.index
+                report["index_vectors"] = index.ntotal
+                report["index_bytes"] = index_footprint(_search.kind, _search.quantization, index.ntotal, index.d)
+                # What the same vectors would take with each storage option (SEARCH_QUANTIZATION)
+                report["index_footprints"] = {q: index_footprint(_search.kind, q, index.ntotal, index.d)
+                                              for q in QUANTIZATIONS if not (_search.kind == "flat" and q == "pq")}
+            report["index_path"] = _search.index_path
+            report["index_kind"] = _search.kind
+            report["index_quantization"] = _search.quantization
+            # Only ids and text hashes are held per conversation; rows stay in SQLite
+            report["indexed_conversations"] = len(_search.passages)
+            report["index_worker"] = _search.worker.stats() if _search.worker else None
+            report["embedding_backend"] = _search.backend
+            report["query_embedding_cache"] = _search.query_cache_stats()
+        
+        return report
+
+
+def startup_report() -> list:
+    """(module, seconds) import cost of the heavy libraries loaded so far, slowest first"""
+    return import_report()
@@ -0,0 +1,75 @@
+"""Hybrid keyword + vector retrieval over the conversation history"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+# Standard constant from the reciprocal rank fusion paper; damps the weight of the very top ranks
+RRF_K = 60
+
+# The keyword leg runs here while the calling thread runs the vector leg
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval")
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Merge ranked id lists: each id scores the sum of 1 / (k + rank) over the lists it appears in"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+
+
+class HybridRetriever:
+    """Rank conversations by fusing BM25 keyword matches with embedding similarity"""
+
+    # Candidates taken from each leg per wanted result
+    CANDIDATES_PER_RESULT = 5
+
+    def __init__(self, db, search=None):
+        self.db = db
+        self.search_index = search  # SemanticSearch, or None for keyword-only retrieval
+        # Per-thread timings, so sessions sharing the retriever each see their own latest search
+        self._local = threading.local()
+
+    @property
+    def last_timings(self) -> Dict[str, float]:
+        """Milliseconds per leg of the latest search on the calling thread"""
+        return getattr(self._local, "timings", {})
+
+    @staticmethod
+    def _timed(timings: Dict[str, float], name: str, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            timings[name] = (time.perf_counter() - start) * 1000
+
+    def ranked_ids(self, query: str, k: int = 3, **filters) -> List[Tuple[int, float]]:
+        """(conversation id, fused score) of the top k conversations matching the filters"""
+        # filters: HistoryDB.filter_ids() arguments - language, tool, since, until
+        start = time.perf_counter()
+        # The keyword leg records into this search's dict from its pool thread
+        timings = self._local.timings = {}
+        candidates = max(k * self.CANDIDATES_PER_RESULT, 20)
+        lexical = _executor.submit(self._timed, timings, "keyword_ms", self.db.search_lexical, query, candidates, **filters)
+
+        rankings = []
+        if self.search_index is not None:
+            try:
+                # Both legs apply the filters inside their index (SQL join / FAISS id selector)
+                allowed_ids = self._timed(timings, "filter_ms", self.db.filter_ids, **filters) if filters else None
+                hits = self._timed(timings, "vector_ms", self.search_index.search_ids, query, candidates, allowed_ids)
+                rankings.append([conv_id for conv_id, _ in hits])
+            except Exception as e:
+                # Keyword results alone are still useful context
+                print(f"Vector retrieval failed: {e}")
+        rankings.append(lexical.result())
+
+        fused = reciprocal_rank_fusion(rankings)[:k]
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+        return fused
+
+    def search(self, query: str, k: int = 3, **filters) -> List[Tuple]:
+        """Conversation rows of the top k conversations, best first"""
+        return self.db.get_conversations([conv_id for conv_id, _ in self.ranked_ids(query, k, **filters)])
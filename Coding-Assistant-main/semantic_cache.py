@@ -0,0 +1,146 @@
+"""Semantic response cache: reuse an answer when a new request means the same as an earlier one"""
+import threading
+import time
+from typing import Callable, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticCache:
+    """Nearest-neighbour lookup of past requests by embedding similarity, with LRU eviction"""
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], threshold: float = 0.92,
+                 max_entries: int = 1000, ttl: float = 24 * 3600, max_chars: int = 1000):
+        # encode is called lazily, so building the cache doesn't load the embedding model
+        self._encode = encode
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # all-MiniLM-L6-v2 only sees the first 256 word pieces; longer requests would match on a shared prefix
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self._scope_ids = {}  # scope -> small int, so scope filtering is one vectorized compare
+        # Scopes include a hash of the request's code, so ids are recycled once their last entry is replaced
+        self._scope_refs = {}  # scope id -> [scope, entries in that scope]
+        self._free_scope_ids = []
+        self._vectors = None  # (max_entries, dim) unit vectors, rows [0, size) are live
+        self._scopes = np.zeros(max_entries, dtype=np.int32)
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._texts = []
+        self._responses = []
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+        self._hit_similarity = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self._responses)
+
+    def accepts(self, text: str) -> bool:
+        """Whether a request is short enough to be compared by embedding"""
+        return bool(text and text.strip()) and len(text) <= self.max_chars
+
+    def encode(self, text: str) -> np.ndarray:
+        """Embed a request as a unit vector"""
+        vector = np.asarray(self._encode([text]), dtype="float32").reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, scope: Hashable, text: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """Return the answer to the most similar earlier request in scope (or None) and this request's vector"""
+        if not self.accepts(text):
+            with self._lock:
+                self.skipped += 1
+            return None, None
+
+        vector = self.encode(text)
+        now = time.time()
+        with self._lock:
+            scope_id = self._scope_ids.get(scope)
+            if scope_id is not None and self.size:
+                n = self.size
+                similarity = self._vectors[:n] @ vector
+                live = (self._scopes[:n] == scope_id) & (now - self._created[:n] <= self.ttl)
+                similarity = np.where(live, similarity, -1.0)
+                best = int(np.argmax(similarity))
+                if similarity[best] >= self.threshold:
+                    self._last_used[best] = now
+                    self.hits += 1
+                    self._hit_similarity += float(similarity[best])
+                    return self._responses[best], vector
+            self.misses += 1
+        return None, vector
+
+    def store(self, scope: Hashable, text: str, response: str, vector: np.ndarray = None):
+        """Remember a request's answer, evicting the least recently used (or an expired) entry when full"""
+        if not self.accepts(text) or not response:
+            return
+        if vector is None:
+            vector = self.encode(text)
+
+        now = time.time()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype="float32")
+            scope_id = self._scope_ids.get(scope)
+            if scope_id is None:
+                scope_id = self._free_scope_ids.pop() if self._free_scope_ids else len(self._scope_ids)
+                self._scope_ids[scope] = scope_id
+                self._scope_refs[scope_id] = [scope, 0]
+            self._scope_refs[scope_id][1] += 1
+
+            if self.size < self.max_entries:
+                slot = self.size
+                self._texts.append(text)
+                self._responses.append(response)
+            else:
+                # Expired entries look unused since the epoch, so they go first
+                recency = np.where(now - self._created <= self.ttl, self._last_used, 0.0)
+                slot = int(np.argmin(recency))
+                self._texts[slot] = text
+                self._responses[slot] = response
+                self._release_scope(int(self._scopes[slot]))
+                self.evictions += 1
+
+            self._vectors[slot] = vector
+            self._scopes[slot] = scope_id
+            self._created[slot] = now
+            self._last_used[slot] = now
+
+    def _release_scope(self, scope_id: int):
+        """Forget a scope once its last entry is gone (call with the lock held)"""
+        ref = self._scope_refs[scope_id]
+        ref[1] -= 1
+        if not ref[1]:
+            del self._scope_refs[scope_id]
+            del self._scope_ids[ref[0]]
+            self._free_scope_ids.append(scope_id)
+
+    def clear(self):
+        """Drop every entry and reset counters"""
+        with self._lock:
+            self._texts = []
+            self._responses = []
+            self._scope_ids = {}
+            self._scope_refs = {}
+            self._free_scope_ids = []
+            self.hits = self.misses = self.skipped = self.evictions = 0
+            self._hit_similarity = 0.0
+
+    def stats(self) -> dict:
+        """Get hit/miss counters, size and the average similarity of hits"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "avg_hit_similarity": self._hit_similarity / self.hits if self.hits else None,
+                "entries": self.size,
+                "evictions": self.evictions,
+                "threshold": self.threshold,
+            }
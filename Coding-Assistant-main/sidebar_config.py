@@ -1,6 +1,9 @@
 import streamlit as st
 import os
 
+import registry
+from llm_handler import get_default_cache, get_single_flight
+
 def render_sidebar():
     """Render the global sidebar with model toggle"""
     
@@ -9,6 +12,10 @@ def render_sidebar():
         st.session_state.use_gemini = True  # Default to Gemini
     if 'gemini_api_key' not in st.session_state:
         st.session_state.gemini_api_key = os.getenv('GEMINI_API_KEY', '')
+    if 'use_cache' not in st.session_state:
+        st.session_state.use_cache = True
+    if 'cloud_fallback' not in st.session_state:
+        st.session_state.cloud_fallback = False
     
     with st.sidebar:
         st.markdown("")  # Spacing
@@ -19,13 +26,12 @@ def render_sidebar():
         use_gemini_toggle = st.toggle(
             "Use Gemini 2.0 Flash",
             value=st.session_state.use_gemini,
-            help="Toggle between Local Llama 3.1 and Cloud Gemini 2.0"
+            help="Preferred model. Gemini falls back to (or races) local Llama when it is slow or failing."
         )
         
         # Handle toggle change
         if use_gemini_toggle != st.session_state.use_gemini:
             st.session_state.use_gemini = use_gemini_toggle
-            st.cache_resource.clear()
             st.rerun()
         
         # Show current model status
@@ -33,5 +39,47 @@ def render_sidebar():
             st.success("✅ Gemini 2.0 Flash (Cloud)")
         else:
             st.info("🏠 Llama 3.1 (Local)")
+            st.session_state.cloud_fallback = st.toggle(
+                "☁️ Allow cloud fallback",
+                value=st.session_state.cloud_fallback,
+                help="Send requests to Gemini when Llama is failing or slow. Your code leaves this machine when it does."
+            )
+        
+        # Routing stats for the active handler
+        llm = registry.get_llm(
+            use_gemini=st.session_state.use_gemini,
+            api_key=st.session_state.gemini_api_key,
+            cloud_fallback=st.session_state.cloud_fallback
+        )
+        router_stats = llm.router_stats()
+        if router_stats:
+            with st.expander("📈 Backend Health"):
+                for name, b in router_stats["backends"].items():
+                    p50 = f"{b['p50']:.1f}s" if b["p50"] is not None else "–"
+                    p95 = f"{b['p95']:.1f}s" if b["p95"] is not None else "–"
+                    ttft = f"{b['ttft_p50']:.1f}s" if b["ttft_p50"] is not None else "–"
+                    status = "🟢" if b["healthy"] else "🔴"
+                    st.caption(f"{status} **{name}** · p50 {p50} · p95 {p95} · first chunk p50 {ttft} · "
+                               f"errors {b['error_rate']:.0%} · {b['calls']} calls")
+                if router_stats["hedge_after"] is not None:
+                    st.caption(f"Hedged after {router_stats['hedge_after']}s: "
+                               f"{router_stats['hedges_fired']} fired, {router_stats['hedges_won']} won")
+        
+        # Response cache toggle - off forces a fresh model call
+        st.session_state.use_cache = st.toggle(
+            "♻️ Reuse cached responses",
+            value=st.session_state.use_cache,
+            help="Return the stored answer for a repeated (or, for a first chat question, a very similar) request instead of calling the model again"
+        )
+        stats = get_default_cache().stats()
+        st.caption(f"Cache: {stats['hits']} hits · {stats['misses']} misses · {stats['disk_entries']} stored")
+        semantic_cache = registry.get_semantic_cache()
+        if semantic_cache:
+            semantic = semantic_cache.stats()
+            st.caption(f"Similar questions: {semantic['hits']} hits · {semantic['hit_rate']:.0%} hit rate · "
+                       f"{semantic['entries']} stored")
+        flights = get_single_flight().stats()
+        if flights["coalesced"]:
+            st.caption(f"Duplicate in-flight requests merged: {flights['coalesced']}")
         
         st.markdown("---")
@@ -0,0 +1,59 @@
+import time
+from typing import Iterable, List, Optional, Tuple
+
+import streamlit as st
+
+# Re-rendering on every token floods the websocket on fast backends
+RENDER_INTERVAL = 0.05
+
+
+def render_stream(chunks: Iterable[str], language: str = None, placeholder=None) -> str:
+    """Render streamed chunks into a placeholder as they arrive and return the full text"""
+    if placeholder is None:
+        placeholder = st.empty()
+
+    def draw(text: str):
+        if language is not None:
+            placeholder.code(text, language=language)
+        else:
+            placeholder.markdown(text)
+
+    text = ""
+    last_draw = 0.0
+    for chunk in chunks:
+        text += chunk
+        now = time.perf_counter()
+        if now - last_draw >= RENDER_INTERVAL:
+            draw(text + "▌")
+            last_draw = now
+
+    draw(text)
+    return text
+
+
+def show_ttft(llm):
+    """Show the time-to-first-token of the last stream on this session"""
+    if llm.last_ttft is not None:
+        st.caption(f"⚡ First token in {llm.last_ttft:.2f}s")
+
+
+def render_batch(llm, method: str, jobs: List[Tuple[str, str, tuple]], as_code: bool = False,
+                 max_concurrency: int = 4, use_cache: bool = True) -> List[Tuple[str, str, Optional[str]]]:
+    """Run a batch of (name, language, args) jobs and render each result as it finishes"""
+    progress = st.progress(0.0, text=f"0/{len(jobs)} done")
+    results = [None] * len(jobs)
+
+    batch = llm.batch(method, [args for _, _, args in jobs], max_concurrency=max_concurrency, use_cache=use_cache)
+    for done, result in enumerate(batch, 1):
+        name, language, _ = jobs[result.index]
+        with st.expander(f"{'❌' if result.error else '✅'} {name}"):
+            if result.error:
+                st.error(f"Failed after {result.attempts} attempt(s): {result.error}")
+            elif as_code:
+                st.code(result.output, language=language.lower())
+            else:
+                st.markdown(result.output)
+        progress.progress(done / len(jobs), text=f"{done}/{len(jobs)} done")
+        results[result.index] = (name, language, result.output)
+
+    return results
@@ -0,0 +1,115 @@
+"""Fake Ollama server on localhost, answering /api/generate with StubBackend text.
+
+Exercises the real OllamaBackend HTTP path (connection, NDJSON streaming, parsing) without a GPU:
+
+    python stub_server.py --port 11435 --latency 0.2 --tokens-per-sec 50
+    OLLAMA_BASE_URL=http://localhost:11435 streamlit run Home.py
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from llm_handler import StubBackend
+
+
+def make_handler(backend: StubBackend):
+    """Request handler class bound to one StubBackend"""
+
+    class OllamaStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, payload: dict, status: int = 200):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._send_json({"models": [{"name": backend.model, "model": backend.model}]})
+            elif self.path == "/api/version":
+                self._send_json({"version": "stub"})
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            if self.path != "/api/generate":
+                self._send_json({"error": "not found"}, 404)
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            model = request.get("model", backend.model)
+            start = time.perf_counter()
+
+            def message(response: str, done: bool) -> dict:
+                return {"model": model, "created_at": datetime.now(timezone.utc).isoformat(),
+                        "response": response, "done": done}
+
+            if not request.get("stream", True):
+                text = backend.invoke(request.get("prompt", ""))
+                final = message(text, True)
+                final.update(done_reason="stop", total_duration=int((time.perf_counter() - start) * 1e9))
+                self._send_json(final)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def write_line(payload: dict):
+                line = json.dumps(payload).encode("utf-8") + b"\n"
+                self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+                self.wfile.flush()
+
+            count = 0
+            for token in backend.stream(request.get("prompt", "")):
+                write_line(message(token, False))
+                count += 1
+            final = message("", True)
+            final.update(done_reason="stop", eval_count=count,
+                         total_duration=int((time.perf_counter() - start) * 1e9))
+            write_line(final)
+            self.wfile.write(b"0\r\n\r\n")
+
+    return OllamaStubHandler
+
+
+def serve(backend: StubBackend, host: str = "127.0.0.1", port: int = 11435) -> ThreadingHTTPServer:
+    """Create the fake Ollama server (call serve_forever() on it, or run it on a thread)"""
+    server = ThreadingHTTPServer((host, port), make_handler(backend))
+    server.daemon_threads = True
+    return server
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fake Ollama server backed by the deterministic stub model")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="0 for no generation delay")
+    parser.add_argument("--response-tokens", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    server = serve(StubBackend(args.latency, args.tokens_per_sec, args.response_tokens), args.host, args.port)
+    print(f"Stub Ollama listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())